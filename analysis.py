@@ -0,0 +1,203 @@
+"""
+Analizy rynkowe na danych cenowych: korelacje zmian cen metali.
+
+Funkcje liczą wszystko na tablicach numpy jednym przebiegiem; aplikacja
+buforuje ich wyniki per wersja danych (PriceStore.version_key). Sumy
+prefiksowe zwrotów (ReturnSums) można rozszerzać o nowe notowania bez
+przeliczania całej historii (ingest.PriceStore).
+"""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from engine import asset_columns, asset_names
+
+# Okna korelacji kroczącej (liczba sesji notowań)
+ROLLING_WINDOWS = {
+    "90 dni": 63,
+    "1 rok": 252,
+    "3 lata": 756,
+}
+
+# Okres średniej kroczącej złota wyznaczającej reżim rynku
+REGIME_SMA = 200
+
+# Aktywo wyznaczające reżim rynku (gdy go brak w danych - pierwsze aktywo)
+REGIME_ASSET = "Gold"
+
+
+def daily_returns(data):
+    """Dzienne zmiany cen aktywów (jak pct_change(), bez pierwszego wiersza)."""
+    prices = data[asset_columns(asset_names(data))].to_numpy(dtype=float)
+    return prices[1:] / prices[:-1] - 1
+
+
+def _extend_prefix(prefix, x):
+    """Dopisuje sumy prefiksowe x do prefix (kolejne dodawania jak przy jednym np.cumsum)."""
+    return np.concatenate([prefix[:-1], np.cumsum(np.concatenate([prefix[-1:], x]), axis=0)])
+
+
+class ReturnSums:
+    """
+    Sumy prefiksowe dziennych zwrotów (x, x², x·y dla par) i cen aktywa reżimu.
+
+    Zwroty centrowane są stałą średnią z chwili utworzenia (centrowanie
+    poprawia dokładność różnic dużych sum, a kowariancja w oknie nie zależy
+    od przesunięcia), więc extend() dopisuje tylko sumy nowych wierszy.
+    extend() podmienia tablice na nowe (nie zmienia istniejących), więc
+    kopia copy.copy() pozostaje spójna z danymi przed rozszerzeniem.
+
+    Attributes:
+    -----------
+    assets : list
+        Aktywa w danych
+    pairs : list
+        Pary indeksów aktywów (kolejność itertools.combinations)
+    rows : int
+        Liczba wierszy cen, z których policzono sumy
+    regime_column : str
+        Kolumna cen aktywa wyznaczającego reżim rynku (REGIME_ASSET)
+    returns : np.ndarray
+        Dzienne zwroty (rows - 1 × aktywa)
+    s, ss, sxy, level : np.ndarray
+        Sumy prefiksowe x, x², x·y (pary) i cen aktywa reżimu
+    """
+
+    def __init__(self, data):
+        self.assets = asset_names(data)
+        self.pairs = list(itertools.combinations(range(len(self.assets)), 2))
+        regime = REGIME_ASSET if REGIME_ASSET in self.assets else self.assets[0]
+        self.regime_column = asset_columns([regime])[0]
+        self._left = [i for i, _ in self.pairs]
+        self._right = [j for _, j in self.pairs]
+        self.rows = 0
+        self.returns = np.empty((0, len(self.assets)))
+        self.center = None
+        width = len(self.assets)
+        self.s = np.zeros((1, width))
+        self.ss = np.zeros((1, width))
+        self.sxy = np.zeros((1, len(self.pairs)))
+        self.level = np.zeros(1)
+        self.extend(data)
+
+    def extend(self, data):
+        """
+        Dopisuje sumy dla wierszy data po self.rows (data - te same dane wydłużone o nowe notowania).
+
+        Returns:
+        --------
+        ReturnSums
+            self
+        """
+        if len(data) <= self.rows:
+            return self
+        prices = data[asset_columns(self.assets)].to_numpy(dtype=float)
+        new_returns = prices[max(self.rows, 1):] / prices[max(self.rows, 1) - 1:-1] - 1
+        if self.center is None:
+            self.center = new_returns.mean(axis=0) if len(new_returns) else np.zeros(len(self.assets))
+        x = new_returns - self.center
+
+        self.s = _extend_prefix(self.s, x)
+        self.ss = _extend_prefix(self.ss, x ** 2)
+        self.sxy = _extend_prefix(self.sxy, x[:, self._left] * x[:, self._right])
+        self.level = _extend_prefix(self.level, data[self.regime_column].to_numpy(dtype=float)[self.rows:])
+        self.returns = np.concatenate([self.returns, new_returns])
+        self.rows = len(data)
+        return self
+
+
+def correlation_matrix(data):
+    """
+    Macierz korelacji dziennych zmian cen metali dla całej historii.
+
+    Returns:
+    --------
+    pd.DataFrame
+        Macierz (metale × metale)
+    """
+    assets = asset_names(data)
+    return pd.DataFrame(np.corrcoef(daily_returns(data), rowvar=False), index=assets, columns=assets)
+
+
+def rolling_correlations(data, window, sums=None):
+    """
+    Korelacje kroczące dla wszystkich par metali.
+
+    Kowariancje liczone są z różnic sum prefiksowych (x, x², x·y),
+    więc koszt jest liniowy względem długości historii niezależnie od okna.
+
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Ceny metali
+    window : int
+        Długość okna w sesjach
+    sums : ReturnSums or None
+        Sumy prefiksowe dla data (np. PriceStore.return_sums); None lub sumy
+        dla innej długości danych - liczone od nowa
+
+    Returns:
+    --------
+    pd.DataFrame
+        Kolumny "Metal1–Metal2", indeks dat (od pierwszego pełnego okna)
+    """
+    if sums is None or sums.rows != len(data):
+        sums = ReturnSums(data)
+    assets, pairs = sums.assets, sums.pairs
+    n = len(sums.returns)
+    if n < window:
+        return pd.DataFrame(columns=[f"{assets[i]}–{assets[j]}" for i, j in pairs], dtype=float)
+
+    def window_sums(prefix):
+        return prefix[window:] - prefix[:-window]
+
+    s = window_sums(sums.s)
+    ss = window_sums(sums.ss)
+    sxy = window_sums(sums.sxy)
+    var = ss - s ** 2 / window
+
+    columns = {}
+    for p, (i, j) in enumerate(pairs):
+        cov = sxy[:, p] - s[:, i] * s[:, j] / window
+        with np.errstate(invalid="ignore", divide="ignore"):
+            columns[f"{assets[i]}–{assets[j]}"] = cov / np.sqrt(var[:, i] * var[:, j])
+
+    return pd.DataFrame(columns, index=data.index[window:])
+
+
+def regime_correlations(data, sma=REGIME_SMA, sums=None):
+    """
+    Macierze korelacji osobno dla hossy i bessy złota.
+
+    Reżim dnia wyznacza cena złota względem jej średniej kroczącej
+    z ostatnich `sma` sesji (hossa: cena powyżej średniej).
+
+    Parameters:
+    -----------
+    sums : ReturnSums or None
+        Sumy prefiksowe dla data (np. PriceStore.return_sums); None lub sumy
+        dla innej długości danych - liczone od nowa
+
+    Returns:
+    --------
+    dict
+        {"Hossa złota": pd.DataFrame, "Bessa złota": pd.DataFrame}
+    """
+    if sums is None or sums.rows != len(data):
+        sums = ReturnSums(data)
+    assets, returns, prefix = sums.assets, sums.returns, sums.level
+    gold = data[sums.regime_column].to_numpy(dtype=float)
+    moving_avg = np.full(len(gold), np.nan)
+    moving_avg[sma - 1:] = (prefix[sma:] - prefix[:-sma]) / sma
+
+    # Reżim z dnia poprzedniego - bez zaglądania w przyszłość
+    bull = (gold > moving_avg)[:-1]
+    valid = ~np.isnan(moving_avg)[:-1]
+
+    out = {}
+    for label, mask in (("Hossa złota", valid & bull), ("Bessa złota", valid & ~bull)):
+        if mask.sum() > 2:
+            out[label] = pd.DataFrame(np.corrcoef(returns[mask], rowvar=False), index=assets, columns=assets)
+    return out
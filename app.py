@@ -1,10 +1,53 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from datetime import datetime, timedelta
-from pandas.tseries.offsets import BDay
+import os
+import time
+import uuid
+from datetime import datetime
+
+from analysis import ROLLING_WINDOWS, correlation_matrix, regime_correlations, rolling_correlations
+from charts import DEFAULT_POINTS as CHART_POINTS, chart_window, downsample
+from engine import (
+    DEFAULT_CONFIG,
+    PRICE_SUFFIX,
+    add_real_values,
+    asset_names,
+    config_fingerprint,
+    load_inflation,
+    normalize_config,
+    price_fixes,
+    result_assets,
+    summarize,
+    trend_assets,
+    trend_extremes,
+    trend_rank_counts,
+    zero_inflation,
+)
+from export import (
+    CSV_SUFFIXES,
+    parquet_available,
+    spool_export,
+    write_archive,
+    write_csv,
+    write_parquet,
+)
+from experiments import DEFAULT_PATH as EXPERIMENTS_PATH, METRICS as EXPERIMENT_METRICS, ExperimentStore
+from history import RunHistory, run_key
+from jobs import (
+    ACTIVE_STATES as JOB_ACTIVE_STATES,
+    DONE as JOB_DONE,
+    STATUS_LABELS as JOB_STATUS_LABELS,
+    JobRunner,
+    rolling_windows_job,
+    sensitivity_job,
+    walk_forward_job,
+)
+from ingest import UPDATES_DIR, PriceStore
+from preview import Refiner, coarse_calendar, simulate_coarse
+from sensitivity import sensitivity_analysis
+from shared_cache import SharedResultCache, simulate_shared
 
 # =========================================
 # 0. Konfiguracja strony i wybór języka
@@ -25,6 +68,8 @@ if "last_simulation_result" not in st.session_state:
     st.session_state.last_simulation_result = None
 if "last_fixed_result" not in st.session_state:
     st.session_state.last_fixed_result = None
+if "run_history" not in st.session_state:
+    st.session_state.run_history = RunHistory()
 
 st.sidebar.header("🌐 Wybierz język / Sprache wählen")
 language_choice = st.sidebar.selectbox(
@@ -46,35 +91,132 @@ language = st.session_state.language
 # 1. Wczytanie danych
 # =========================================
 
-@st.cache_data
-def load_data():
+@st.cache_resource
+def load_price_store():
     """
-    Wczytuje dane o cenach metali szlachetnych z pliku CSV.
+    Wczytuje dane o cenach metali szlachetnych z pliku CSV (raz na proces).
+    Nowe notowania z katalogu lbma_updates/ są dopisywane przyrostowo.
     """
     try:
-        df = pd.read_csv("lbma_data.csv", parse_dates=True, index_col=0)
-        df = df.sort_index()
-        df = df.dropna()
-        
-        # Sprawdź integralność danych
-        required_columns = ["Gold_EUR", "Silver_EUR", "Platinum_EUR", "Palladium_EUR"]
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            st.error(f"Brakujące kolumny w danych: {', '.join(missing_columns)}")
-            return None
-            
-        return df
+        return PriceStore("lbma_data.csv", updates_dir=UPDATES_DIR)
     except Exception as e:
         st.error(f"Błąd wczytywania danych: {str(e)}")
         return None
 
-data = load_data()
+price_store = load_price_store()
+
+
+@st.cache_resource
+def load_result_cache():
+    """Wyniki symulacji wspólne dla wszystkich sesji (odcisk konfiguracji + wersja danych)."""
+    return SharedResultCache()
+
+
+result_cache = load_result_cache()
 
-if data is None:
+if price_store is None:
     st.error("Nie można kontynuować bez odpowiednich danych. Sprawdź plik lbma_data.csv.")
     st.stop()
 
+# Dopisz nowe notowania (jeśli pojawiły się pliki w katalogu aktualizacji)
+added_rows, ingest_errors = price_store.refresh()
+if added_rows:
+    st.sidebar.info(f"📥 Dopisano {added_rows} nowych notowań (do {price_store.last_date:%Y-%m-%d}).")
+for ingest_error in ingest_errors:
+    st.sidebar.warning(f"Odrzucono plik z notowaniami: {ingest_error}")
+
+data = price_store.data
+
+# Aktywa z kolumn cen <nazwa>_EUR (engine.asset_names) i domyślne parametry
+# dopasowane do nich (engine.normalize_config)
+assets = asset_names(data)
+asset_defaults = normalize_config({}, data)
+
+# Polskie nazwy znanych metali (mianownik, dopełniacz); pozostałe aktywa pod nazwą z danych
+METAL_NAMES = {
+    "Gold": ("Złoto", "złota"),
+    "Silver": ("Srebro", "srebra"),
+    "Platinum": ("Platyna", "platyny"),
+    "Palladium": ("Pallad", "palladu"),
+}
+
+
+def metal_name(asset, genitive=False):
+    return METAL_NAMES.get(asset, (asset, asset))[1 if genitive else 0]
+
+
+def metal_label(asset):
+    """Etykieta aktywa w wynikach, np. "Złoto (Au)"."""
+    return translations["Polski"]["metals"].get(asset, asset)
+
+
+def percent_defaults(shares):
+    """Udziały (ułamki) jako całkowite procenty sumujące się do 100 (reszta do pierwszego)."""
+    percents = [int(round(share * 100)) for share in shares]
+    if percents:
+        percents[0] += 100 - sum(percents)
+    return percents
+
+
+default_allocation = dict(zip(assets, percent_defaults(asset_defaults["allocation"].values())))
+default_trend = list(asset_defaults["trend_priorities"])
+
+
+def result_data_key(config):
+    """
+    Klucz danych wyniku konfiguracji (PriceStore.data_key dla daty końcowej).
+
+    Dopisanie notowań po dacie końcowej nie zmienia klucza, więc buforowane
+    wyniki i wykresy symulacji pozostają ważne; version_key służy tylko
+    analizom całej historii (korelacje, wykres cen).
+    """
+    return price_store.data_key(config["end_purchase_date"])
+
+
+@st.cache_data(show_spinner=False)
+def load_correlations(data_version, _data, _sums):
+    """
+    Korelacje metali liczone raz na wersję danych (data_version = PriceStore.version_key).
+
+    Sumy prefiksowe (_sums = PriceStore.return_sums) są rozszerzane przy dopisaniu
+    notowań, więc nowa wersja nie przelicza ich dla całej historii.
+    """
+    rolling = {label: rolling_correlations(_data, window, _sums) for label, window in ROLLING_WINDOWS.items()}
+    return correlation_matrix(_data), rolling, regime_correlations(_data, sums=_sums)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_chart(data_version, name, _frame, start=None, end=None, max_points=CHART_POINTS, method="lttb"):
+    """
+    Seria wykresu zmniejszona do max_points punktów (charts.chart_window).
+
+    Wynik buforowany jest per wersja danych, nazwa serii (name) i zakres dat,
+    więc przeładowanie strony nie przelicza ani nie przesyła pełnej serii dziennej.
+    """
+    return chart_window(_frame, start, end, max_points=max_points, method=method)
+
+
+def chart_date_range(index, key):
+    """Suwak zakresu dat wykresu - węższy zakres to więcej szczegółów przy tym samym budżecie punktów."""
+    first, last = index[0].date(), index[-1].date()
+    if first == last:
+        return None, None
+    start, end = st.slider(
+        "Zakres dat wykresu",
+        min_value=first,
+        max_value=last,
+        value=(first, last),
+        format="YYYY-MM-DD",
+        key=key,
+    )
+    return pd.Timestamp(start), pd.Timestamp(end)
+
+
+@st.cache_data(show_spinner=False)
+def load_coarse_calendar(data_version, _coarse_index, calendar_params):
+    """Kalendarz zdarzeń podglądu - zależy tylko od dat i częstotliwości (calendar_params)."""
+    return coarse_calendar(_coarse_index, dict(calendar_params))
+
 # =========================================
 # 1.1 Wczytanie danych o inflacji
 # =========================================
@@ -85,20 +227,11 @@ def load_inflation_data():
     Wczytuje dane o inflacji z pliku CSV.
     """
     try:
-        df = pd.read_csv(
-            "inflacja.csv", 
-            sep=";", 
-            encoding="cp1250"
-        )
-        df = df[["Rok", "Wartość"]].copy()
-        df["Wartość"] = df["Wartość"].str.replace(",", ".").astype(float)
-        df["Inflacja (%)"] = df["Wartość"] - 100
-        return df[["Rok", "Inflacja (%)"]]
+        return load_inflation("inflacja.csv")
     except Exception as e:
         st.warning(f"Nie można wczytać danych o inflacji: {str(e)}. Używam inflacji zerowej.")
         # Stwórz pusty dataframe z latami z danych i zerową inflacją
-        years = range(data.index.min().year, data.index.max().year + 1)
-        return pd.DataFrame({"Rok": years, "Inflacja (%)": [0.0] * len(years)})
+        return zero_inflation(data)
 
 inflation_real = load_inflation_data()
 
@@ -166,6 +299,7 @@ translations = {
         "area_chart": "Wykres obszarowy",
         "bar_chart": "Wykres słupkowy",
         "help_section": "ℹ️ Pomoc",
+        "apply_params": "✅ Zastosuj parametry",
         "help_content": """
         ### Jak korzystać z symulatora:
         1. **Alokacja metali**: Ustaw początkowy podział między złoto, srebro, platynę i pallad (suma musi wynosić 100%)
@@ -242,6 +376,7 @@ translations = {
         "area_chart": "Flächendiagramm",
         "bar_chart": "Balkendiagramm",
         "help_section": "ℹ️ Hilfe",
+        "apply_params": "✅ Parameter übernehmen",
         "help_content": """
         ### Anleitung zur Verwendung des Simulators:
         1. **Metallallokation**: Legen Sie die Anfangsverteilung zwischen Gold, Silber, Platin und Palladium fest (Summe muss 100% betragen)
@@ -269,6 +404,34 @@ def show_tooltip(text, help_text):
     """Wyświetla tekst z podpowiedzią"""
     return f"{text} ℹ️" if help_text else text
 
+def validate_params(initial_date, end_purchase_date, allocations, trend_priorities):
+    """
+    Sprawdza spójność parametrów z formularza (raz na zatwierdzenie).
+
+    Returns:
+    --------
+    dict
+        "years" - długość okresu zakupów w latach,
+        "errors" - komunikaty błędów ("dates", "allocation", "trend")
+    """
+    # Obliczenie liczby lat zakupów
+    days_difference = (pd.to_datetime(end_purchase_date) - pd.to_datetime(initial_date)).days
+    years_difference = days_difference / 365.25  # uwzględnia przestępne lata
+
+    errors = {}
+    if years_difference < 7:
+        errors["dates"] = f"⚠️ Zakres zakupów: tylko {years_difference:.1f} lat. (minimum 7 lat wymagane!)"
+
+    total = sum(allocations)
+    if total != 100:
+        errors["allocation"] = f"❗ Suma alokacji: {total}% – musi wynosić dokładnie 100%, aby kontynuować."
+
+    total_trend = sum(trend_priorities)
+    if total_trend != 100:
+        errors["trend"] = f"❗ Suma przydziału TREND wynosi {total_trend}%. Musi być dokładnie 100%, aby kontynuować."
+
+    return {"years": years_difference, "errors": errors}
+
 # =========================================
 # 4. Sidebar: Parametry użytkownika
 # =========================================
@@ -279,1107 +442,570 @@ st.sidebar.header(translations[language]["simulation_settings"])
 with st.sidebar.expander(translations[language]["help_section"]):
     st.markdown(translations[language]["help_content"])
 
-# Inwestycja: Kwoty i daty
-st.sidebar.subheader(translations[language]["investment_amounts"])
-
-today = datetime.today()
-default_initial_date = today.replace(year=today.year - 20)
-
-initial_allocation = st.sidebar.number_input(
-    translations[language]["initial_allocation"], 
-    value=100000.0, 
-    step=100.0,
-    help="Kwota początkowej inwestycji w metale szlachetne"
-)
-
-initial_date = st.sidebar.date_input(
-    translations[language]["first_purchase_date"], 
-    value=default_initial_date.date(), 
-    min_value=data.index.min().date(), 
-    max_value=data.index.max().date(),
-    help="Data pierwszego zakupu metali szlachetnych"
+# ⚡ Tryb na żywo: każda zmiana parametru od razu pokazuje przybliżony wynik
+live_mode = st.sidebar.toggle(
+    "⚡ Tryb na żywo",
+    value=False,
+    help="Zmiany parametrów działają natychmiast: najpierw przybliżenie na cenach miesięcznych, potem dokładna symulacja dzienna"
 )
 
-# Wyznacz minimalną datę końca (initial_date + 7 lat)
-min_end_date = (pd.to_datetime(initial_date) + pd.DateOffset(years=7)).date()
+# Przełączniki zmieniające zestaw pól formularza działają od razu
+st.sidebar.subheader(translations[language]["recurring_purchases"])
 
-if min_end_date > data.index.max().date():
-    min_end_date = data.index.max().date()
+freq_options = {"Brak": "Brak", "Tydzień": "Tydzień", "Miesiąc": "Miesiąc", "Kwartał": "Kwartał"}
+if language == "Deutsch":
+    freq_options = {"Brak": "Keine", "Tydzień": "Woche", "Miesiąc": "Monat", "Kwartał": "Quartal"}
 
-end_purchase_date = st.sidebar.date_input(
-    translations[language]["last_purchase_date"],
-    value=data.index.max().date(), 
-    min_value=min_end_date, 
-    max_value=data.index.max().date(),
-    help="Data ostatniego możliwego zakupu (koniec symulacji)"
+purchase_freq = st.sidebar.selectbox(
+    translations[language]["purchase_frequency"],
+    list(freq_options.keys()),
+    index=1,
+    format_func=lambda x: freq_options[x],
+    help="Jak często dokonywać dokupów metali"
 )
 
-# Obliczenie liczby lat zakupów
-days_difference = (pd.to_datetime(end_purchase_date) - pd.to_datetime(initial_date)).days
-years_difference = days_difference / 365.25  # uwzględnia przestępne lata
-
-# ✅ / ⚠️ Dynamiczny komunikat
-if years_difference >= 7:
-    st.sidebar.success(f"✅ Zakres zakupów: {years_difference:.1f} lat.")
-    dates_valid = True
-else:
-    st.sidebar.error(f"⚠️ Zakres zakupów: tylko {years_difference:.1f} lat. (minimum 7 lat wymagane!)")
-    dates_valid = False
-
-# Alokacja metali
-st.sidebar.subheader(translations[language]["metal_allocation"])
+# TREND - aktywacja
+trend_active = st.sidebar.checkbox(
+    "Aktywuj strategię TREND",
+    value=False,
+    help="Włącz dynamiczną alokację na podstawie historycznych zmian cen"
+)
 
-for metal, default in {"Gold": 40, "Silver": 20, "Platinum": 20, "Palladium": 20}.items():
+# Wartości domyślne suwaków alokacji i priorytetów TREND
+for metal, default in default_allocation.items():
     if f"alloc_{metal}" not in st.session_state:
         st.session_state[f"alloc_{metal}"] = default
 
-if st.sidebar.button("🔄 Resetuj do 40/20/20/20"):
-    st.session_state["alloc_Gold"] = 40
-    st.session_state["alloc_Silver"] = 20
-    st.session_state["alloc_Platinum"] = 20
-    st.session_state["alloc_Palladium"] = 20
-    st.rerun()
+for place, default in enumerate(default_trend, start=1):
+    if f"trend_{place}" not in st.session_state:
+        st.session_state[f"trend_{place}"] = default
 
-allocation_gold = st.sidebar.slider(translations[language]["metals"]["Gold"], 0, 100, key="alloc_Gold")
-allocation_silver = st.sidebar.slider(translations[language]["metals"]["Silver"], 0, 100, key="alloc_Silver")
-allocation_platinum = st.sidebar.slider(translations[language]["metals"]["Platinum"], 0, 100, key="alloc_Platinum")
-allocation_palladium = st.sidebar.slider(translations[language]["metals"]["Palladium"], 0, 100, key="alloc_Palladium")
+if st.sidebar.button(f"🔄 Resetuj do {'/'.join(map(str, default_allocation.values()))}"):
+    for metal, default in default_allocation.items():
+        st.session_state[f"alloc_{metal}"] = default
+    st.session_state.pop("param_check", None)
+    st.rerun()
 
-total = allocation_gold + allocation_silver + allocation_platinum + allocation_palladium
-if total != 100:
-    st.title("Symulator ReBalancingu Portfela Metali Szlachetnych")
-    st.error(f"❗ Suma alokacji: {total}% – musi wynosić dokładnie 100%, aby kontynuować.")
-    st.stop()
+if st.sidebar.button(f"🔄 Resetuj TREND do {'/'.join(map(str, default_trend))}"):
+    for place, default in enumerate(default_trend, start=1):
+        st.session_state[f"trend_{place}"] = default
+    st.session_state.pop("param_check", None)
+    st.rerun()
 
-allocation = {
-    "Gold": allocation_gold / 100,
-    "Silver": allocation_silver / 100,
-    "Platinum": allocation_platinum / 100,
-    "Palladium": allocation_palladium / 100
+# Fixingi wykonania zdarzeń (engine.EXECUTION_EVENTS) - wybór widoczny tylko
+# dla danych z kilkoma notowaniami dziennie
+EXECUTION_EVENT_LABELS = {
+    "purchase": "Fixing zakupów",
+    "rebalance": "Fixing ReBalancingu",
+    "storage_fee": "Fixing sprzedaży na koszty magazynowania",
+    "valuation": "Fixing wyceny portfela",
 }
+DEFAULT_FIX_LABEL = "domyślny"
 
-# Zakupy cykliczne
-st.sidebar.subheader(translations[language]["recurring_purchases"])
+# Pozostałe parametry w formularzu: zmiany są wysyłane razem jednym przyciskiem,
+# więc edycja kilku pól powoduje jedno przeładowanie zamiast jednego na każde pole.
+# W trybie na żywo pola działają bez formularza - każda zmiana jest zatwierdzeniem.
+params_box = st.sidebar.container() if live_mode else st.sidebar.form("sidebar_params")
+with params_box:
 
-freq_options = {"Brak": "Brak", "Tydzień": "Tydzień", "Miesiąc": "Miesiąc", "Kwartał": "Kwartał"}
-if language == "Deutsch":
-    freq_options = {"Brak": "Keine", "Tydzień": "Woche", "Miesiąc": "Monat", "Kwartał": "Quartal"}
-    
-purchase_freq = st.sidebar.selectbox(
-    translations[language]["purchase_frequency"], 
-    list(freq_options.keys()), 
-    index=1,
-    format_func=lambda x: freq_options[x],
-    help="Jak często dokonywać dokupów metali"
-)
+    # Inwestycja: Kwoty i daty
+    st.subheader(translations[language]["investment_amounts"])
 
-if purchase_freq == "Tydzień":
-    days_of_week = ["Poniedziałek", "Wtorek", "Środa", "Czwartek", "Piątek"]
-    if language == "Deutsch":
-        days_of_week = ["Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag"]
-    
-    selected_day = st.sidebar.selectbox(
-        translations[language]["purchase_day_of_week"], 
-        days_of_week, 
-        index=0,
-        help="Dzień tygodnia, w którym będą dokonywane zakupy"
+    today = datetime.today()
+    default_initial_date = today.replace(year=today.year - 20)
+
+    initial_allocation = st.number_input(
+        translations[language]["initial_allocation"],
+        value=100000.0,
+        step=100.0,
+        help="Kwota początkowej inwestycji w metale szlachetne"
     )
-    purchase_day = days_of_week.index(selected_day)
-    default_purchase_amount = 250.0
-elif purchase_freq == "Miesiąc":
-    purchase_day = st.sidebar.number_input(
-        translations[language]["purchase_day_of_month"], 
-        min_value=1, 
-        max_value=28, 
-        value=1,
-        help="Dzień miesiąca (1-28), w którym będą dokonywane zakupy"
+
+    initial_date = st.date_input(
+        translations[language]["first_purchase_date"],
+        value=default_initial_date.date(),
+        min_value=data.index.min().date(),
+        max_value=data.index.max().date(),
+        help="Data pierwszego zakupu metali szlachetnych"
     )
-    default_purchase_amount = 1000.0
-elif purchase_freq == "Kwartał":
-    purchase_day = st.sidebar.number_input(
-        translations[language]["purchase_day_of_quarter"], 
-        min_value=1, 
-        max_value=28, 
-        value=1,
-        help="Dzień kwartału (1-28 pierwszego miesiąca), w którym będą dokonywane zakupy"
+
+    # Wyznacz minimalną datę końca (initial_date + 7 lat)
+    min_end_date = (pd.to_datetime(initial_date) + pd.DateOffset(years=7)).date()
+
+    if min_end_date > data.index.max().date():
+        min_end_date = data.index.max().date()
+
+    end_purchase_date = st.date_input(
+        translations[language]["last_purchase_date"],
+        value=data.index.max().date(),
+        min_value=min_end_date,
+        max_value=data.index.max().date(),
+        help="Data ostatniego możliwego zakupu (koniec symulacji)"
     )
-    default_purchase_amount = 3250.0
-else:
-    purchase_day = None
-    default_purchase_amount = 0.0
-
-purchase_amount = st.sidebar.number_input(
-    translations[language]["purchase_amount"], 
-    value=default_purchase_amount, 
-    step=50.0,
-    help="Kwota przeznaczana na każdy regularny zakup"
-)
 
-# ReBalancing
-st.sidebar.subheader(translations[language]["rebalancing"])
+    # Alokacja metali
+    st.subheader(translations[language]["metal_allocation"])
 
-# Domyślne daty ReBalancingu bazujące na dacie pierwszego zakupu
-rebalance_base_year = initial_date.year + 1
+    allocation_percent = {
+        metal: st.slider(translations[language]["metals"].get(metal, metal), 0, 100, key=f"alloc_{metal}")
+        for metal in assets
+    }
 
-rebalance_1_default = datetime(rebalance_base_year, 4, 1)
-rebalance_2_default = datetime(rebalance_base_year, 10, 1)
+    # Zakupy cykliczne
+    if purchase_freq == "Tydzień":
+        days_of_week = ["Poniedziałek", "Wtorek", "Środa", "Czwartek", "Piątek"]
+        if language == "Deutsch":
+            days_of_week = ["Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag"]
+
+        selected_day = st.selectbox(
+            translations[language]["purchase_day_of_week"],
+            days_of_week,
+            index=0,
+            help="Dzień tygodnia, w którym będą dokonywane zakupy"
+        )
+        purchase_day = days_of_week.index(selected_day)
+        default_purchase_amount = 250.0
+    elif purchase_freq == "Miesiąc":
+        purchase_day = st.number_input(
+            translations[language]["purchase_day_of_month"],
+            min_value=1,
+            max_value=28,
+            value=1,
+            help="Dzień miesiąca (1-28), w którym będą dokonywane zakupy"
+        )
+        default_purchase_amount = 1000.0
+    elif purchase_freq == "Kwartał":
+        purchase_day = st.number_input(
+            translations[language]["purchase_day_of_quarter"],
+            min_value=1,
+            max_value=28,
+            value=1,
+            help="Dzień kwartału (1-28 pierwszego miesiąca), w którym będą dokonywane zakupy"
+        )
+        default_purchase_amount = 3250.0
+    else:
+        purchase_day = None
+        default_purchase_amount = 0.0
+
+    purchase_amount = st.number_input(
+        translations[language]["purchase_amount"],
+        value=default_purchase_amount,
+        step=50.0,
+        help="Kwota przeznaczana na każdy regularny zakup"
+    )
 
-# ReBalancing 1
-rebalance_1 = st.sidebar.checkbox(
-    translations[language]["rebalance_1"], 
-    value=True,
-    help="Włącz pierwszy cykliczny rebalancing portfela"
-)
-rebalance_1_condition = st.sidebar.checkbox(
-    translations[language]["deviation_condition"] + " 1", 
-    value=False,
-    help="Rebalancing 1 nastąpi tylko gdy odchylenie przekroczy próg"
-)
-rebalance_1_threshold = st.sidebar.number_input(
-    translations[language]["deviation_threshold"] + " 1", 
-    min_value=0.0, 
-    max_value=100.0, 
-    value=12.0, 
-    step=0.5,
-    help="Rebalancing 1 nastąpi tylko gdy odchylenie przekroczy ten próg (w %)"
-)
+    # ReBalancing
+    st.subheader(translations[language]["rebalancing"])
 
-rebalance_1_start = st.sidebar.date_input(
-    translations[language]["start_rebalance"] + " 1",
-    value=rebalance_1_default.date(),
-    min_value=data.index.min().date(),
-    max_value=data.index.max().date(),
-    help="Data rozpoczęcia pierwszego rebalancingu"
-)
+    # Domyślne daty ReBalancingu bazujące na dacie pierwszego zakupu
+    rebalance_base_year = initial_date.year + 1
 
-# ReBalancing 2
-rebalance_2 = st.sidebar.checkbox(
-    translations[language]["rebalance_2"], 
-    value=False,
-    help="Włącz drugi cykliczny rebalancing portfela"
-)
-rebalance_2_condition = st.sidebar.checkbox(
-    translations[language]["deviation_condition"] + " 2", 
-    value=False,
-    help="Rebalancing 2 nastąpi tylko gdy odchylenie przekroczy próg"
-)
-rebalance_2_threshold = st.sidebar.number_input(
-    translations[language]["deviation_threshold"] + " 2", 
-    min_value=0.0, 
-    max_value=100.0, 
-    value=12.0, 
-    step=0.5,
-    help="Rebalancing 2 nastąpi tylko gdy odchylenie przekroczy ten próg (w %)"
-)
+    rebalance_1_default = datetime(rebalance_base_year, 4, 1)
+    rebalance_2_default = datetime(rebalance_base_year, 10, 1)
 
-rebalance_2_start = st.sidebar.date_input(
-    translations[language]["start_rebalance"] + " 2",
-    value=rebalance_2_default.date(),
-    min_value=data.index.min().date(),
-    max_value=data.index.max().date(),
-    help="Data rozpoczęcia drugiego rebalancingu"
-)
+    # ReBalancing 1
+    rebalance_1 = st.checkbox(
+        translations[language]["rebalance_1"],
+        value=True,
+        help="Włącz pierwszy cykliczny rebalancing portfela"
+    )
+    rebalance_1_condition = st.checkbox(
+        translations[language]["deviation_condition"] + " 1",
+        value=False,
+        help="Rebalancing 1 nastąpi tylko gdy odchylenie przekroczy próg"
+    )
+    rebalance_1_threshold = st.number_input(
+        translations[language]["deviation_threshold"] + " 1",
+        min_value=0.0,
+        max_value=100.0,
+        value=12.0,
+        step=0.5,
+        help="Rebalancing 1 nastąpi tylko gdy odchylenie przekroczy ten próg (w %)"
+    )
 
-# ♟️ TREND: Dynamiczna alokacja na podstawie zmian cen
+    rebalance_1_start = st.date_input(
+        translations[language]["start_rebalance"] + " 1",
+        value=rebalance_1_default.date(),
+        min_value=data.index.min().date(),
+        max_value=data.index.max().date(),
+        help="Data rozpoczęcia pierwszego rebalancingu"
+    )
 
-st.sidebar.markdown("---")
-st.sidebar.header("♟️ TREND: " + translations[language]["trend_strategy"])
+    # ReBalancing 2
+    rebalance_2 = st.checkbox(
+        translations[language]["rebalance_2"],
+        value=False,
+        help="Włącz drugi cykliczny rebalancing portfela"
+    )
+    rebalance_2_condition = st.checkbox(
+        translations[language]["deviation_condition"] + " 2",
+        value=False,
+        help="Rebalancing 2 nastąpi tylko gdy odchylenie przekroczy próg"
+    )
+    rebalance_2_threshold = st.number_input(
+        translations[language]["deviation_threshold"] + " 2",
+        min_value=0.0,
+        max_value=100.0,
+        value=12.0,
+        step=0.5,
+        help="Rebalancing 2 nastąpi tylko gdy odchylenie przekroczy ten próg (w %)"
+    )
 
-# TREND - aktywacja
-trend_active = st.sidebar.checkbox(
-    "Aktywuj strategię TREND", 
-    value=False,
-    help="Włącz dynamiczną alokację na podstawie historycznych zmian cen"
-)
+    rebalance_2_start = st.date_input(
+        translations[language]["start_rebalance"] + " 2",
+        value=rebalance_2_default.date(),
+        min_value=data.index.min().date(),
+        max_value=data.index.max().date(),
+        help="Data rozpoczęcia drugiego rebalancingu"
+    )
 
-# TREND - nowe opcje
-if trend_active:
-    # Wybór okresu analizy trendu
-    trend_period_options = {
-        "Od ostatniego zakupu": "last_purchase", 
-        "1 tydzień": 7,
-        "1 miesiąc": 30, 
-        "3 miesiące": 90, 
-        "1 rok": 365
-    }
-    
-    # Zmiana nazw dla języka niemieckiego
-    if language == "Deutsch":
+    # ♟️ TREND: Dynamiczna alokacja na podstawie zmian cen
+
+    st.markdown("---")
+    st.header("♟️ TREND: " + translations[language]["trend_strategy"])
+
+    # TREND - nowe opcje
+    if trend_active:
+        # Wybór okresu analizy trendu
         trend_period_options = {
-            "Seit letztem Kauf": "last_purchase", 
-            "1 Woche": 7,
-            "1 Monat": 30, 
-            "3 Monate": 90, 
-            "1 Jahr": 365
+            "Od ostatniego zakupu": "last_purchase",
+            "1 tydzień": 7,
+            "1 miesiąc": 30,
+            "3 miesiące": 90,
+            "1 rok": 365
         }
-    
-    trend_period_choice = st.sidebar.selectbox(
-        translations[language]["trend_period"],
-        options=list(trend_period_options.keys()),
-        index=0,
-        help="Okres, za który analizowane są zmiany cen metali"
-    )
-    trend_period = trend_period_options[trend_period_choice]
-    
-    # Wybór strategii TREND
-    trend_strategy_options = {
-        "Prosta (na podstawie zmian cen)": "simple", 
-        "Momentum (z uwzględnieniem przyspieszenia)": "momentum",
-        "MACD (z sygnałami technicznymi)": "macd"
-    }
-    
-    # Zmiana nazw dla języka niemieckiego
-    if language == "Deutsch":
+
+        # Zmiana nazw dla języka niemieckiego
+        if language == "Deutsch":
+            trend_period_options = {
+                "Seit letztem Kauf": "last_purchase",
+                "1 Woche": 7,
+                "1 Monat": 30,
+                "3 Monate": 90,
+                "1 Jahr": 365
+            }
+
+        trend_period_choice = st.selectbox(
+            translations[language]["trend_period"],
+            options=list(trend_period_options.keys()),
+            index=0,
+            help="Okres, za który analizowane są zmiany cen metali"
+        )
+        trend_period = trend_period_options[trend_period_choice]
+
+        # Wybór strategii TREND
         trend_strategy_options = {
-            "Einfach (basierend auf Preisänderungen)": "simple", 
-            "Momentum (mit Beschleunigung)": "momentum",
-            "MACD (mit technischen Signalen)": "macd"
+            "Prosta (na podstawie zmian cen)": "simple",
+            "Momentum (z uwzględnieniem przyspieszenia)": "momentum",
+            "MACD (z sygnałami technicznymi)": "macd"
         }
-    
-    trend_strategy = st.sidebar.selectbox(
-        translations[language]["trend_strategy"],
-        options=list(trend_strategy_options.keys()),
-        index=0,
-        help="Metoda analizy trendów i przydzielania alokacji"
-    )
-    trend_strategy_type = trend_strategy_options[trend_strategy]
-    
-    # Ograniczenie maksymalnych zmian alokacji
-    max_allocation_change = st.sidebar.slider(
-        translations[language]["max_allocation_change"],
-        min_value=0,
-        max_value=100,
-        value=50,
-        step=5,
-        help="Ograniczenie maksymalnej zmiany alokacji pomiędzy zakupami"
-    )
 
-# TREND - suwaki przydziału % dla miejsc 1-4
-with st.sidebar.expander("⚙️ Ustawienia TREND", expanded=trend_active):
-    if "trend_1" not in st.session_state:
-        st.session_state["trend_1"] = 40
-        st.session_state["trend_2"] = 30
-        st.session_state["trend_3"] = 20
-        st.session_state["trend_4"] = 10
-
-    if st.button("🔄 Resetuj TREND do 40/30/20/10"):
-        st.session_state["trend_1"] = 40
-        st.session_state["trend_2"] = 30
-        st.session_state["trend_3"] = 20
-        st.session_state["trend_4"] = 10
-        st.rerun()
+        # Zmiana nazw dla języka niemieckiego
+        if language == "Deutsch":
+            trend_strategy_options = {
+                "Einfach (basierend auf Preisänderungen)": "simple",
+                "Momentum (mit Beschleunigung)": "momentum",
+                "MACD (mit technischen Signalen)": "macd"
+            }
+
+        trend_strategy = st.selectbox(
+            translations[language]["trend_strategy"],
+            options=list(trend_strategy_options.keys()),
+            index=0,
+            help="Metoda analizy trendów i przydzielania alokacji"
+        )
+        trend_strategy_type = trend_strategy_options[trend_strategy]
+
+        # Ograniczenie maksymalnych zmian alokacji
+        max_allocation_change = st.slider(
+            translations[language]["max_allocation_change"],
+            min_value=0,
+            max_value=100,
+            value=50,
+            step=5,
+            help="Ograniczenie maksymalnej zmiany alokacji pomiędzy zakupami"
+        )
+
+    # TREND - suwaki przydziału % dla kolejnych miejsc rankingu (dalsze miejsca dostają 0%)
+    with st.expander("⚙️ Ustawienia TREND", expanded=trend_active):
+        trend_priorities = []
+        for place in range(1, len(default_trend) + 1):
+            if place == 1:
+                label, help_text = "📈 Priorytet 1 (najlepszy metal) [%]", "Alokacja dla najlepszego metalu"
+            elif place == len(assets):
+                label, help_text = f"📉 Priorytet {place} (najsłabszy metal) [%]", "Alokacja dla najsłabszego metalu"
+            else:
+                icon = "📈" if place <= len(assets) / 2 else "📉"
+                label, help_text = f"{icon} Priorytet {place} [%]", f"Alokacja dla metalu na miejscu {place}"
+            trend_priorities.append(st.slider(label, 0, 100, key=f"trend_{place}", help=help_text))
+
+    # 📦 Koszty magazynowania
+    with st.expander("📦 " + translations[language]["storage_costs"], expanded=False):
+        storage_fee = st.number_input(
+            "Roczny koszt magazynowania (%)",
+            value=1.5,
+            help="Roczna opłata za przechowywanie metali"
+        )
+        vat = st.number_input(
+            "VAT (%)",
+            value=19.0,
+            help="Podatek VAT naliczany na koszty magazynowania"
+        )
+        storage_options = [*assets, "Best of year", "ALL"]
+        storage_metal = st.selectbox(
+            "Metal do pokrycia kosztów",
+            storage_options,
+            index=storage_options.index(asset_defaults["storage_metal"]),
+            help="Metal, który będzie sprzedawany na pokrycie kosztów magazynowania"
+        )
 
-    trend_1 = st.slider("📈 Priorytet 1 (najlepszy metal) [%]", 0, 100, key="trend_1", help="Alokacja dla najlepszego metalu")
-    trend_2 = st.slider("📈 Priorytet 2 [%]", 0, 100, key="trend_2", help="Alokacja dla drugiego najlepszego metalu")
-    trend_3 = st.slider("📉 Priorytet 3 [%]", 0, 100, key="trend_3", help="Alokacja dla trzeciego najlepszego metalu")
-    trend_4 = st.slider("📉 Priorytet 4 (najsłabszy metal) [%]", 0, 100, key="trend_4", help="Alokacja dla najsłabszego metalu")
+    # 📊 Marże i prowizje
+    with st.expander("📊 " + translations[language]["margins_fees"], expanded=False):
+        margins = {
+            metal: st.number_input(f"Marża {metal} (%)", value=asset_defaults["margins"][metal],
+                                   help=f"Narzut na cenę {metal_name(metal, genitive=True)} przy zakupie")
+            for metal in assets
+        }
 
-    total_trend = trend_1 + trend_2 + trend_3 + trend_4
-    if total_trend != 100:
-        st.error(f"❗ Suma przydziału TREND wynosi {total_trend}%. Musi być dokładnie 100%, aby kontynuować.")
-        st.stop()
-
-# 📦 Koszty magazynowania
-with st.sidebar.expander("📦 " + translations[language]["storage_costs"], expanded=False):
-    storage_fee = st.number_input(
-        "Roczny koszt magazynowania (%)", 
-        value=1.5,
-        help="Roczna opłata za przechowywanie metali"
-    )
-    vat = st.number_input(
-        "VAT (%)", 
-        value=19.0,
-        help="Podatek VAT naliczany na koszty magazynowania"
-    )
-    storage_metal = st.selectbox(
-        "Metal do pokrycia kosztów",
-        ["Gold", "Silver", "Platinum", "Palladium", "Best of year", "ALL"],
-        help="Metal, który będzie sprzedawany na pokrycie kosztów magazynowania"
+    # 💵 Ceny odkupu metali od ceny SPOT (-%)
+    with st.expander("💵 " + translations[language]["buyback_prices"], expanded=False):
+        buyback_discounts = {
+            metal: st.number_input(f"{metal_name(metal)} odk. od SPOT (%)", value=asset_defaults["buyback_discounts"][metal],
+                                   step=0.1, help=f"Zniżka od ceny SPOT przy sprzedaży {metal_name(metal, genitive=True)}")
+            for metal in assets
+        }
+
+    # ♻️ Ceny ReBalancing metali (%)
+    with st.expander("♻️ " + translations[language]["rebalance_prices"], expanded=False):
+        rebalance_markup = {
+            metal: st.number_input(f"{metal_name(metal)} ReBalancing (%)", value=asset_defaults["rebalance_markup"][metal],
+                                   step=0.1, help=f"Narzut na cenę {metal_name(metal, genitive=True)} przy rebalancingu")
+            for metal in assets
+        }
+
+    # 🕐 Fixingi wykonania (tylko dla danych z kilkoma notowaniami dziennie)
+    execution_fix = {}
+    available_fixes = price_fixes(data)
+    if available_fixes:
+        with st.expander("🕐 Fixingi wykonania", expanded=False):
+            for event, label in EXECUTION_EVENT_LABELS.items():
+                fix = st.selectbox(
+                    label,
+                    [DEFAULT_FIX_LABEL, *available_fixes],
+                    key=f"execution_fix_{event}",
+                    help="Notowanie dnia, po którym wykonywane jest zdarzenie (domyślny - fixing PM lub ostatni w ciągu dnia)"
+                )
+                if fix != DEFAULT_FIX_LABEL:
+                    execution_fix[event] = fix
+
+    params_submitted = live_mode or st.form_submit_button(translations[language]["apply_params"])
+
+# Walidacja tylko po zatwierdzeniu formularza (lub przy pierwszym uruchomieniu)
+if params_submitted or "param_check" not in st.session_state:
+    st.session_state.param_check = validate_params(
+        initial_date,
+        end_purchase_date,
+        list(allocation_percent.values()),
+        trend_priorities
     )
+param_check = st.session_state.param_check
 
-# 📊 Marże i prowizje
-with st.sidebar.expander("📊 " + translations[language]["margins_fees"], expanded=False):
-    margins = {
-        "Gold": st.number_input("Marża Gold (%)", value=15.6, help="Narzut na cenę złota przy zakupie"),
-        "Silver": st.number_input("Marża Silver (%)", value=18.36, help="Narzut na cenę srebra przy zakupie"),
-        "Platinum": st.number_input("Marża Platinum (%)", value=24.24, help="Narzut na cenę platyny przy zakupie"),
-        "Palladium": st.number_input("Marża Palladium (%)", value=22.49, help="Narzut na cenę palladu przy zakupie")
-    }
+# ✅ / ⚠️ Dynamiczny komunikat
+years_difference = param_check["years"]
+dates_valid = "dates" not in param_check["errors"]
+if dates_valid:
+    st.sidebar.success(f"✅ Zakres zakupów: {years_difference:.1f} lat.")
+else:
+    st.sidebar.error(param_check["errors"]["dates"])
 
-# 💵 Ceny odkupu metali od ceny SPOT (-%)
-with st.sidebar.expander("💵 " + translations[language]["buyback_prices"], expanded=False):
-    buyback_discounts = {
-        "Gold": st.number_input("Złoto odk. od SPOT (%)", value=-1.5, step=0.1, help="Zniżka od ceny SPOT przy sprzedaży złota"),
-        "Silver": st.number_input("Srebro odk. od SPOT (%)", value=-3.0, step=0.1, help="Zniżka od ceny SPOT przy sprzedaży srebra"),
-        "Platinum": st.number_input("Platyna odk. od SPOT (%)", value=-3.0, step=0.1, help="Zniżka od ceny SPOT przy sprzedaży platyny"),
-        "Palladium": st.number_input("Pallad odk. od SPOT (%)", value=-3.0, step=0.1, help="Zniżka od ceny SPOT przy sprzedaży palladu")
-    }
+blocking_errors = [msg for key, msg in param_check["errors"].items() if key != "dates"]
+if blocking_errors:
+    st.title("Symulator ReBalancingu Portfela Metali Szlachetnych")
+    for msg in blocking_errors:
+        st.error(msg)
+    st.stop()
 
-# ♻️ Ceny ReBalancing metali (%)
-with st.sidebar.expander("♻️ " + translations[language]["rebalance_prices"], expanded=False):
-    rebalance_markup = {
-        "Gold": st.number_input("Złoto ReBalancing (%)", value=6.5, step=0.1, help="Narzut na cenę złota przy rebalancingu"),
-        "Silver": st.number_input("Srebro ReBalancing (%)", value=6.5, step=0.1, help="Narzut na cenę srebra przy rebalancingu"),
-        "Platinum": st.number_input("Platyna ReBalancing (%)", value=6.5, step=0.1, help="Narzut na cenę platyny przy rebalancingu"),
-        "Palladium": st.number_input("Pallad ReBalancing (%)", value=6.5, step=0.1, help="Narzut na cenę palladu przy rebalancingu")
-    }
+allocation = {metal: percent / 100 for metal, percent in allocation_percent.items()}
+
+# =========================================
+# 5. Parametry symulacji
+# =========================================
+
+# Parametry bieżącej symulacji (zapisywane razem z wynikami przy eksporcie)
+run_config = {
+    "initial_allocation": initial_allocation,
+    "initial_date": initial_date,
+    "end_purchase_date": end_purchase_date,
+    "allocation": allocation,
+    "purchase_freq": purchase_freq,
+    "purchase_day": purchase_day,
+    "purchase_amount": purchase_amount,
+    "rebalance_1": rebalance_1,
+    "rebalance_1_condition": rebalance_1_condition,
+    "rebalance_1_threshold": rebalance_1_threshold,
+    "rebalance_1_start": rebalance_1_start,
+    "rebalance_2": rebalance_2,
+    "rebalance_2_condition": rebalance_2_condition,
+    "rebalance_2_threshold": rebalance_2_threshold,
+    "rebalance_2_start": rebalance_2_start,
+    "trend_active": trend_active,
+    "trend_period": trend_period if trend_active else DEFAULT_CONFIG["trend_period"],
+    "trend_strategy_type": trend_strategy_type if trend_active else DEFAULT_CONFIG["trend_strategy_type"],
+    "max_allocation_change": max_allocation_change if trend_active else DEFAULT_CONFIG["max_allocation_change"],
+    "trend_priorities": trend_priorities,
+    "storage_fee": storage_fee,
+    "vat": vat,
+    "storage_metal": storage_metal,
+    "margins": margins,
+    "buyback_discounts": buyback_discounts,
+    "rebalance_markup": rebalance_markup,
+}
+if execution_fix:
+    run_config["execution_fix"] = execution_fix
+
+# =========================================
+# 6. Sekcje wyników (fragmenty)
+# =========================================
+
+# Każda sekcja wyników jest fragmentem: zmiana jej widżetu (typ wykresu,
+# przełącznik analizy, format eksportu) wykonuje ponownie tylko tę sekcję,
+# a nie cały skrypt z panelem bocznym i symulacją.
+
+# Kolory metali (pozostałe aktywa - kolejne kolory palety tab10)
+metal_colors = {
+    "Gold": "#D4AF37",      # złoto
+    "Silver": "#C0C0C0",    # srebro
+    "Platinum": "#E5E4E2",  # platyna
+    "Palladium": "#CED0DD"  # pallad
+}
+_palette = sns.color_palette("tab10").as_hex()
+for _k, _metal in enumerate(m for m in assets if m not in metal_colors):
+    metal_colors[_metal] = _palette[_k % len(_palette)]
+
+
+def export_builder(result, trend_data, config, kind="csv", compression=None):
+    """
+    Funkcja bez argumentów budująca plik eksportu wyników (dane dla st.download_button).
+
+    Streamlit wywołuje ją dopiero po kliknięciu przycisku pobierania, więc
+    przebiegi fragmentu nie zapisują wyników; plik powstaje strumieniowo
+    na dysku i nie jest buforowany w pamięci między pobraniami.
+    """
+    if kind == "zip":
+        write = lambda f: write_archive(
+            f, config, result, data, config["buyback_discounts"], trend_data, compression=compression
+        )
+    elif kind == "parquet":
+        write = lambda f: write_parquet(result, f)
+    else:
+        write = lambda f: write_csv(result, f, compression=compression)
+
+    def build():
+        with spool_export(write) as f:
+            return f.read()
+
+    return build
+
+
+@st.fragment
+def show_results_summary(result, trend_data, config):
+    """Wykres wartości portfela, eksport wyników i podsumowanie."""
+    storage_fee, vat = config["storage_fee"], config["vat"]
+
+    # 📈 Wykres wartości portfela: nominalna vs realna vs inwestycje vs koszty magazynowania
+
+    # Przygotowanie danych do wykresu
+    result_plot = result.copy()
+    result_plot["Storage Cost"] = 0.0
+
+    # Oznaczenie kosztu magazynowania w odpowiednich dniach
+    storage_costs = result_plot[result_plot["Akcja"] == "storage_fee"].index
+    for d in storage_costs:
+        result_plot.at[d, "Storage Cost"] = result_plot.at[d, "Invested"] * (storage_fee / 100) * (1 + vat / 100)
+
+    # ❗ Naprawiamy typ danych: wymuszamy float
+    for col in ["Portfolio Value", "Portfolio Value Real", "Invested", "Storage Cost"]:
+        result_plot[col] = pd.to_numeric(result_plot[col], errors="coerce").fillna(0)
+
+    # Stworzenie DataFrame tylko z potrzebnymi seriami
+    chart_data = result_plot[["Portfolio Value", "Portfolio Value Real", "Invested", "Storage Cost"]]
+    chart_start, chart_end = chart_date_range(chart_data.index, key="results_chart_range")
+    chart_data = load_chart(
+        result_data_key(config), f"nav:{config_fingerprint(config)}", chart_data, chart_start, chart_end
+    )
+
+    # Nagłówki bardziej czytelne
+    chart_data = chart_data.rename(columns={
+        "Portfolio Value": f"💰 {translations[language]['portfolio_value']}",
+        "Portfolio Value Real": f"🏛️ {translations[language]['real_portfolio_value']}",
+        "Invested": f"💵 {translations[language]['invested']}",
+        "Storage Cost": f"📦 {translations[language]['storage_cost']}"
+    })
+
+    # 📈 Ładny interaktywny wykres w Streamlit
+    st.subheader(translations[language]["chart_subtitle"])
 
-# Opcje wizualizacji
-with st.sidebar.expander("📊 Opcje wizualizacji", expanded=False):
     viz_options = ["Wykres liniowy", "Wykres obszarowy", "Wykres słupkowy"]
     if language == "Deutsch":
         viz_options = ["Liniendiagramm", "Flächendiagramm", "Balkendiagramm"]
-    
+
     visualization_type = st.selectbox(
         translations[language]["visualization_type"],
         viz_options,
         index=0,
         help="Typ wykresu do prezentacji wyników"
     )
-    
-    show_correlation = st.checkbox(
-        translations[language]["correlation_analysis"], 
-        value=st.session_state.show_correlation_analysis,
-        help="Pokaż analizę korelacji między metalami"
+
+    # Wybór typu wykresu
+    if visualization_type == "Wykres liniowy" or visualization_type == "Liniendiagramm":
+        st.line_chart(chart_data)
+    elif visualization_type == "Wykres obszarowy" or visualization_type == "Flächendiagramm":
+        st.area_chart(chart_data)
+    else:  # Wykres słupkowy
+        st.bar_chart(chart_data)
+
+    # Eksport wyników (zapis strumieniowy porcjami do pliku tymczasowego)
+    export_formats = {
+        "CSV": ("csv", None),
+        "CSV (gzip)": ("csv", "gzip"),
+        "ZIP (parametry + NAV dzienny + TREND)": ("zip", "gzip"),
+    }
+    if parquet_available():
+        export_formats["Parquet"] = ("parquet", None)
+
+    export_choice = st.selectbox(
+        "Format eksportu",
+        list(export_formats.keys()),
+        index=0,
+        help="CSV/Parquet: wyniki zdarzeń; ZIP: parametry, zdarzenia, dzienny NAV i log TREND"
     )
-    # Aktualizacja stanu
-    st.session_state.show_correlation_analysis = show_correlation
-    
-    if trend_active:
-        show_trend_comparison = st.checkbox(
-            translations[language]["trend_comparison"], 
-            value=st.session_state.show_trend_comparison,
-            help="Porównaj strategię TREND ze stałą alokacją"
-        )
-        # Aktualizacja stanu
-        st.session_state.show_trend_comparison = show_trend_comparison
+    export_kind, export_compression = export_formats[export_choice]
+    if export_kind == "zip":
+        export_name, export_mime = "portfolio_simulation.zip", "application/zip"
+    elif export_kind == "parquet":
+        export_name, export_mime = "portfolio_simulation.parquet", "application/octet-stream"
+    else:
+        export_name = "portfolio_simulation" + CSV_SUFFIXES[export_compression]
+        export_mime = "application/gzip" if export_compression else "text/csv"
 
-# =========================================
-# 5. Funkcje pomocnicze (rozbudowane)
-# =========================================
+    # Plik budowany dopiero po kliknięciu - przebiegi fragmentu (np. zmiana wykresu) go nie przeliczają
+    st.download_button(
+        label="📥 " + translations[language]["export_results"],
+        data=export_builder(result, trend_data, config, kind=export_kind, compression=export_compression),
+        file_name=export_name,
+        mime=export_mime,
+        help="Pobierz wyniki symulacji w wybranym formacie"
+    )
 
-def generate_purchase_dates(start_date, freq, day, end_date):
-    """
-    Generuje daty zakupów w oparciu o wybraną częstotliwość.
-    
-    Parameters:
-    -----------
-    start_date : datetime
-        Data początkowa
-    freq : str
-        Częstotliwość zakupów ("Tydzień", "Miesiąc", "Kwartał" lub "Brak")
-    day : int
-        Dzień tygodnia/miesiąca/kwartału na zakup
-    end_date : datetime
-        Data końcowa
-        
-    Returns:
-    --------
-    list
-        Lista dat zakupów
-    """
-    dates = []
-    current = pd.to_datetime(start_date)
-    end_date = pd.to_datetime(end_date)  # upewniamy się, że end_date jest typu datetime
-
-    if freq == "Tydzień":
-        while current <= end_date:
-            while current.weekday() != day:
-                current += timedelta(days=1)
-                if current > end_date:
-                    break
-            if current <= end_date:
-                dates.append(current)
-            current += timedelta(weeks=1)
-
-    elif freq == "Miesiąc":
-        while current <= end_date:
-            current = current.replace(day=min(day, 28))
-            if current <= end_date:
-                dates.append(current)
-            current += pd.DateOffset(months=1)
-
-    elif freq == "Kwartał":
-        while current <= end_date:
-            current = current.replace(day=min(day, 28))
-            if current <= end_date:
-                dates.append(current)
-            current += pd.DateOffset(months=3)
-
-    # Brak zakupów jeśli "Brak"
-    return [data.index[data.index.get_indexer([d], method="nearest")][0] for d in dates if len(data.index.get_indexer([d], method="nearest")) > 0]
-
-def find_best_metal_of_year(start_date, end_date):
-    """
-    Znajduje metal o najlepszych wynikach w danym okresie.
-    
-    Parameters:
-    -----------
-    start_date : datetime
-        Data początkowa
-    end_date : datetime
-        Data końcowa
-        
-    Returns:
-    --------
-    str
-        Nazwa metalu o najlepszych wynikach
-    """
-    start_prices = data.loc[start_date]
-    end_prices = data.loc[end_date]
-    growth = {}
-    for metal in ["Gold", "Silver", "Platinum", "Palladium"]:
-        growth[metal] = (end_prices[metal + "_EUR"] / start_prices[metal + "_EUR"]) - 1
-    return max(growth, key=growth.get)
-
-def calculate_metal_changes(start_date, end_date):
-    """
-    Oblicza zmiany cen metali między dwiema datami.
-    
-    Parameters:
-    -----------
-    start_date : datetime
-        Data początkowa
-    end_date : datetime
-        Data końcowa
-        
-    Returns:
-    --------
-    dict
-        Słownik z procentowymi zmianami dla każdego metalu
-    """
-    changes = {}
-    prices_start = data.loc[start_date]
-    prices_end = data.loc[end_date]
-    for metal in ["Gold", "Silver", "Platinum", "Palladium"]:
-        start_price = prices_start[metal + "_EUR"]
-        end_price = prices_end[metal + "_EUR"]
-        change = (end_price / start_price) - 1
-        changes[metal] = change
-    return changes
-
-def calculate_momentum_allocation(current_date, period_days, trend_priorities):
-    """
-    Oblicza alokację na podstawie strategii momentum.
-    
-    Parameters:
-    -----------
-    current_date : datetime
-        Aktualna data
-    period_days : int
-        Okres analizy w dniach
-    trend_priorities : dict
-        Priorytety alokacji dla poszczególnych miejsc (1-4)
-        
-    Returns:
-    --------
-    dict
-        Słownik z alokacją dla każdego metalu
-    """
-    # Obliczenie dat dla różnych okresów
-    long_period = period_days
-    short_period = max(int(period_days / 3), 7)  # krótkookresowo
-    
-    # Daty
-    current_idx = data.index.get_loc(current_date)
-    
-    # Zapobiegaj wyjściu poza indeks
-    if current_idx < long_period:
-        long_period = current_idx
-    if current_idx < short_period:
-        short_period = current_idx
-    
-    long_start_date = data.index[current_idx - long_period]
-    short_start_date = data.index[current_idx - short_period]
-    
-    # Zmiany cen dla długiego i krótkiego okresu
-    long_changes = calculate_metal_changes(long_start_date, current_date)
-    short_changes = calculate_metal_changes(short_start_date, current_date)
-    
-    # Obliczenie "przyspieszenia" jako różnicy między krótkim a długim okresem
-    acceleration = {}
-    for metal in ["Gold", "Silver", "Platinum", "Palladium"]:
-        acceleration[metal] = short_changes[metal] - (long_changes[metal] * short_period / long_period)
-    
-    # Normalizacja zmian i przyspieszenia do przedziału [0, 1]
-    norm_changes = {}
-    if max(long_changes.values()) != min(long_changes.values()):
-        for metal, change in long_changes.items():
-            norm_changes[metal] = (change - min(long_changes.values())) / (max(long_changes.values()) - min(long_changes.values()))
-    else:
-        for metal in long_changes:
-            norm_changes[metal] = 0.5  # Wszystkie wartości są równe
-    
-    norm_acceleration = {}
-    if max(acceleration.values()) != min(acceleration.values()):
-        for metal, acc in acceleration.items():
-            norm_acceleration[metal] = (acc - min(acceleration.values())) / (max(acceleration.values()) - min(acceleration.values()))
-    else:
-        for metal in acceleration:
-            norm_acceleration[metal] = 0.5  # Wszystkie wartości są równe
-    
-    # Połączenie zmian i przyspieszenia z wagami
-    momentum_score = {}
-    for metal in ["Gold", "Silver", "Platinum", "Palladium"]:
-        momentum_score[metal] = 0.7 * norm_changes[metal] + 0.3 * norm_acceleration[metal]
-    
-    # Sortowanie metali według wyników momentum
-    sorted_metals = sorted(momentum_score.items(), key=lambda x: x[1], reverse=True)
-    
-    # Przypisanie alokacji według priorytetów
-    trend_alloc = {
-        sorted_metals[0][0]: trend_priorities[0],
-        sorted_metals[1][0]: trend_priorities[1],
-        sorted_metals[2][0]: trend_priorities[2],
-        sorted_metals[3][0]: trend_priorities[3],
-    }
-    
-    return trend_alloc, sorted_metals
-
-def calculate_macd_allocation(current_date, trend_priorities):
-    """
-    Oblicza alokację na podstawie sygnałów MACD.
-    
-    Parameters:
-    -----------
-    current_date : datetime
-        Aktualna data
-    trend_priorities : dict
-        Priorytety alokacji dla poszczególnych miejsc (1-4)
-        
-    Returns:
-    --------
-    dict
-        Słownik z alokacją dla każdego metalu
-    """
-    # Parametry MACD
-    fast_window = 12
-    slow_window = 26
-    signal_window = 9
-    
-    macd_scores = {}
-    
-    for metal in ["Gold", "Silver", "Platinum", "Palladium"]:
-        # Pobierz dane historyczne dla metalu
-        current_idx = data.index.get_loc(current_date)
-        start_idx = max(0, current_idx - slow_window * 2)  # Potrzebujemy więcej danych do poprawnego obliczenia
-        
-        price_series = data.iloc[start_idx:current_idx+1][metal + "_EUR"]
-        
-        # Oblicz EMA (wykładnicze średnie kroczące)
-        ema_fast = price_series.ewm(span=fast_window, adjust=False).mean()
-        ema_slow = price_series.ewm(span=slow_window, adjust=False).mean()
-        
-        # Oblicz MACD i linię sygnału
-        macd_line = ema_fast - ema_slow
-        signal_line = macd_line.ewm(span=signal_window, adjust=False).mean()
-        
-        # Oblicz histogram MACD
-        histogram = macd_line - signal_line
-        
-        # Wyznacz siłę trendu na podstawie histogramu i kierunku MACD
-        current_macd = macd_line.iloc[-1]
-        prev_macd = macd_line.iloc[-2] if len(macd_line) > 1 else 0
-        
-        current_histogram = histogram.iloc[-1]
-        prev_histogram = histogram.iloc[-2] if len(histogram) > 1 else 0
-        
-        # Punktacja:
-        # - Jeśli MACD > 0 i rośnie: 👍
-        # - Jeśli MACD > 0 ale spada: 👍 ale mniej
-        # - Jeśli MACD < 0 ale rośnie: 👎 ale mniej
-        # - Jeśli MACD < 0 i spada: 👎
-        
-        # Bazowa punktacja
-        base_score = 1.0 if current_macd > 0 else 0.0
-        
-        # Modyfikator kierunku
-        direction_mod = 0.5 if current_macd > prev_macd else -0.5
-        
-        # Modyfikator histogramu (siła trendu)
-        hist_mod = 0.3 if abs(current_histogram) > abs(prev_histogram) else -0.3
-        
-        # Połączona ocena
-        macd_scores[metal] = base_score + direction_mod + hist_mod
-    
-    # Sortowanie metali według wyników MACD
-    sorted_metals = sorted(macd_scores.items(), key=lambda x: x[1], reverse=True)
-    
-    # Przypisanie alokacji według priorytetów
-    trend_alloc = {
-        sorted_metals[0][0]: trend_priorities[0],
-        sorted_metals[1][0]: trend_priorities[1],
-        sorted_metals[2][0]: trend_priorities[2],
-        sorted_metals[3][0]: trend_priorities[3],
-    }
-    
-    return trend_alloc, sorted_metals
-
-def calculate_trend_allocation(current_date, last_purchase_date, trend_period, trend_strategy_type, trend_priorities):
-    """
-    Oblicza alokację dla strategii TREND na podstawie wybranej metody.
-    
-    Parameters:
-    -----------
-    current_date : datetime
-        Aktualna data
-    last_purchase_date : datetime
-        Data ostatniego zakupu
-    trend_period : str or int
-        Okres analizy ('last_purchase' lub liczba dni)
-    trend_strategy_type : str
-        Typ strategii ('simple', 'momentum', 'macd')
-    trend_priorities : list
-        Lista wartości priorytetów dla miejsc 1-4
-        
-    Returns:
-    --------
-    dict
-        Słownik z alokacją dla każdego metalu
-    """
-    # Ustal datę początkową analizy
-    if trend_period == "last_purchase":
-        start_date = last_purchase_date
-    else:
-        # Oblicz datę początkową na podstawie liczby dni
-        days = int(trend_period)
-        start_date_raw = current_date - pd.Timedelta(days=days)
-        # Znajdź najbliższą datę w danych
-        start_date = data.index[data.index.get_indexer([start_date_raw], method="nearest")][0]
-    
-    # Konwersja priorytetów na ułamki (dzielenie przez 100)
-    trend_priorities_fraction = [
-        trend_priorities[0] / 100,
-        trend_priorities[1] / 100,
-        trend_priorities[2] / 100,
-        trend_priorities[3] / 100
-    ]
-    
-    # Wybór odpowiedniej strategii
-    if trend_strategy_type == "simple":
-        # Prosta strategia - alokacja na podstawie zmian cen
-        changes = calculate_metal_changes(start_date, current_date)
-        sorted_metals = sorted(changes.items(), key=lambda x: x[1], reverse=True)
-        
-        trend_alloc = {
-            sorted_metals[0][0]: trend_priorities_fraction[0],
-            sorted_metals[1][0]: trend_priorities_fraction[1],
-            sorted_metals[2][0]: trend_priorities_fraction[2],
-            sorted_metals[3][0]: trend_priorities_fraction[3],
-        }
-        return trend_alloc, sorted_metals
-        
-    elif trend_strategy_type == "momentum":
-        # Strategia momentum
-        if trend_period == "last_purchase":
-            period_days = (current_date - last_purchase_date).days
-            if period_days < 7:  # Zabezpieczenie przed zbyt krótkim okresem
-                period_days = 30
-        else:
-            period_days = int(trend_period)
-        
-        return calculate_momentum_allocation(current_date, period_days, trend_priorities_fraction)
-        
-    elif trend_strategy_type == "macd":
-        # Strategia MACD
-        return calculate_macd_allocation(current_date, trend_priorities_fraction)
-    
-    # Domyślnie zwróć prostą strategię
-    changes = calculate_metal_changes(start_date, current_date)
-    sorted_metals = sorted(changes.items(), key=lambda x: x[1], reverse=True)
-    
-    trend_alloc = {
-        sorted_metals[0][0]: trend_priorities_fraction[0],
-        sorted_metals[1][0]: trend_priorities_fraction[1],
-        sorted_metals[2][0]: trend_priorities_fraction[2],
-        sorted_metals[3][0]: trend_priorities_fraction[3],
-    }
-    return trend_alloc, sorted_metals
-
-def apply_allocation_limit(new_alloc, prev_alloc, max_change_percent):
-    """
-    Ogranicza maksymalne zmiany alokacji między zakupami.
-    
-    Parameters:
-    -----------
-    new_alloc : dict
-        Nowa alokacja
-    prev_alloc : dict
-        Poprzednia alokacja
-    max_change_percent : float
-        Maksymalna zmiana w procentach
-        
-    Returns:
-    --------
-    dict
-        Ograniczona alokacja
-    """
-    if prev_alloc is None:
-        return new_alloc
-    
-    max_change = max_change_percent / 100
-    final_alloc = {}
-    
-    for metal in new_alloc:
-        prev = prev_alloc.get(metal, 0)
-        curr = new_alloc[metal]
-        
-        # Ogranicz zmianę do zadanego procentu
-        if curr > prev:
-            final_alloc[metal] = min(curr, prev + max_change)
-        else:
-            final_alloc[metal] = max(curr, prev - max_change)
-    
-    # Normalizuj alokację, aby suma była 1.0
-    total = sum(final_alloc.values())
-    normalized_alloc = {m: v/total for m, v in final_alloc.items()}
-    
-    return normalized_alloc
-
-def simulate(allocation, use_trend=False, fixed_allocation=False):
-    """
-    Symuluje portfel metali szlachetnych w czasie.
-    
-    Parameters:
-    -----------
-    allocation : dict
-        Słownik z początkową alokacją dla każdego metalu
-    use_trend : bool
-        Czy użyć strategii TREND
-    fixed_allocation : bool
-        Czy używać stałej alokacji nawet gdy TREND jest aktywny
-        
-    Returns:
-    --------
-    pd.DataFrame
-        DataFrame z wynikami symulacji
-    """
-    portfolio = {m: 0.0 for m in allocation}
-    history = []
-    invested = 0.0
-    trend_history = []  # Historia działania TREND
-
-    all_dates = data.loc[initial_date:end_purchase_date].index
-    purchase_dates = generate_purchase_dates(initial_date, purchase_freq, purchase_day, end_purchase_date)
-
-    last_year = None
-    last_purchase_date = pd.to_datetime(initial_date)
-
-    last_rebalance_dates = {
-        "rebalance_1": None,
-        "rebalance_2": None
-    }
-    
-    # Przechowywanie poprzedniej alokacji TREND
-    previous_trend_alloc = None
-
-    def apply_rebalance(d, label, condition_enabled, threshold_percent):
-        nonlocal last_rebalance_dates
-
-        min_days_between_rebalances = 30  # minimalny odstęp w dniach
-
-        last_date = last_rebalance_dates.get(label)
-        if last_date is not None and (d - last_date).days < min_days_between_rebalances:
-            return f"rebalancing_skipped_{label}_too_soon"
-
-        prices = data.loc[d]
-        total_value = sum(prices[m + "_EUR"] * portfolio[m] for m in allocation)
-
-        if total_value == 0:
-            return f"rebalancing_skipped_{label}_no_value"
-
-        current_shares = {
-            m: (prices[m + "_EUR"] * portfolio[m]) / total_value
-            for m in allocation
-        }
-
-        rebalance_trigger = False
-        for metal in allocation:
-            deviation = abs(current_shares[metal] - allocation[metal]) * 100
-            if deviation >= threshold_percent:
-                rebalance_trigger = True
-                break
-
-        if condition_enabled and not rebalance_trigger:
-            return f"rebalancing_skipped_{label}_no_deviation"
-
-        target_value = {m: total_value * allocation[m] for m in allocation}
-
-        for metal in allocation:
-            current_value = prices[metal + "_EUR"] * portfolio[metal]
-            diff = current_value - target_value[metal]
-
-            if diff > 0:
-                sell_price = prices[metal + "_EUR"] * (1 + buyback_discounts[metal] / 100)
-                grams_to_sell = min(diff / sell_price, portfolio[metal])
-                portfolio[metal] -= grams_to_sell
-                cash = grams_to_sell * sell_price
-
-                for buy_metal in allocation:
-                    needed_value = target_value[buy_metal] - prices[buy_metal + "_EUR"] * portfolio[buy_metal]
-                    if needed_value > 0:
-                        buy_price = prices[buy_metal + "_EUR"] * (1 + rebalance_markup[buy_metal] / 100)
-                        buy_grams = min(cash / buy_price, needed_value / buy_price)
-                        portfolio[buy_metal] += buy_grams
-                        cash -= buy_grams * buy_price
-                        if cash <= 0:
-                            break
-
-        last_rebalance_dates[label] = d
-        return label
-
-    # Początkowy zakup (standardowo, wg allocation)
-    initial_ts = data.index[data.index.get_indexer([pd.to_datetime(initial_date)], method="nearest")][0]
-    prices = data.loc[initial_ts]
-    for metal, percent in allocation.items():
-        price = prices[metal + "_EUR"] * (1 + margins[metal] / 100)
-        grams = (initial_allocation * percent) / price
-        portfolio[metal] += grams
-    invested += initial_allocation
-    history.append((initial_ts, invested, dict(portfolio), "initial"))
-
-    for d in all_dates:
-        actions = []
-
-        if d in purchase_dates:
-            prices = data.loc[d]
-
-            if use_trend and not fixed_allocation:
-                # Obliczenie alokacji TREND
-                trend_alloc, sorted_metals = calculate_trend_allocation(
-                    d, 
-                    last_purchase_date, 
-                    trend_period, 
-                    trend_strategy_type, 
-                    [trend_1, trend_2, trend_3, trend_4]
-                )
-                
-                # Ograniczenie maksymalnych zmian alokacji
-                if previous_trend_alloc and max_allocation_change < 100:
-                    trend_alloc = apply_allocation_limit(trend_alloc, previous_trend_alloc, max_allocation_change)
-                
-                # Zapisz aktualną alokację jako poprzednią dla następnego zakupu
-                previous_trend_alloc = dict(trend_alloc)
-                
-                # Zapisz historię TREND
-                trend_history.append({
-                    "Date": d,
-                    "Start Date": d - pd.Timedelta(days=30) if trend_period == "last_purchase" else d - pd.Timedelta(days=int(trend_period)),
-                    "Strategy": trend_strategy_type,
-                    "Best Metal": sorted_metals[0][0],
-                    "Best Change": sorted_metals[0][1],
-                    "Worst Metal": sorted_metals[-1][0],
-                    "Worst Change": sorted_metals[-1][1],
-                    "Allocations": {m: round(trend_alloc[m] * 100, 1) for m in trend_alloc}
-                })
-            else:
-                # Standardowa alokacja
-                trend_alloc = allocation
-
-            for metal, percent in trend_alloc.items():
-                price = prices[metal + "_EUR"] * (1 + margins[metal] / 100)
-                grams = (purchase_amount * percent) / price
-                portfolio[metal] += grams
-
-            invested += purchase_amount
-            actions.append("recurring")
-
-            # 🔵 Aktualizacja daty ostatniego zakupu
-            last_purchase_date = d
-
-        # ReBalancing 1
-        if rebalance_1 and d >= pd.to_datetime(rebalance_1_start) and d.month == rebalance_1_start.month and d.day == rebalance_1_start.day:
-            actions.append(apply_rebalance(d, "rebalance_1", rebalance_1_condition, rebalance_1_threshold))
-
-        # ReBalancing 2
-        if rebalance_2 and d >= pd.to_datetime(rebalance_2_start) and d.month == rebalance_2_start.month and d.day == rebalance_2_start.day:
-            actions.append(apply_rebalance(d, "rebalance_2", rebalance_2_condition, rebalance_2_threshold))
-
-        # Koszty magazynowania co rok
-        if last_year is None:
-            last_year = d.year
-
-        if d.year != last_year:
-            last_year_end = data.loc[data.index[data.index.year == last_year]].index[-1]
-            storage_cost = invested * (storage_fee / 100) * (1 + vat / 100)
-            prices_end = data.loc[last_year_end]
-
-            if storage_metal == "Best of year":
-                metal_to_sell = find_best_metal_of_year(
-                    data.index[data.index.year == last_year][0],
-                    data.index[data.index.year == last_year][-1]
-                )
-                sell_price = prices_end[metal_to_sell + "_EUR"] * (1 + buyback_discounts[metal_to_sell] / 100)
-                grams_needed = storage_cost / sell_price
-                grams_needed = min(grams_needed, portfolio[metal_to_sell])
-                portfolio[metal_to_sell] -= grams_needed
-
-            elif storage_metal == "ALL":
-                total_value = sum(prices_end[m + "_EUR"] * portfolio[m] for m in allocation)
-                for metal in allocation:
-                    share = (prices_end[metal + "_EUR"] * portfolio[metal]) / total_value
-                    cash_needed = storage_cost * share
-                    sell_price = prices_end[metal + "_EUR"] * (1 + buyback_discounts[metal] / 100)
-                    grams_needed = cash_needed / sell_price
-                    grams_needed = min(grams_needed, portfolio[metal])
-                    portfolio[metal] -= grams_needed
-
-            else:
-                sell_price = prices_end[storage_metal + "_EUR"] * (1 + buyback_discounts[storage_metal] / 100)
-                grams_needed = storage_cost / sell_price
-                grams_needed = min(grams_needed, portfolio[storage_metal])
-                portfolio[storage_metal] -= grams_needed
-
-            history.append((last_year_end, invested, dict(portfolio), "storage_fee"))
-            last_year = d.year
-
-        if actions:
-            history.append((d, invested, dict(portfolio), ", ".join(actions)))
-
-    # Tworzenie dataframe wynikowego
-    df_result = pd.DataFrame([{
-        "Date": h[0],
-        "Invested": h[1],
-        **{m: h[2][m] for m in allocation},
-        "Portfolio Value": sum(
-            data.loc[h[0]][m + "_EUR"] * (1 + buyback_discounts[m] / 100) * h[2][m]
-            for m in allocation
-        ),
-        "Akcja": h[3]
-    } for h in history]).set_index("Date")
-    
-    # Dołącz informacje o historii TREND
-    if trend_history:
-        df_trend = pd.DataFrame(trend_history)
-        return df_result, df_trend
-    
-    return df_result, None
-
-# =========================================
-# 6. Główna sekcja aplikacji
-# =========================================
-
-st.title("Symulator ReBalancingu Portfela Metali Szlachetnych")
-st.markdown("---")
-
-# Uruchom symulację po kliknięciu przycisku
-if dates_valid:
-    start_simulation = st.sidebar.button("🚀 Uruchom symulację")
-else:
-    st.sidebar.button("🚀 Uruchom symulację", disabled=True)
-    start_simulation = False
-
-# Jeśli przycisk został kliknięty lub istnieją już wyniki w pamięci, pokaż wyniki
-if start_simulation or st.session_state.last_simulation_result is not None:
-    with st.spinner("Trwa symulacja..."):
-        if start_simulation:
-            # Uruchom nową symulację
-            result, trend_data = simulate(allocation, use_trend=trend_active)
-            st.session_state.last_simulation_result = result
-            st.session_state.last_trend_data = trend_data
-            
-            # Jeśli porównanie TREND jest włączone, uruchom symulację ze stałą alokacją
-            if trend_active and st.session_state.show_trend_comparison:
-                result_fixed, _ = simulate(allocation, use_trend=False)
-                st.session_state.last_fixed_result = result_fixed
-        else:
-            # Użyj zapisanych wyników
-            result = st.session_state.last_simulation_result
-            trend_data = st.session_state.last_trend_data if 'last_trend_data' in st.session_state else None
-    
-    # === Korekta wartości portfela o realną inflację ===
-    
-    # Słownik: Rok -> Inflacja
-    inflation_dict = dict(zip(inflation_real["Rok"], inflation_real["Inflacja (%)"]))
-    
-    # Funkcja: obliczenie skumulowanej inflacji od startu
-    def calculate_cumulative_inflation(start_year, current_year):
-        """Oblicza skumulowany współczynnik inflacji między dwoma latami"""
-        cumulative_factor = 1.0
-        for year in range(start_year, current_year + 1):
-            inflation = inflation_dict.get(year, 0.0) / 100  # Brak danych = 0% inflacji
-            cumulative_factor *= (1 + inflation)
-        return cumulative_factor
-    
-    # Rok początkowy inwestycji
-    start_year = result.index.min().year
-    
-    # Dodanie nowej kolumny z wartością realną portfela
-    real_values = []
-    
-    for date in result.index:
-        nominal_value = result.loc[date, "Portfolio Value"]
-        current_year = date.year
-        cumulative_inflation = calculate_cumulative_inflation(start_year, current_year)
-        real_value = nominal_value / cumulative_inflation if cumulative_inflation != 0 else nominal_value
-        real_values.append(real_value)
-    
-    result["Portfolio Value Real"] = real_values
-    
-    # 📈 Wykres wartości portfela: nominalna vs realna vs inwestycje vs koszty magazynowania
-    
-    # Przygotowanie danych do wykresu
-    result_plot = result.copy()
-    result_plot["Storage Cost"] = 0.0
-    
-    # Oznaczenie kosztu magazynowania w odpowiednich dniach
-    storage_costs = result_plot[result_plot["Akcja"] == "storage_fee"].index
-    for d in storage_costs:
-        result_plot.at[d, "Storage Cost"] = result_plot.at[d, "Invested"] * (storage_fee / 100) * (1 + vat / 100)
-    
-    # ❗ Naprawiamy typ danych: wymuszamy float
-    for col in ["Portfolio Value", "Portfolio Value Real", "Invested", "Storage Cost"]:
-        result_plot[col] = pd.to_numeric(result_plot[col], errors="coerce").fillna(0)
-    
-    # Stworzenie DataFrame tylko z potrzebnymi seriami
-    chart_data = result_plot[["Portfolio Value", "Portfolio Value Real", "Invested", "Storage Cost"]]
-    
-    # Nagłówki bardziej czytelne
-    chart_data.rename(columns={
-        "Portfolio Value": f"💰 {translations[language]['portfolio_value']}",
-        "Portfolio Value Real": f"🏛️ {translations[language]['real_portfolio_value']}",
-        "Invested": f"💵 {translations[language]['invested']}",
-        "Storage Cost": f"📦 {translations[language]['storage_cost']}"
-    }, inplace=True)
-    
-    # 📈 Ładny interaktywny wykres w Streamlit
-    st.subheader(translations[language]["chart_subtitle"])
-    
-    # Wybór typu wykresu
-    if visualization_type == "Wykres liniowy" or visualization_type == "Liniendiagramm":
-        st.line_chart(chart_data)
-    elif visualization_type == "Wykres obszarowy" or visualization_type == "Flächendiagramm":
-        st.area_chart(chart_data)
-    else:  # Wykres słupkowy
-        st.bar_chart(chart_data)
-    
-    # Eksport wyników do CSV
-    csv_data = result.to_csv().encode('utf-8')
-    st.download_button(
-        label="📥 " + translations[language]["export_results"],
-        data=csv_data,
-        file_name="portfolio_simulation.csv",
-        mime="text/csv",
-        help="Pobierz wyniki symulacji jako plik CSV"
-    )
-    
     # Podsumowanie wyników
     st.subheader(translations[language]["summary_title"])
-    
-    start_date = result.index.min()
-    end_date = result.index.max()
-    years = (end_date - start_date).days / 365.25
-    
-    alokacja_kapitalu = result["Invested"].max()
-    wartosc_metali = result["Portfolio Value"].iloc[-1]
-    wartosc_realna = result["Portfolio Value Real"].iloc[-1]
-    
-    if alokacja_kapitalu > 0 and years > 0:
-        roczny_procent = (wartosc_metali / alokacja_kapitalu) ** (1 / years) - 1
-        roczny_procent_realny = (wartosc_realna / alokacja_kapitalu) ** (1 / years) - 1
-    else:
-        roczny_procent = 0.0
-        roczny_procent_realny = 0.0
+
+    summary = summarize(result, storage_fee, vat)
+
+    alokacja_kapitalu = summary["invested"]
+    wartosc_metali = summary["final_value"]
+    roczny_procent = summary["cagr"]
+    roczny_procent_realny = summary["cagr_real"]
 
     # Wyświetlenie wyników w formie kart
     col1, col2 = st.columns(2)
@@ -1389,228 +1015,236 @@ if start_simulation or st.session_state.last_simulation_result is not None:
     with col2:
         st.metric("📦 Wartość końcowa portfela", f"{wartosc_metali:,.2f} EUR")
         st.metric("📉 Roczny zwrot (realny, po inflacji)", f"{roczny_procent_realny * 100:.2f}%")
-    
+
+
+@st.fragment
+def show_composition(result, config):
+    """Skład końcowy portfela, wzrost cen metali i posiadane ilości."""
+    buyback_discounts, margins = config["buyback_discounts"], config["margins"]
+
     # Wykres składu portfela (kołowy)
     st.subheader("⚖️ Skład końcowy portfela")
-    
+
+    metale = result_assets(result)
     final_composition = {}
-    for metal in ["Gold", "Silver", "Platinum", "Palladium"]:
+    for metal in metale:
         final_composition[metal] = result.iloc[-1][metal] * data.loc[result.index[-1]][metal + "_EUR"] * (1 + buyback_discounts[metal] / 100)
-    
-    # Kolory metali
-    metal_colors = {
-        "Gold": "#D4AF37",      # złoto 
-        "Silver": "#C0C0C0",    # srebro
-        "Platinum": "#E5E4E2",  # platyna
-        "Palladium": "#CED0DD"  # pallad
-    }
-    
+
     fig, ax = plt.subplots(figsize=(8, 6))
     wedges, texts, autotexts = ax.pie(
-        final_composition.values(), 
+        final_composition.values(),
         labels=final_composition.keys(),
         autopct='%1.1f%%',
         startangle=90,
         colors=[metal_colors[metal] for metal in final_composition.keys()]
     )
-    
+
     # Równe proporcje, aby koło było okrągłe
     ax.axis('equal')
     plt.title("Skład końcowy portfela według wartości")
-    
+
     st.pyplot(fig)
-    
+
     # Wzrost cen metali od początku inwestycji
     st.subheader("📊 Wzrost cen metali od startu inwestycji")
-    
-    start_prices = data.loc[start_date]
-    end_prices = data.loc[end_date]
-    
-    metale = ["Gold", "Silver", "Platinum", "Palladium"]
+
+    start_prices = data.loc[result.index.min()]
+    end_prices = data.loc[result.index.max()]
+
     wzrosty = {}
-    
+
     for metal in metale:
         start_price = start_prices[metal + "_EUR"]
         end_price = end_prices[metal + "_EUR"]
         wzrost = (end_price / start_price - 1) * 100
         wzrosty[metal] = wzrost
-    
-    # Wyświetlenie ładnej tabelki
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.metric("Złoto (Au)", f"{wzrosty['Gold']:.2f}%", delta=f"{wzrosty['Gold']:.1f}%")
-    with col2:
-        st.metric("Srebro (Ag)", f"{wzrosty['Silver']:.2f}%", delta=f"{wzrosty['Silver']:.1f}%")
-    with col3:
-        st.metric("Platyna (Pt)", f"{wzrosty['Platinum']:.2f}%", delta=f"{wzrosty['Platinum']:.1f}%")
-    with col4:
-        st.metric("Pallad (Pd)", f"{wzrosty['Palladium']:.2f}%", delta=f"{wzrosty['Palladium']:.1f}%")
-    
+
+    # Wyświetlenie ładnej tabelki (do czterech kolumn w wierszu)
+    for row in range(0, len(metale), 4):
+        for col, metal in zip(st.columns(4), metale[row:row + 4]):
+            with col:
+                st.metric(metal_label(metal), f"{wzrosty[metal]:.2f}%", delta=f"{wzrosty[metal]:.1f}%")
+
     # Aktualnie posiadane ilości metali
     st.subheader("⚖️ Aktualnie posiadane ilości metali (g)")
-    
+
     # Aktualne ilości gramów z ostatniego dnia
-    aktualne_ilosci = {
-        "Gold": result.iloc[-1]["Gold"],
-        "Silver": result.iloc[-1]["Silver"],
-        "Platinum": result.iloc[-1]["Platinum"],
-        "Palladium": result.iloc[-1]["Palladium"]
-    }
-    
+    aktualne_ilosci = {metal: result.iloc[-1][metal] for metal in metale}
+
     # Wyświetlenie w czterech kolumnach z kolorowym napisem
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.markdown(f"<h4 style='color:{metal_colors['Gold']}; text-align: center;'>Złoto (Au)</h4>", unsafe_allow_html=True)
-        st.metric(label="", value=f"{aktualne_ilosci['Gold']:.2f} g")
-    with col2:
-        st.markdown(f"<h4 style='color:{metal_colors['Silver']}; text-align: center;'>Srebro (Ag)</h4>", unsafe_allow_html=True)
-        st.metric(label="", value=f"{aktualne_ilosci['Silver']:.2f} g")
-    with col3:
-        st.markdown(f"<h4 style='color:{metal_colors['Platinum']}; text-align: center;'>Platyna (Pt)</h4>", unsafe_allow_html=True)
-        st.metric(label="", value=f"{aktualne_ilosci['Platinum']:.2f} g")
-    with col4:
-        st.markdown(f"<h4 style='color:{metal_colors['Palladium']}; text-align: center;'>Pallad (Pd)</h4>", unsafe_allow_html=True)
-        st.metric(label="", value=f"{aktualne_ilosci['Palladium']:.2f} g")
-    
+    for row in range(0, len(metale), 4):
+        for col, metal in zip(st.columns(4), metale[row:row + 4]):
+            with col:
+                st.markdown(f"<h4 style='color:{metal_colors[metal]}; text-align: center;'>{metal_label(metal)}</h4>",
+                            unsafe_allow_html=True)
+                st.metric(label="", value=f"{aktualne_ilosci[metal]:.2f} g")
+
     # 🛒 Wartość zakupu metali dziś (uwzględniając aktualne ceny + marże)
-    metale = ["Gold", "Silver", "Platinum", "Palladium"]
-    
+
     # Ilość posiadanych gramów na dziś
     ilosc_metali = {metal: result.iloc[-1][metal] for metal in metale}
-    
+
     # Aktualne ceny z marżą
     aktualne_ceny_z_marza = {
         metal: data.loc[result.index[-1], metal + "_EUR"] * (1 + margins[metal] / 100)
         for metal in metale
     }
-    
+
     # Wartość zakupu metali dzisiaj
     wartosc_zakupu_metali = sum(
         ilosc_metali[metal] * aktualne_ceny_z_marza[metal]
         for metal in metale
     )
-    
+    wartosc_metali = result["Portfolio Value"].iloc[-1]
+
     # Wyświetlenie
     st.metric("🛒 Wartość zakupowa metali", f"{wartosc_zakupu_metali:,.2f} EUR")
-    
+
     # 🧮 Opcjonalnie: różnica procentowa
     if wartosc_zakupu_metali > 0:
         roznica_proc = ((wartosc_zakupu_metali / wartosc_metali) - 1) * 100
     else:
         roznica_proc = 0.0
-    
+
     st.caption(f"📈 Różnica względem wartości portfela: {roznica_proc:+.2f}%")
-    
-    # Analiza korelacji metali (jeśli włączona)
-    if st.session_state.show_correlation_analysis:
-        st.subheader("📉 Analiza korelacji metali")
-        
-        # Przygotuj dane cen
-        price_data = pd.DataFrame({
-            "Gold": data["Gold_EUR"],
-            "Silver": data["Silver_EUR"],
-            "Platinum": data["Platinum_EUR"],
-            "Palladium": data["Palladium_EUR"]
-        })
-        
-        # Oblicz macierz korelacji
-        corr_matrix = price_data.pct_change().corr()
-        
-        # Wyświetl macierz korelacji jako ciepłą mapę
-        fig, ax = plt.subplots(figsize=(8, 6))
-        sns.heatmap(corr_matrix, annot=True, cmap="coolwarm", ax=ax)
-        plt.title("Korelacja zmian cen metali szlachetnych")
+
+
+@st.fragment
+def show_correlation():
+    """Analiza korelacji metali (włączana przełącznikiem w sekcji)."""
+    if not st.checkbox(
+        translations[language]["correlation_analysis"],
+        key="show_correlation_analysis",
+        help="Pokaż analizę korelacji między metalami"
+    ):
+        return
+
+    st.subheader("📉 Analiza korelacji metali")
+
+    corr_matrix, rolling_corr, regime_corr = load_correlations(price_store.version_key, data, price_store.return_sums)
+
+    # Wyświetl macierz korelacji jako ciepłą mapę
+    fig, ax = plt.subplots(figsize=(8, 6))
+    sns.heatmap(corr_matrix, annot=True, cmap="coolwarm", ax=ax)
+    plt.title("Korelacja zmian cen metali szlachetnych")
+    st.pyplot(fig)
+
+    # Korelacje kroczące
+    corr_window = st.radio("Okno korelacji kroczącej", list(ROLLING_WINDOWS), index=1, horizontal=True)
+    st.line_chart(load_chart(price_store.version_key, f"rolling:{corr_window}", rolling_corr[corr_window], method="minmax"))
+
+    # Korelacje w reżimach rynku złota
+    if regime_corr:
+        st.caption("Korelacje w okresach hossy i bessy złota (cena względem średniej z 200 sesji)")
+        regime_cols = st.columns(len(regime_corr))
+        for col, (label, matrix) in zip(regime_cols, regime_corr.items()):
+            with col:
+                st.markdown(f"**{label}**")
+                st.dataframe(matrix.style.format("{:.2f}"))
+
+    st.write("""
+    Mapa korelacji pokazuje, jak zmiany cen poszczególnych metali są ze sobą powiązane:
+    - Wartości bliskie 1 oznaczają silną dodatnią korelację (metale poruszają się razem)
+    - Wartości bliskie -1 oznaczają silną ujemną korelację (metale poruszają się przeciwnie)
+    - Wartości bliskie 0 oznaczają brak korelacji
+
+    Strategia TREND może być skuteczniejsza przy niższej korelacji między metalami.
+    """)
+
+
+@st.fragment
+def show_trend_analysis(result, trend_data, config):
+    """Analiza strategii TREND i porównanie ze stałą alokacją."""
+    st.subheader("♟️ Analiza strategii TREND")
+
+    # Wyświetl informacje o działaniu strategii TREND
+    st.write("Strategia TREND dynamicznie zmienia alokację metali na podstawie historycznych zmian cen.")
+
+    # Histogram best/worst metali (zliczenia z kolumn rankingu)
+    rank_counts = trend_rank_counts(trend_data)
+    best_metals = rank_counts["best"][rank_counts["best"] > 0].sort_values(ascending=False, kind="stable")
+    worst_metals = rank_counts["worst"][rank_counts["worst"] > 0].sort_values(ascending=False, kind="stable")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("Najlepsze metale")
+        fig, ax = plt.subplots()
+        best_metals.plot(kind='bar', ax=ax, color='green')
+        plt.title("Liczba wystąpień jako najlepszy metal")
+        plt.ylabel("Liczba wystąpień")
+        plt.xticks(rotation=45)
+        plt.tight_layout()
         st.pyplot(fig)
-        
-        st.write("""
-        Mapa korelacji pokazuje, jak zmiany cen poszczególnych metali są ze sobą powiązane:
-        - Wartości bliskie 1 oznaczają silną dodatnią korelację (metale poruszają się razem)
-        - Wartości bliskie -1 oznaczają silną ujemną korelację (metale poruszają się przeciwnie)
-        - Wartości bliskie 0 oznaczają brak korelacji
-        
-        Strategia TREND może być skuteczniejsza przy niższej korelacji między metalami.
-        """)
-    
-    # Analiza strategii TREND (jeśli aktywna)
-    if trend_active and trend_data is not None:
-        st.subheader("♟️ Analiza strategii TREND")
-        
-        # Wyświetl informacje o działaniu strategii TREND
-        st.write("Strategia TREND dynamicznie zmienia alokację metali na podstawie historycznych zmian cen.")
-        
-        # Histogram best/worst metali
-        best_metals = pd.Series([record["Best Metal"] for record in trend_data.to_dict('records')]).value_counts()
-        worst_metals = pd.Series([record["Worst Metal"] for record in trend_data.to_dict('records')]).value_counts()
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.subheader("Najlepsze metale")
-            fig, ax = plt.subplots()
-            best_metals.plot(kind='bar', ax=ax, color='green')
-            plt.title("Liczba wystąpień jako najlepszy metal")
-            plt.ylabel("Liczba wystąpień")
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            st.pyplot(fig)
-        
-        with col2:
-            st.subheader("Najgorsze metale")
-            fig, ax = plt.subplots()
-            worst_metals.plot(kind='bar', ax=ax, color='red')
-            plt.title("Liczba wystąpień jako najgorszy metal")
-            plt.ylabel("Liczba wystąpień")
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            st.pyplot(fig)
-        
-        # Wyświetl tabelę z alokacjami TREND
-        st.subheader("Historia alokacji TREND")
-        
-        # Przygotuj dane do wyświetlenia
-        trend_display = trend_data[["Date", "Strategy", "Best Metal", "Worst Metal"]].copy()
-        
-        # Dodaj kolumny z alokacjami
-        for metal in ["Gold", "Silver", "Platinum", "Palladium"]:
-            trend_display[f"{metal} %"] = trend_display.apply(
-                lambda row: row["Allocations"][metal] if isinstance(row["Allocations"], dict) else 0, 
-                axis=1
-            )
-        
-        # Wyświetl tabelę
-        st.dataframe(trend_display[["Date", "Strategy", "Best Metal", "Worst Metal", "Gold %", "Silver %", "Platinum %", "Palladium %"]])
-        
-        # Porównanie z alokacją stałą
-        if st.session_state.show_trend_comparison and st.session_state.last_fixed_result is not None:
-            st.subheader("Porównanie strategii TREND ze stałą alokacją")
-            
-            # Pobierz wyniki dla stałej alokacji
-            result_fixed = st.session_state.last_fixed_result
-            
-            # Porównaj wyniki
-            comparison = pd.DataFrame({
-                "Stała alokacja": result_fixed["Portfolio Value"],
-                "Strategia TREND": result["Portfolio Value"]
-            })
-            
-            # Oblicz różnicę procentową
-            final_fixed = result_fixed["Portfolio Value"].iloc[-1]
-            final_trend = result["Portfolio Value"].iloc[-1]
-            diff_pct = ((final_trend / final_fixed) - 1) * 100
-            
-            st.metric(
-                "Różnica w końcowej wartości portfela", 
-                f"{diff_pct:.2f}%",
-                delta=f"{diff_pct:.2f}%"
-            )
-            
-            # Wyświetl wykres porównawczy
-            st.line_chart(comparison)
-    
-    # Wyświetl dashboard aktualnych trendów metali
+
+    with col2:
+        st.subheader("Najgorsze metale")
+        fig, ax = plt.subplots()
+        worst_metals.plot(kind='bar', ax=ax, color='red')
+        plt.title("Liczba wystąpień jako najgorszy metal")
+        plt.ylabel("Liczba wystąpień")
+        plt.xticks(rotation=45)
+        plt.tight_layout()
+        st.pyplot(fig)
+
+    # Wyświetl tabelę z alokacjami TREND
+    st.subheader("Historia alokacji TREND")
+
+    # Przygotuj dane do wyświetlenia (kolumny dziennika, bez przetwarzania wierszy)
+    best, worst = trend_extremes(trend_data)
+    trend_display = pd.concat(
+        [trend_data[["Date", "Strategy"]], best, worst, trend_data[[f"{metal} %" for metal in trend_assets(trend_data)]].round(1)],
+        axis=1,
+    )
+
+    # Wyświetl tabelę
+    st.dataframe(trend_display)
+
+    show_trend_comparison = st.checkbox(
+        translations[language]["trend_comparison"],
+        key="show_trend_comparison",
+        help="Porównaj strategię TREND ze stałą alokacją"
+    )
+
+    # Porównanie z alokacją stałą (liczone przy pierwszym włączeniu dla danej symulacji)
+    if show_trend_comparison:
+        if st.session_state.last_fixed_result is None:
+            with st.spinner("Trwa symulacja ze stałą alokacją..."):
+                st.session_state.last_fixed_result, _ = simulate_shared(
+                    result_cache, data, config, result_data_key(config), use_trend=False
+                )
+
+        st.subheader("Porównanie strategii TREND ze stałą alokacją")
+
+        # Pobierz wyniki dla stałej alokacji
+        result_fixed = st.session_state.last_fixed_result
+
+        # Porównaj wyniki
+        comparison = pd.DataFrame({
+            "Stała alokacja": result_fixed["Portfolio Value"],
+            "Strategia TREND": result["Portfolio Value"]
+        })
+
+        # Oblicz różnicę procentową
+        final_fixed = result_fixed["Portfolio Value"].iloc[-1]
+        final_trend = result["Portfolio Value"].iloc[-1]
+        diff_pct = ((final_trend / final_fixed) - 1) * 100
+
+        st.metric(
+            "Różnica w końcowej wartości portfela",
+            f"{diff_pct:.2f}%",
+            delta=f"{diff_pct:.2f}%"
+        )
+
+        # Wyświetl wykres porównawczy
+        st.line_chart(downsample(comparison))
+
+
+@st.fragment
+def show_trends_dashboard():
+    """Dashboard aktualnych trendów metali."""
     st.subheader("📈 Aktualne trendy metali szlachetnych")
-    
+
     # Oblicz zmiany dla różnych okresów
     trend_periods = {
         "1 tydzień": 7,
@@ -1618,7 +1252,7 @@ if start_simulation or st.session_state.last_simulation_result is not None:
         "3 miesiące": 90,
         "1 rok": 365
     }
-    
+
     if language == "Deutsch":
         trend_periods = {
             "1 Woche": 7,
@@ -1626,131 +1260,498 @@ if start_simulation or st.session_state.last_simulation_result is not None:
             "3 Monate": 90,
             "1 Jahr": 365
         }
-    
+
     # Znajdź najnowszą datę w danych
     latest_date = data.index.max()
-    
+
     # Przygotuj dane o trendach
     trend_data_display = []
-    
+
     for period_name, days in trend_periods.items():
         start_date = latest_date - pd.Timedelta(days=days)
         start_date = data.index[data.index.get_indexer([start_date], method="nearest")][0]
-        
+
         changes = {}
-        for metal in ["Gold", "Silver", "Platinum", "Palladium"]:
+        for metal in assets:
             start_price = data.loc[start_date, metal + "_EUR"]
             end_price = data.loc[latest_date, metal + "_EUR"]
             change = ((end_price / start_price) - 1) * 100
             changes[metal] = change
-        
+
         trend_data_display.append({
             "Period": period_name,
             **changes
         })
-    
+
     # Stwórz DataFrame i wyświetl
     trend_df = pd.DataFrame(trend_data_display)
     trend_df = trend_df.set_index("Period")
-    
+
     # Popraw formatowanie: dodaj znak % i koloruj pozytywne/negatywne wartości
     def color_cells(val):
         color = 'green' if val >= 0 else 'red'
         return f'color: {color}'
-    
+
     # Formatuj DataFrame
     styled_trend_df = trend_df.style.format("{:.2f}%")
     styled_trend_df = styled_trend_df.applymap(color_cells)
-    
+
     st.dataframe(styled_trend_df)
-    
+
     # Wykres trendów metali
     fig, ax = plt.subplots(figsize=(10, 6))
-    
-    for metal in ["Gold", "Silver", "Platinum", "Palladium"]:
+
+    for metal in assets:
         ax.plot(trend_df.index, trend_df[metal], label=metal, marker='o', color=metal_colors[metal])
-    
+
     ax.axhline(y=0, color='gray', linestyle='-', alpha=0.3)
     ax.set_title('Zmiany cen metali szlachetnych w różnych okresach')
     ax.set_ylabel('Zmiana (%)')
     ax.legend()
     ax.grid(True, alpha=0.3)
-    
+
     st.pyplot(fig)
-    
+
+
+@st.fragment
+def show_history_table(result, config):
+    """Tabela danych historycznych i podsumowanie kosztów magazynowania."""
+    storage_fee, vat = config["storage_fee"], config["vat"]
+
     # Historyczne dane w formie tabeli
     st.subheader("📅 Podgląd danych historycznych (pierwszy dzień każdego roku)")
-    
+
     # Grupujemy po roku i bierzemy pierwszy dzień roboczy
     result_filtered = result.groupby(result.index.year).first()
-    
+
     # Tworzymy prostą tabelę z wybranymi kolumnami
     simple_table = pd.DataFrame({
         "Zainwestowane (EUR)": result_filtered["Invested"].round(0),
         "Wartość portfela (EUR)": result_filtered["Portfolio Value"].round(0),
-        "Złoto (g)": result_filtered["Gold"].round(2),
-        "Srebro (g)": result_filtered["Silver"].round(2),
-        "Platyna (g)": result_filtered["Platinum"].round(2),
-        "Pallad (g)": result_filtered["Palladium"].round(2),
+        **{f"{metal_name(metal)} (g)": result_filtered[metal].round(2) for metal in result_assets(result)},
         "Akcja": result_filtered["Akcja"]
     })
-    
+
     # Formatowanie EUR bez miejsc po przecinku
     simple_table["Zainwestowane (EUR)"] = simple_table["Zainwestowane (EUR)"].map(lambda x: f"{x:,.0f} EUR")
     simple_table["Wartość portfela (EUR)"] = simple_table["Wartość portfela (EUR)"].map(lambda x: f"{x:,.0f} EUR")
-    
+
     # Wyświetl tabelę
     st.dataframe(simple_table)
-    
+
     # Podsumowanie kosztów magazynowania
     st.subheader("📦 Podsumowanie kosztów magazynowania")
-    
+
     # Koszty magazynowania
     storage_fees = result[result["Akcja"] == "storage_fee"]
-    
+
     # Całkowity koszt magazynowania
     total_storage_cost = storage_fees["Invested"].sum() * (storage_fee / 100) * (1 + vat / 100)
-    
+
     # Okres inwestycyjny w latach
     start_date = result.index.min()
     end_date = result.index.max()
     years = (end_date - start_date).days / 365.25
-    
+
     # Średnioroczny koszt magazynowania
     if years > 0:
         avg_annual_storage_cost = total_storage_cost / years
     else:
         avg_annual_storage_cost = 0.0
-    
+
     # Koszt magazynowania z ostatniego roku
     last_storage_date = storage_fees.index.max() if not storage_fees.empty else None
     if pd.notna(last_storage_date):
         last_storage_cost = result.loc[last_storage_date]["Invested"] * (storage_fee / 100) * (1 + vat / 100)
     else:
         last_storage_cost = 0.0
-    
+
     # Aktualna wartość portfela
     current_portfolio_value = result["Portfolio Value"].iloc[-1]
-    
+
     # Aktualny procentowy koszt magazynowania (za ostatni rok)
     if current_portfolio_value > 0:
         storage_cost_percentage = (last_storage_cost / current_portfolio_value) * 100
     else:
         storage_cost_percentage = 0.0
-    
+
     col1, col2 = st.columns(2)
     with col1:
         st.metric("Średnioroczny koszt magazynowy", f"{avg_annual_storage_cost:,.2f} EUR")
     with col2:
         st.metric("Koszt magazynowania (% ostatni rok)", f"{storage_cost_percentage:.2f}%")
-    
+
     # Całkowity koszt magazynowania i jako procent wartości końcowej
     st.metric("Całkowity koszt magazynowania", f"{total_storage_cost:,.2f} EUR")
-    
+
     if current_portfolio_value > 0:
         total_storage_percentage = (total_storage_cost / current_portfolio_value) * 100
         st.caption(f"Całkowity koszt magazynowania stanowi {total_storage_percentage:.2f}% końcowej wartości portfela")
 
+
+@st.fragment
+def show_sensitivity(config, use_trend):
+    """🎯 Analiza wrażliwości na koszty (wszystkie warianty w jednym przebiegu)."""
+    with st.expander("🎯 Analiza wrażliwości na koszty", expanded=False):
+        sensitivity_delta = st.number_input(
+            "Zmiana parametru (pp)",
+            min_value=0.1,
+            max_value=10.0,
+            value=1.0,
+            step=0.1,
+            help="O ile punktów procentowych zmieniana jest każda marża, cena odkupu, narzut, opłata i VAT"
+        )
+
+        if st.button("Uruchom analizę wrażliwości"):
+            with st.spinner("Trwa analiza wrażliwości..."):
+                st.session_state.sensitivity_result = sensitivity_analysis(
+                    data,
+                    config,
+                    delta=sensitivity_delta,
+                    use_trend=use_trend
+                )
+
+        sensitivity = st.session_state.get("sensitivity_result")
+        if sensitivity is not None:
+            st.caption(
+                f"Wartość bazowa: {sensitivity.attrs['base_value']:,.2f} EUR, "
+                f"zmiana każdego parametru o ±{sensitivity.attrs['delta']:.1f} pp"
+            )
+
+            # Wykres tornado: zmiana wartości końcowej przy -Δ i +Δ
+            tornado = sensitivity.iloc[::-1]
+            fig, ax = plt.subplots(figsize=(10, 0.45 * len(tornado) + 1))
+            ax.barh(tornado["Parametr"], tornado["Zmiana (-Δ) %"], color="#d9534f", label="-Δ")
+            ax.barh(tornado["Parametr"], tornado["Zmiana (+Δ) %"], color="#5cb85c", label="+Δ")
+            ax.axvline(x=0, color="gray", linewidth=1)
+            ax.set_xlabel("Zmiana wartości końcowej (%)")
+            ax.set_title("Wrażliwość wartości końcowej portfela na koszty")
+            ax.legend()
+            plt.tight_layout()
+            st.pyplot(fig)
+
+            st.dataframe(sensitivity.style.format({
+                "Wartość bazowa (%)": "{:.2f}",
+                "Wartość końcowa (-Δ)": "{:,.2f}",
+                "Wartość końcowa (+Δ)": "{:,.2f}",
+                "Zmiana (-Δ) %": "{:+.3f}%",
+                "Zmiana (+Δ) %": "{:+.3f}%",
+                "Elastyczność": "{:.4f}",
+                "Rozpiętość %": "{:.3f}",
+            }))
+
+
+@st.fragment
+def show_run_history(current_config):
+    """Historia uruchomień: przywracanie i porównanie bez ponownej symulacji."""
+    run_history = st.session_state.run_history
+    if len(run_history) == 0:
+        return
+
+    with st.expander(f"🕘 Historia uruchomień ({len(run_history)}, {run_history.nbytes / 1024:,.0f} kB)", expanded=False):
+        keys = run_history.keys()
+
+        st.dataframe(run_history.summary().style.format({
+            "Zainwestowane (EUR)": "{:,.0f}",
+            "Wartość końcowa (EUR)": "{:,.0f}",
+            "Zysk (%)": "{:+.2f}%",
+        }), hide_index=True)
+
+        # Przywrócenie wyników zapisanego uruchomienia
+        recall_key = st.selectbox("Uruchomienie do przywrócenia", keys, format_func=run_history.describe)
+        if st.button("↩️ Przywróć wyniki", disabled=recall_key == run_key(current_config, result_data_key(current_config))):
+            result, trend_data, config = run_history.get(recall_key)
+            st.session_state.last_simulation_result = result
+            st.session_state.last_trend_data = trend_data
+            st.session_state.last_run_config = config
+            st.session_state.last_fixed_result = None
+            st.rerun()
+
+        # Porównanie wartości portfela zapisanych uruchomień
+        compare_keys = st.multiselect(
+            "Porównaj uruchomienia",
+            keys,
+            default=keys[:2],
+            format_func=run_history.describe,
+            help="Wykresy wartości portfela z historii - bez ponownej symulacji"
+        )
+        if len(compare_keys) >= 2:
+            comparison = pd.concat([run_history.values(k) for k in compare_keys], axis=1).ffill()
+            st.line_chart(downsample(comparison))
+
+
+@st.fragment
+def show_experiment_store(result, config):
+    """Baza eksperymentów SQLite: zapis bieżącego wyniku i zapytania top-N."""
+    with st.expander("🗄️ Baza eksperymentów", expanded=False):
+        path = st.text_input("Plik bazy", value=EXPERIMENTS_PATH, key="experiment_store_path")
+
+        if st.button("💾 Zapisz bieżący wynik w bazie"):
+            with ExperimentStore(path) as store:
+                store.add("app", config, summarize(result, config["storage_fee"], config["vat"]), run="app", source="app")
+            st.success(f"Zapisano w {path}")
+
+        if not os.path.exists(path):
+            st.caption("Baza jeszcze nie istnieje - zapisz wynik lub uruchom cli.py/book.py z opcją --store.")
+            return
+
+        col1, col2, col3 = st.columns(3)
+        metric = col1.selectbox("Sortuj wg", EXPERIMENT_METRICS, index=EXPERIMENT_METRICS.index("cagr_real"))
+        top_n = col2.number_input("Liczba wyników", min_value=1, max_value=1000, value=20, step=5)
+        max_dd = col3.slider("Maks. obsunięcie (%)", 0, 100, 100, help="100% = bez filtra")
+
+        filters = [("max_drawdown", "<", max_dd / 100)] if max_dd < 100 else []
+        with ExperimentStore(path) as store:
+            st.caption(f"Wpisy spełniające warunki: {store.count(filters):,} z {len(store):,}")
+            st.dataframe(
+                store.top(top_n, metric, filters, ascending=metric == "max_drawdown"),
+                hide_index=True,
+            )
+
+
+@st.cache_resource
+def load_job_runner():
+    """Kolejka zadań w tle wspólna dla sesji aplikacji (wyniki w katalogu zadania/)."""
+    return JobRunner()
+
+
+def job_owner():
+    """
+    Token właściciela zadań w tle zapisany w adresie strony (parametr ?zadania=).
+
+    Przetrwa przeładowanie strony i restart aplikacji; zakładka z tym samym
+    adresem widzi te same zadania.
+    """
+    token = st.query_params.get("zadania")
+    if not token:
+        token = uuid.uuid4().hex
+        st.query_params["zadania"] = token
+    return token
+
+
+JOB_KINDS = {
+    "Okna kroczące (wynik od każdego startu)": "rolling",
+    "Walk-forward parametrów TREND": "walk_forward",
+    "Analiza wrażliwości na koszty": "sensitivity",
+}
+
+
+@st.fragment
+def show_background_jobs(config, use_trend):
+    """
+    Długie analizy w tle: postęp, anulowanie i odbiór wyników zapisanych na dysku.
+
+    Zadania liczone są poza przebiegiem skryptu, więc można dalej zmieniać
+    parametry; stan zadań trafia do st.session_state.jobs przy każdym odświeżeniu.
+    Kolejka jest wspólna dla sesji, ale każda przeglądarka widzi tylko zadania
+    zlecone ze swoim tokenem (job_owner) - także po przeładowaniu strony.
+    """
+    runner = load_job_runner()
+    owner = job_owner()
+    with st.expander("🧵 Zadania w tle", expanded=bool(runner.active(owner))):
+        kind_label = st.selectbox("Analiza", list(JOB_KINDS), key="job_kind")
+        kind = JOB_KINDS[kind_label]
+
+        col1, col2 = st.columns(2)
+        if kind == "rolling":
+            years = col1.number_input("Długość okna (lata)", min_value=1, max_value=40, value=10, key="job_years")
+            step = col2.number_input("Nowe okno co (miesięcy)", min_value=1, max_value=60, value=12, key="job_step")
+            fn, kwargs = rolling_windows_job, {"years": int(years), "step_months": int(step)}
+            label = f"Okna kroczące {int(years)} lat, co {int(step)} mies."
+        elif kind == "walk_forward":
+            fit_years = col1.number_input("Okno dopasowania (lata)", min_value=1, max_value=20, value=5, key="job_fit")
+            test_years = col2.number_input("Okno testu (lata)", min_value=1, max_value=10, value=1, key="job_test")
+            fn = walk_forward_job
+            kwargs = {"fit_years": int(fit_years), "test_years": int(test_years), "start": config["initial_date"]}
+            label = f"Walk-forward TREND {int(fit_years)}/{int(test_years)} od {config['initial_date']:%Y-%m-%d}"
+        else:
+            delta = col1.number_input("Zmiana parametru (pp)", min_value=0.1, max_value=10.0, value=1.0, step=0.1,
+                                      key="job_delta")
+            fn, kwargs = sensitivity_job, {"delta": float(delta), "use_trend": use_trend}
+            label = f"Wrażliwość na koszty ±{float(delta):.1f} pp"
+
+        if st.button("▶️ Uruchom w tle"):
+            runner.submit(kind, fn, data, config, label=label, params=kwargs, owner=owner, **kwargs)
+
+        jobs = runner.jobs(owner)
+        st.session_state.jobs = {job["id"]: job for job in jobs}
+        if not jobs:
+            st.caption("Brak zadań - wyniki zakończonych zadań zostają w katalogu zadania/.")
+            return
+
+        active = [job["id"] for job in jobs if job["status"] in JOB_ACTIVE_STATES]
+        if active:
+            show_job_progress(runner, active)
+
+        st.dataframe(pd.DataFrame([{
+            "Zadanie": job["label"],
+            "Stan": JOB_STATUS_LABELS[job["status"]],
+            "Postęp (%)": job["progress"] * 100,
+            "Zlecono": datetime.fromtimestamp(job["created"]).strftime("%Y-%m-%d %H:%M:%S"),
+            "Czas (s)": (job["finished"] or time.time()) - job["started"] if job["started"] else None,
+            "Błąd": job["error"],
+        } for job in jobs]), hide_index=True)
+
+        finished = [job for job in jobs if job["status"] == JOB_DONE]
+        if finished:
+            labels = {job["id"]: f"{job['label']} ({datetime.fromtimestamp(job['finished']):%H:%M:%S})" for job in finished}
+            job_id = st.selectbox("Wynik zadania", list(labels), format_func=labels.get, key="job_result")
+            for name, frame in runner.result(job_id).items():
+                st.markdown(f"**{name}**")
+                st.dataframe(frame, hide_index=True)
+
+        # Usuwanie zakończonych zadań wraz z plikami wyników (katalog zadania/)
+        inactive = {job["id"]: job["label"] for job in jobs if job["status"] not in JOB_ACTIVE_STATES}
+        if inactive:
+            col1, col2 = st.columns([5, 1])
+            to_delete = col1.multiselect("Zadania do usunięcia", list(inactive), format_func=inactive.get,
+                                         key="job_delete")
+            if col2.button("🗑️ Usuń", disabled=not to_delete):
+                for job_id in to_delete:
+                    runner.delete(job_id)
+                st.rerun()
+
+
+@st.fragment(run_every=1)
+def show_job_progress(runner, job_ids):
+    """Postęp aktywnych zadań odświeżany co sekundę; po ich zakończeniu - odświeżenie listy wyników."""
+    jobs = [runner.status(job_id) for job_id in job_ids]
+    st.session_state.jobs.update({job["id"]: job for job in jobs})
+
+    if not any(job["status"] in JOB_ACTIVE_STATES for job in jobs):
+        st.rerun()
+
+    for job in jobs:
+        col1, col2 = st.columns([5, 1])
+        col1.progress(job["progress"], text=f"{job['label']} · {JOB_STATUS_LABELS[job['status']]} {job['message']}")
+        if job["status"] in JOB_ACTIVE_STATES and col2.button("⛔ Anuluj", key=f"job_cancel_{job['id']}"):
+            runner.cancel(job["id"])
+
+
+# =========================================
+# 7. Główna sekcja aplikacji
+# =========================================
+
+st.title("Symulator ReBalancingu Portfela Metali Szlachetnych")
+st.markdown("---")
+
+# Parametry kalendarza podglądu (klucz bufora kalendarza miesięcznego)
+CALENDAR_KEYS = (
+    "initial_date", "end_purchase_date", "purchase_freq", "purchase_day",
+    "rebalance_1", "rebalance_1_condition", "rebalance_1_threshold", "rebalance_1_start",
+    "rebalance_2", "rebalance_2_condition", "rebalance_2_threshold", "rebalance_2_start",
+)
+
+
+def run_live_preview(config, use_trend):
+    """
+    Podgląd na żywo: natychmiast wynik przybliżony, potem dokładna symulacja.
+
+    Dokładna symulacja liczona jest w wątku roboczym sesji. Gdy w trakcie
+    oczekiwania użytkownik zmieni parametr, Streamlit przerywa ten przebieg,
+    a nowe zlecenie anuluje nieaktualną symulację.
+
+    Returns:
+    --------
+    tuple or None
+        (wynik, historia TREND) lub None, gdy wynik dla tej konfiguracji jest już wyświetlany
+    """
+    key = config_fingerprint(config)
+    if key == st.session_state.get("live_key"):
+        return None
+
+    if "refiner" not in st.session_state:
+        st.session_state.refiner = Refiner()
+    job = st.session_state.refiner.submit(key, lambda cancel: simulate_shared(
+        result_cache, data, config, result_data_key(config), use_trend=use_trend, cancel=cancel
+    ))
+
+    if not job.done():
+        preview_box = st.empty()
+        with preview_box.container():
+            coarse = price_store.coarse
+            calendar = load_coarse_calendar(
+                price_store.version_key, coarse.index, tuple((k, config[k]) for k in CALENDAR_KEYS)
+            )
+            preview = simulate_coarse(coarse, calendar, config, use_trend=use_trend, data=data)
+            add_real_values(preview, inflation_real)
+            preview_summary = summarize(preview, config["storage_fee"], config["vat"])
+
+            st.subheader("⚡ Podgląd przybliżony (ceny miesięczne)")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("📦 Wartość końcowa portfela (≈)", f"{preview_summary['final_value']:,.2f} EUR")
+            with col2:
+                st.metric("📈 Roczny zwrot (nominalny, ≈)", f"{preview_summary['cagr'] * 100:.2f}%")
+            st.line_chart(preview[["Portfolio Value", "Invested"]])
+            status = st.empty()
+
+        # Wywołania Streamlit w pętli pozwalają przerwać oczekiwanie przy kolejnej zmianie parametrów
+        started = time.time()
+        while not job.done():
+            status.caption(f"⏳ Trwa dokładna symulacja dzienna... {time.time() - started:.1f} s")
+            time.sleep(0.1)
+        preview_box.empty()
+
+    st.session_state.live_key = key
+    return job.result()
+
+
+live_result = run_live_preview(run_config, trend_active) if live_mode and dates_valid else None
+
+# Uruchom symulację po kliknięciu przycisku
+if dates_valid:
+    start_simulation = st.sidebar.button("🚀 Uruchom symulację")
+else:
+    st.sidebar.button("🚀 Uruchom symulację", disabled=True)
+    start_simulation = False
+
+# Jeśli przycisk został kliknięty lub istnieją już wyniki w pamięci, pokaż wyniki
+if start_simulation or live_result is not None or st.session_state.last_simulation_result is not None:
+    with st.spinner("Trwa symulacja..."):
+        if start_simulation or live_result is not None:
+            # Uruchom nową symulację (w trybie na żywo wynik jest już policzony)
+            if live_result is not None:
+                result, trend_data = live_result
+            else:
+                result, trend_data = simulate_shared(
+                    result_cache, data, run_config, result_data_key(run_config), use_trend=trend_active
+                )
+                st.session_state.live_key = config_fingerprint(run_config)
+            st.session_state.last_simulation_result = result
+            st.session_state.last_trend_data = trend_data
+            st.session_state.last_run_config = run_config
+            st.session_state.run_history.add(run_config, result, trend_data, data_key=result_data_key(run_config))
+
+            # Wynik ze stałą alokacją liczony jest przy włączeniu porównania TREND
+            st.session_state.last_fixed_result = None
+        else:
+            # Użyj zapisanych wyników
+            result = st.session_state.last_simulation_result
+            trend_data = st.session_state.last_trend_data if 'last_trend_data' in st.session_state else None
+
+    # === Korekta wartości portfela o realną inflację ===
+
+    add_real_values(result, inflation_real)
+
+    # Parametry, z którymi policzono wyświetlane wyniki
+    results_config = st.session_state.get("last_run_config", run_config)
+
+    show_results_summary(result, trend_data, results_config)
+    show_composition(result, results_config)
+    show_correlation()
+
+    # Analiza strategii TREND (jeśli wyświetlany wynik ją stosował)
+    if results_config["trend_active"] and trend_data is not None:
+        show_trend_analysis(result, trend_data, results_config)
+
+    show_trends_dashboard()
+    show_history_table(result, results_config)
+    show_sensitivity(results_config, results_config["trend_active"])
+    show_run_history(results_config)
+    show_experiment_store(result, results_config)
+    show_background_jobs(results_config, results_config["trend_active"])
+
 else:
     # Jeśli nie rozpoczęto symulacji, wyświetl instrukcje
     st.info("👈 Ustaw parametry symulacji w menu bocznym i kliknij 'Uruchom symulację'.")
@@ -1759,18 +1760,14 @@ else:
     st.subheader("📈 Historyczne ceny metali szlachetnych (EUR/g)")
     
     # Przygotuj dane do wykresu
-    price_chart_data = data[["Gold_EUR", "Silver_EUR", "Platinum_EUR", "Palladium_EUR"]].copy()
+    price_chart_data = data[[metal + PRICE_SUFFIX for metal in assets]].copy()
     
     # Zmień nazwy kolumn dla czytelności
-    price_chart_data.rename(columns={
-        "Gold_EUR": "Złoto (Au)",
-        "Silver_EUR": "Srebro (Ag)",
-        "Platinum_EUR": "Platyna (Pt)",
-        "Palladium_EUR": "Pallad (Pd)"
-    }, inplace=True)
+    price_chart_data.columns = [metal_label(metal) for metal in assets]
     
-    # Wyświetl wykres
-    st.line_chart(price_chart_data)
+    # Wyświetl wykres (zmniejszony do szerokości wykresu, buforowany per wersja danych i zakres)
+    price_start, price_end = chart_date_range(price_chart_data.index, key="price_chart_range")
+    st.line_chart(load_chart(price_store.version_key, "prices", price_chart_data, price_start, price_end))
     
     st.write("""
     ### Witaj w Symulatorze ReBalancingu Portfela Metali Szlachetnych!
@@ -0,0 +1,252 @@
+"""
+Wsadowe symulacje wielu wariantów portfela na wspólnych tablicach cen.
+
+simulate_cost_batch() liczy naraz K wariantów różniących się wyłącznie
+kosztami (marże, ceny odkupu, narzuty ReBalancingu, opłata magazynowa, VAT).
+Kalendarz zdarzeń (zakupy, ReBalancing, koszty roczne) oraz alokacje TREND
+nie zależą od kosztów, więc wyznaczane są raz, a stan portfela
+przechowywany jest jako macierz (warianty × metale).
+
+Kolejność operacji arytmetycznych odpowiada engine.simulate(), dzięki czemu
+wariant bez zmian daje ten sam wynik co pojedyncza symulacja.
+"""
+
+import numpy as np
+import pandas as pd
+
+from engine import (
+    MIN_DAYS_BETWEEN_REBALANCES,
+    SimulationCancelled,
+    asset_names,
+    asset_vector,
+    execution_prices,
+    find_best_metal_of_year,
+    generate_purchase_dates,
+    rebalance_labels,
+    rebalance_rows,
+    trend_allocations,
+    trend_log,
+    weighted_sum,
+)
+
+# Parametry kosztowe, które mogą różnić się między wariantami
+COST_KEYS = ("margins", "buyback_discounts", "rebalance_markup", "storage_fee", "vat")
+
+
+def _cost_arrays(config, cost_overrides, assets):
+    """Zamienia listę nadpisań kosztów na macierze (warianty × aktywa) i wektory."""
+    variants = []
+    for override in cost_overrides:
+        variant = {key: config[key] for key in COST_KEYS}
+        for key, value in override.items():
+            if key not in COST_KEYS:
+                raise ValueError(f"Parametr {key} nie jest parametrem kosztowym")
+            variant[key] = {**variant[key], **value} if isinstance(value, dict) else value
+        variants.append(variant)
+
+    def per_metal(key):
+        return np.array([asset_vector(v[key], assets) for v in variants], dtype=float).reshape(len(variants), len(assets))
+
+    return (
+        per_metal("margins"),
+        per_metal("buyback_discounts"),
+        per_metal("rebalance_markup"),
+        np.array([v["storage_fee"] for v in variants], dtype=float),
+        np.array([v["vat"] for v in variants], dtype=float),
+    )
+
+
+def simulate_cost_batch(data, config, cost_overrides, use_trend=None, fixed_allocation=False,
+                        keep_history=False, dtype=np.float64, progress=None, cancel=None):
+    """
+    Symuluje wiele wariantów kosztów jednym przebiegiem po wspólnym kalendarzu.
+
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Ceny metali
+    config : dict
+        Parametry bazowe (jak dla engine.simulate)
+    cost_overrides : list of dict
+        Nadpisania kosztów dla kolejnych wariantów, np.
+        [{}, {"storage_fee": 2.5}, {"margins": {"Gold": 16.6}}]
+    use_trend : bool or None
+        Czy użyć strategii TREND (None = config["trend_active"])
+    fixed_allocation : bool
+        Czy używać stałej alokacji nawet gdy TREND jest aktywny
+    keep_history : bool
+        Czy zwrócić pełne wyniki zdarzeń dla każdego wariantu
+    dtype : numpy dtype
+        Typ obliczeń: np.float64 (domyślnie, wynik identyczny z engine.simulate)
+        lub np.float32 (połowa pamięci; błąd sprawdza precision.check_cost_batch)
+    progress : callable or None
+        progress(dni, wszystkie dni, opis) wywoływane na przełomie każdego roku
+    cancel : threading.Event or None
+        Sygnał przerwania sprawdzany na przełomie każdego roku
+
+    Returns:
+    --------
+    dict
+        "final_value" (K,), "final_grams" (K × aktywa), "invested",
+        "end_date", "trend_data" oraz - przy keep_history - "results"
+        (lista DataFrame w formacie engine.simulate)
+
+    Raises:
+    -------
+    SimulationCancelled
+        Gdy sygnał cancel zostanie ustawiony w trakcie symulacji
+    """
+    if use_trend is None:
+        use_trend = config["trend_active"]
+
+    assets = asset_names(data)
+    margins, buyback, markup, storage_fee, vat = (
+        a.astype(dtype, copy=False) for a in _cost_arrays(config, cost_overrides, assets)
+    )
+    n_variants = len(cost_overrides)
+    alloc = asset_vector(config["allocation"], assets, dtype=dtype)
+
+    index = data.index
+    px = execution_prices(data, config, dtype=dtype)
+    prices = px["purchase"]
+    initial_date = pd.to_datetime(config["initial_date"])
+    end_date = pd.to_datetime(config["end_purchase_date"])
+    purchase_amount = config["purchase_amount"]
+
+    # ---- wspólny kalendarz ----
+    lo = index.searchsorted(initial_date, side="left")
+    hi = index.searchsorted(end_date, side="right")
+    purchase_set = set(generate_purchase_dates(data, initial_date, config["purchase_freq"], config["purchase_day"], end_date))
+    rebalances = []
+    for n in (1, 2):
+        if config[f"rebalance_{n}"]:
+            rebalances.append((
+                n - 1,
+                f"rebalance_{n}",
+                pd.to_datetime(config[f"rebalance_{n}_start"]),
+                config[f"rebalance_{n}_condition"],
+                config[f"rebalance_{n}_threshold"],
+            ))
+    years = index.year.to_numpy()
+
+    # ---- stan ----
+    portfolio = np.zeros((n_variants, len(assets)), dtype=dtype)
+    invested = 0.0
+    history = []  # (pozycja, zainwestowane, kopia portfela, akcja lub tablica akcji)
+    last_rebalance = np.full((2, n_variants), np.iinfo(np.int64).min // 2, dtype=np.int64)
+
+    initial_pos = index.get_indexer([initial_date], method="nearest")[0]
+    p = prices[initial_pos]
+    portfolio += (config["initial_allocation"] * alloc) / (p * (1 + margins / 100))
+    invested += config["initial_allocation"]
+    history.append((initial_pos, invested, portfolio.copy(), "initial"))
+
+    trend_plan = None
+    if use_trend and not fixed_allocation:
+        trend_rows = np.unique(index.get_indexer(list(purchase_set)))
+        trend_rows = trend_rows[(trend_rows >= lo) & (trend_rows < hi)]
+        trend_plan = trend_allocations(data, config, trend_rows, initial_pos)
+        trend_weights = trend_plan["weights"].astype(dtype, copy=False)
+    trend_row = 0
+    last_year = None
+
+    def apply_rebalance(pos, slot, label, condition_enabled, threshold_percent):
+        day = index[pos].value // 86_400_000_000_000
+        too_soon = (day - last_rebalance[slot]) < MIN_DAYS_BETWEEN_REBALANCES
+        act, no_value, no_deviation = rebalance_rows(
+            px["rebalance"][pos], portfolio, alloc, buyback, markup, condition_enabled, threshold_percent, too_soon
+        )
+        last_rebalance[slot] = np.where(act, day, last_rebalance[slot])
+        return rebalance_labels(label, too_soon, no_value, no_deviation)
+
+    for pos in range(lo, hi):
+        d = index[pos]
+        actions = []
+
+        if d in purchase_set:
+            p = prices[pos]
+            if trend_plan is not None:
+                weights = trend_weights[trend_row]
+                trend_row += 1
+            else:
+                weights = alloc
+
+            portfolio += (purchase_amount * weights) / (p * (1 + margins / 100))
+            invested += purchase_amount
+            actions.append("recurring")
+
+        for slot, label, start, condition_enabled, threshold in rebalances:
+            if d >= start and d.month == start.month and d.day == start.day:
+                actions.append(apply_rebalance(pos, slot, label, condition_enabled, threshold))
+
+        if last_year is None:
+            last_year = d.year
+
+        if d.year != last_year:
+            year_positions = np.flatnonzero(years == last_year)
+            end_pos = year_positions[-1]
+            p_end = px["storage_fee"][end_pos]
+            storage_cost = invested * (storage_fee / 100) * (1 + vat / 100)
+            storage_metal = config["storage_metal"]
+
+            if storage_metal == "ALL":
+                total_value = weighted_sum(p_end, portfolio)
+                for i in range(len(assets)):
+                    share = (p_end[i] * portfolio[:, i]) / total_value
+                    sell_price = p_end[i] * (1 + buyback[:, i] / 100)
+                    portfolio[:, i] -= np.minimum((storage_cost * share) / sell_price, portfolio[:, i])
+            else:
+                if storage_metal == "Best of year":
+                    storage_metal = find_best_metal_of_year(data, index[year_positions[0]], index[end_pos])
+                i = assets.index(storage_metal)
+                sell_price = p_end[i] * (1 + buyback[:, i] / 100)
+                portfolio[:, i] -= np.minimum(storage_cost / sell_price, portfolio[:, i])
+
+            history.append((end_pos, invested, portfolio.copy(), "storage_fee"))
+            last_year = d.year
+
+            if cancel is not None and cancel.is_set():
+                raise SimulationCancelled()
+            if progress is not None:
+                progress(int(pos - lo), int(hi - lo), f"rok {d.year}")
+
+        if actions:
+            if all(isinstance(a, str) for a in actions):
+                action = ", ".join(actions)
+            else:
+                action = np.array([
+                    ", ".join(a if isinstance(a, str) else a[k] for a in actions)
+                    for k in range(n_variants)
+                ], dtype=object)
+            history.append((pos, invested, portfolio.copy(), action))
+
+    last_pos = history[-1][0]
+    final_value = weighted_sum(px["valuation"][last_pos] * (1 + buyback / 100), portfolio)
+
+    out = {
+        "final_value": final_value,
+        "final_grams": portfolio.copy(),
+        "invested": invested,
+        "end_date": index[last_pos],
+        "trend_data": trend_log(index, trend_rows, trend_plan, config["trend_strategy_type"])
+        if trend_plan is not None and len(trend_rows) else None,
+    }
+
+    if keep_history:
+        positions = np.array([h[0] for h in history])
+        grams = np.stack([h[2] for h in history], axis=1)  # (K, H, aktywa)
+        values = weighted_sum(px["valuation"][positions][None, :, :] * (1 + buyback[:, None, :] / 100), grams)
+        dates = index[positions]
+        results = []
+        for k in range(n_variants):
+            frame = pd.DataFrame({
+                "Date": dates,
+                "Invested": np.array([h[1] for h in history], dtype=dtype),
+                **{m: grams[k, :, i] for i, m in enumerate(assets)},
+                "Portfolio Value": values[k],
+                "Akcja": [h[3] if isinstance(h[3], str) else h[3][k] for h in history],
+            }).set_index("Date")
+            results.append(frame)
+        out["results"] = results
+
+    return out
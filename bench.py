@@ -0,0 +1,420 @@
+"""
+Testy wydajności: skalowanie ścieżek obliczeń z długością danych i liczbą aktywów.
+
+Dla każdej kombinacji --years × --assets tworzone są syntetyczne ceny
+(synthetic.synthetic_prices), zapisywane do plików tymczasowych i mierzony
+jest czas każdego zarejestrowanego testu (najlepszy z --repeat przebiegów):
+wczytania pliku, symulacji pojedynczej, TREND, wsadu kosztów i księgi klientów.
+Symulacje obejmują cały zakres danych, więc czas rośnie z ich długością.
+
+Polecenie app mierzy to, co odczuwa użytkownik: pełne przeładowanie skryptu
+app.py (panel boczny, bufory, inflacja, wykresy) w Streamlit AppTest, bez
+przeglądarki. Kolejne interakcje (APP_STEPS): strona startowa, symulacja,
+zmiana typu wykresu, włączenie TREND i porównania ze stałą alokacją. Dla
+każdej zapisywany jest czas przeładowania (mediana z --repeat sesji, każda
+z wyczyszczonymi buforami st.cache_*) i pamięć procesu (RSS), porównywane
+ze wzorcem w BASELINE_PATH.
+
+Przykład:
+    python bench.py engine --years 25 50 100 200 --assets 4 16 48
+    python bench.py engine --bench simulate --bench book --out bench.csv
+    python bench.py app                  # porównanie ze wzorcem
+    python bench.py app --save-baseline  # zapis nowego wzorca
+
+Nowy test dodaje się dekoratorem:
+
+    @register_benchmark("moj")
+    def my_benchmark(data, files):
+        ...
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from batch import simulate_cost_batch
+from book import simulate_fixed_book
+from engine import asset_names, load_prices, normalize_config, simulate
+from export import parquet_available
+from precision import sample_configs
+from synthetic import synthetic_prices, write_prices
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DATA_PATH = "lbma_data.csv"
+APP_PATH = "app.py"
+BASELINE_PATH = "bench_baseline.json"
+
+# Dopuszczalny wzrost czasu przeładowania i pamięci względem wzorca (ułamek)
+DEFAULT_TOLERANCE = 0.25
+
+# Różnice czasu poniżej progu nie są regresją (szum pomiaru krótkich przeładowań)
+MIN_REGRESSION_SECONDS = 0.05
+
+# Limit czasu pojedynczego przeładowania w AppTest (s)
+APP_TIMEOUT = 600
+
+# Domyślna liczba sesji app - pojedyncze przeładowanie jest zbyt zaszumione
+APP_REPEAT = 3
+
+# Rozmiar wsadów w testach batch i book
+BATCH_VARIANTS = 20
+BOOK_CLIENTS = 100
+
+# Zarejestrowane testy: nazwa -> (funkcja, warunek dostępności)
+BENCHMARKS = {}
+
+
+def register_benchmark(name, available=None):
+    """
+    Dekorator rejestrujący test wydajności.
+
+    Funkcja testu przyjmuje (data, files) - ceny i słownik plików z tymi
+    cenami ("csv", "parquet") - a mierzony jest czas jej całego wywołania.
+    available() pozwala pominąć test, gdy brak opcjonalnej zależności.
+    """
+    def decorator(fn):
+        BENCHMARKS[name] = (fn, available)
+        return fn
+    return decorator
+
+
+def full_range_config(data, **params):
+    """Konfiguracja obejmująca cały zakres danych (pozostałe parametry domyślne)."""
+    return normalize_config({"initial_date": data.index.min(), "end_purchase_date": data.index.max(), **params}, data)
+
+
+@register_benchmark("load_csv")
+def _load_csv(data, files):
+    load_prices(files["csv"])
+
+
+@register_benchmark("load_parquet", available=parquet_available)
+def _load_parquet(data, files):
+    load_prices(files["parquet"])
+
+
+@register_benchmark("simulate")
+def _simulate(data, files):
+    simulate(data, full_range_config(data))
+
+
+@register_benchmark("simulate_trend")
+def _simulate_trend(data, files):
+    simulate(data, full_range_config(data, trend_active=True))
+
+
+@register_benchmark("batch")
+def _batch(data, files):
+    overrides = [{"storage_fee": fee} for fee in np.linspace(0.5, 3.0, BATCH_VARIANTS)]
+    simulate_cost_batch(data, full_range_config(data), overrides)
+
+
+@register_benchmark("book")
+def _book(data, files):
+    simulate_fixed_book(data, sample_configs(data, BOOK_CLIENTS))
+
+
+def run_engine(source, years, assets, names=None, repeat=1, gap_rate=0.0, seed=0, progress=None):
+    """
+    Czas testów dla każdej kombinacji długości danych i liczby aktywów.
+
+    Parameters:
+    -----------
+    source : pd.DataFrame
+        Ceny źródłowe dla synthetic_prices
+    years, assets : list
+        Długości danych w latach i liczby aktywów
+    names : list or None
+        Uruchamiane testy (None - wszystkie dostępne)
+    repeat : int
+        Liczba przebiegów każdego testu (raportowany najlepszy czas)
+
+    Returns:
+    --------
+    pd.DataFrame
+        Wiersz na kombinację: lata, aktywa, notowania i czas każdego testu (s)
+    """
+    selected = {name: fn for name, (fn, available) in BENCHMARKS.items()
+                if (names is None or name in names) and (available is None or available())}
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_years in years:
+            for n_assets in assets:
+                data = synthetic_prices(source, years=n_years, assets=n_assets, gap_rate=gap_rate, seed=seed)
+                files = {"csv": os.path.join(tmp, "ceny.csv")}
+                write_prices(data, files["csv"])
+                if "load_parquet" in selected:
+                    files["parquet"] = os.path.join(tmp, "ceny.parquet")
+                    write_prices(data, files["parquet"])
+
+                row = {"lata": n_years, "aktywa": len(asset_names(data)), "notowania": len(data)}
+                for name, fn in selected.items():
+                    timings = []
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        fn(data, files)
+                        timings.append(time.perf_counter() - started)
+                    row[name] = round(min(timings), 3)
+                rows.append(row)
+                if progress is not None:
+                    progress(row)
+    return pd.DataFrame(rows)
+
+
+# =========================================
+# Przeładowania aplikacji (Streamlit AppTest)
+# =========================================
+
+def _find(elements, label):
+    """Widżet o etykiecie zawierającej label (ValueError, gdy etykieta zmieniła się w app.py)."""
+    for element in elements:
+        if label in element.label:
+            return element
+    raise ValueError(f"Brak widżetu „{label}” w aplikacji.")
+
+
+def _rss_mb():
+    """Bieżąca pamięć procesu (RSS) w MB; poza Linuksem - szczytowa."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb():
+    """Szczytowa pamięć procesu (RSS) w MB (None, gdy niedostępna)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss: kilobajty w Linuksie, bajty w macOS
+    return peak / 1e6 if sys.platform == "darwin" else peak * 1024 / 1e6
+
+
+# Interakcje w kolejności wykonania: nazwa -> funkcja przygotowująca przeładowanie
+APP_STEPS = {
+    "landing": lambda at: at,
+    "simulate": lambda at: _find(at.sidebar.button, "Uruchom symulację").click(),
+    "viz_area": lambda at: _find(at.selectbox, "Typ wizualizacji").set_value("Wykres obszarowy"),
+    "viz_bar": lambda at: _find(at.selectbox, "Typ wizualizacji").set_value("Wykres słupkowy"),
+    "trend_on": lambda at: _find(at.sidebar.checkbox, "Aktywuj strategię TREND").check(),
+    "trend_simulate": lambda at: _find(at.sidebar.button, "Uruchom symulację").click(),
+    "trend_comparison": lambda at: _find(at.checkbox, "Porównanie z alokacją stałą").check(),
+}
+
+
+def run_app(app_path=APP_PATH, repeat=1, progress=None):
+    """
+    Czas przeładowania app.py i pamięć procesu po każdej interakcji APP_STEPS.
+
+    Każda z repeat sesji zaczyna od wyczyszczonych st.cache_data i
+    st.cache_resource, więc mierzy pierwszą wizytę użytkownika. Przed
+    pomiarem strona startowa ładowana jest raz bez zapisu czasu - import
+    modułów aplikacji odbywa się w serwerze tylko raz i nie jest liczony.
+
+    Returns:
+    --------
+    pd.DataFrame
+        Wiersz na interakcję: mediana i minimum czasu (s), RSS po
+        interakcji i szczytowy RSS (MB, maksimum z sesji)
+
+    Raises:
+    -------
+    RuntimeError
+        Gdy przeładowanie zakończyło się wyjątkiem w aplikacji
+    """
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    AppTest.from_file(app_path, default_timeout=APP_TIMEOUT).run()
+
+    timings = {name: [] for name in APP_STEPS}
+    memory = {name: [0.0, 0.0] for name in APP_STEPS}
+    for session in range(repeat):
+        st.cache_data.clear()
+        st.cache_resource.clear()
+        at = AppTest.from_file(app_path, default_timeout=APP_TIMEOUT)
+        for name, interact in APP_STEPS.items():
+            interact(at)
+            started = time.perf_counter()
+            at.run()
+            timings[name].append(time.perf_counter() - started)
+            if at.exception:
+                raise RuntimeError(f"{name}: {at.exception[0].value}")
+            rss = _rss_mb() or 0.0
+            memory[name] = [max(memory[name][0], rss), max(memory[name][1], _peak_rss_mb() or 0.0, rss)]
+            if progress is not None:
+                progress(session, name, timings[name][-1])
+
+    return pd.DataFrame([
+        {
+            "interakcja": name,
+            "czas (s)": round(statistics.median(timings[name]), 3),
+            "min (s)": round(min(timings[name]), 3),
+            "RSS (MB)": round(memory[name][0], 1),
+            "szczyt RSS (MB)": round(memory[name][1], 1),
+        }
+        for name in APP_STEPS
+    ])
+
+
+def load_baseline(path=BASELINE_PATH):
+    """Wzorzec czasów i pamięci (słownik z pliku JSON) lub None, gdy brak pliku."""
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(table, path=BASELINE_PATH, repeat=1):
+    """Zapisuje wynik run_app() jako wzorzec (z opisem środowiska pomiaru)."""
+    import streamlit as st
+
+    baseline = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "streamlit": st.__version__,
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "cpus": os.cpu_count(),
+            "repeat": repeat,
+        },
+        "steps": {
+            row["interakcja"]: {"seconds": row["czas (s)"], "rss_mb": row["RSS (MB)"]}
+            for row in table.to_dict("records")
+        },
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+
+
+def compare_baseline(table, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Porównanie wyniku run_app() ze wzorcem.
+
+    Regresją jest czas dłuższy o ponad tolerance (i o co najmniej
+    MIN_REGRESSION_SECONDS) lub RSS większy o ponad tolerance.
+
+    Returns:
+    --------
+    tuple
+        (tabela z kolumnami wzorca, ilorazem czasów i oceną, lista regresji)
+    """
+    rows, regressions = [], []
+    for row in table.to_dict("records"):
+        name, seconds, rss = row["interakcja"], row["czas (s)"], row["RSS (MB)"]
+        base = baseline["steps"].get(name)
+        if base is None:
+            rows.append({**row, "wzorzec (s)": None, "czas / wzorzec": None, "wzorzec RSS (MB)": None, "ocena": "nowa"})
+            continue
+        slower = seconds > base["seconds"] * (1 + tolerance) and seconds - base["seconds"] >= MIN_REGRESSION_SECONDS
+        heavier = bool(base["rss_mb"]) and rss > base["rss_mb"] * (1 + tolerance)
+        problems = [label for label, flag in (("czas", slower), ("pamięć", heavier)) if flag]
+        regressions.extend(f"{name}: {problem}" for problem in problems)
+        rows.append({
+            **row,
+            "wzorzec (s)": base["seconds"],
+            "czas / wzorzec": round(seconds / base["seconds"], 2) if base["seconds"] else None,
+            "wzorzec RSS (MB)": base["rss_mb"],
+            "ocena": "REGRESJA (" + ", ".join(problems) + ")" if problems else "OK",
+        })
+    return pd.DataFrame(rows), regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Testy wydajności ścieżek obliczeń.")
+    parser.add_argument("command", choices=["engine", "app", "list"], help="engine, app lub list")
+    parser.add_argument("--data", default=DATA_PATH, help=f"Plik z cenami źródłowymi (domyślnie: {DATA_PATH})")
+    parser.add_argument("--years", type=float, nargs="+", default=[25, 50, 100], help="Długości danych w latach")
+    parser.add_argument("--assets", type=int, nargs="+", default=[4, 16], help="Liczby aktywów")
+    parser.add_argument("--gap-rate", type=float, default=0.0, help="Udział dni bez notowań")
+    parser.add_argument("--bench", action="append", default=None,
+                        help="Uruchamiany test (można powtarzać; domyślnie wszystkie)")
+    parser.add_argument("--repeat", type=int, default=None,
+                        help=f"Liczba przebiegów testu engine (najlepszy czas, domyślnie 1) "
+                             f"lub sesji app (mediana, domyślnie {APP_REPEAT})")
+    parser.add_argument("--seed", type=int, default=0, help="Ziarno generatora danych")
+    parser.add_argument("--out", default=None, help="Zapis tabeli wyników do CSV")
+    parser.add_argument("--app", default=APP_PATH, help=f"Skrypt aplikacji (domyślnie: {APP_PATH})")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help=f"Plik wzorca app (domyślnie: {BASELINE_PATH})")
+    parser.add_argument("--save-baseline", action="store_true", help="Zapisz wynik app jako nowy wzorzec")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Dopuszczalny wzrost czasu i pamięci względem wzorca (ułamek)")
+    return parser
+
+
+def main_app(args):
+    try:
+        repeat = args.repeat or APP_REPEAT
+        table = run_app(args.app, repeat=repeat,
+                        progress=lambda session, name, seconds: print(f"sesja {session + 1}: {name} {seconds:.3f} s",
+                                                                      flush=True))
+    except (RuntimeError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    print()
+    baseline = None if args.save_baseline else load_baseline(args.baseline)
+    report, regressions = (table, []) if baseline is None else compare_baseline(table, baseline, args.tolerance)
+    print(report.to_string(index=False))
+    if args.out:
+        report.to_csv(args.out, index=False)
+
+    if args.save_baseline:
+        save_baseline(table, args.baseline, repeat=repeat)
+        print(f"\nZapisano wzorzec do {args.baseline}")
+    elif baseline is None:
+        print(f"\nBrak wzorca {args.baseline} - zapisz go opcją --save-baseline", file=sys.stderr)
+    for regression in regressions:
+        print(f"Regresja względem wzorca: {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == "list":
+        for name, (_, available) in BENCHMARKS.items():
+            print(name if available is None or available() else f"{name} (niedostępny)")
+        print(f"\nInterakcje app: {', '.join(APP_STEPS)}")
+        return 0
+    if args.command == "app":
+        return main_app(args)
+
+    unknown = [name for name in args.bench or [] if name not in BENCHMARKS]
+    if unknown:
+        print(f"Nieznane testy: {', '.join(unknown)} (dostępne: {', '.join(BENCHMARKS)})", file=sys.stderr)
+        return 2
+
+    source = load_prices(args.data)
+    try:
+        table = run_engine(source, args.years, args.assets, names=args.bench, repeat=args.repeat or 1,
+                           gap_rate=args.gap_rate, seed=args.seed,
+                           progress=lambda row: print(", ".join(f"{k}={v}" for k, v in row.items()), flush=True))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    print()
+    print(table.to_string(index=False))
+    if args.out:
+        table.to_csv(args.out, index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,553 @@
+"""
+Symulacja całej księgi klientów na wspólnej historii cen.
+
+Każdy klient ma własną datę startu, kwotę początkową, harmonogram zakupów
+i alokację. Klienci ze stałą alokacją liczeni są jednym przebiegiem po dniach
+notowań: stan wszystkich portfeli to macierz (klienci × metale), a kalendarze
+zdarzeń (zakupy, ReBalancing, koszty roczne) wyznaczane są z góry, wektorowo
+i buforowane między klientami o tym samym harmonogramie. Klienci z aktywną
+strategią TREND liczeni są przez engine.simulate() (opcjonalnie w puli procesów).
+
+Kolejność operacji arytmetycznych odpowiada engine.simulate(), więc wynik
+każdego klienta jest taki sam jak przy osobnej symulacji.
+
+Przykład:
+    python book.py klienci.csv --out ksiega/
+
+Tabela klientów (CSV, JSON lub YAML) zawiera klucze engine.DEFAULT_CONFIG;
+parametry per metal podaje się w kolumnach z kropką, np. "allocation.Gold"
+(tak samo fixingi wykonania dla danych z kilkoma notowaniami dziennie,
+np. "execution_fix.purchase" = "AM").
+Kolumna "name" identyfikuje klienta.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from engine import (
+    MIN_DAYS_BETWEEN_REBALANCES,
+    PER_ASSET_KEYS,
+    add_real_values,
+    asset_columns,
+    asset_names,
+    asset_vector,
+    execution_prices,
+    find_best_metal_of_year,
+    load_inflation,
+    load_prices,
+    normalize_config,
+    purchase_positions,
+    rebalance_labels,
+    rebalance_rows,
+    simulate,
+    summarize,
+    weighted_sum,
+)
+from experiments import ExperimentStore
+from export import write_csv
+
+# Rodzaje zdarzeń w kolejności wykonywania w obrębie dnia (jak w engine.simulate)
+INITIAL, PURCHASE, REBALANCE_1, REBALANCE_2, STORAGE = range(5)
+
+# Dane współdzielone przez zadania w obrębie jednego procesu roboczego
+_DATA = None
+
+
+def _plain(value):
+    """Zamienia skalary numpy na typy wbudowane Pythona."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _row_to_raw(row):
+    """Wiersz tabeli klientów -> słownik parametrów (kolumny "klucz.Metal" jako słowniki)."""
+    raw = {}
+    for column, value in row.items():
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            continue
+        value = _plain(value)
+        if "." in column:
+            key, metal = column.split(".", 1)
+            raw.setdefault(key, {})[metal] = value
+        else:
+            raw[column] = value
+    return raw
+
+
+def client_configs(clients, base_config=None, data=None):
+    """
+    Zamienia tabelę klientów na listę kompletnych konfiguracji.
+
+    Parameters:
+    -----------
+    clients : pd.DataFrame or list
+        Tabela klientów, lista słowników parametrów lub lista par (nazwa, parametry)
+    base_config : dict or None
+        Parametry wspólne dla całej księgi (np. koszty); wartości klienta mają pierwszeństwo
+    data : pd.DataFrame or None
+        Ceny metali - potrzebne do wyznaczenia domyślnych dat
+
+    Returns:
+    --------
+    list
+        Lista par (nazwa, konfiguracja)
+
+    Raises:
+    -------
+    ValueError
+        Gdy parametry klienta są niespójne lub nazwy klientów się powtarzają
+    """
+    if isinstance(clients, pd.DataFrame):
+        rows = [_row_to_raw(row) for row in clients.to_dict(orient="records")]
+    else:
+        rows = [dict(raw) if isinstance(raw, dict) else {**raw[1], "name": raw[0]} for raw in clients]
+
+    base = dict(base_config or {})
+    configs = []
+    for i, row in enumerate(rows):
+        raw = {**base, **row}
+        # Koszty per metal łączone z parametrami księgi; alokacja klienta zastępuje je w całości
+        for key in PER_ASSET_KEYS:
+            if key != "allocation" and key in base and key in row:
+                raw[key] = {**base[key], **row[key]}
+        name = str(raw.pop("name", f"client_{i + 1:04d}"))
+        try:
+            configs.append((name, normalize_config(raw, data)))
+        except ValueError as e:
+            raise ValueError(f"Klient {name}: {e}") from e
+
+    names = [name for name, _ in configs]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(f"Zduplikowane nazwy klientów: {', '.join(duplicates)}")
+    return configs
+
+
+def _client_events(index, configs):
+    """
+    Kalendarze zdarzeń wszystkich klientów jako tablice (pozycja, klient, rodzaj).
+
+    Kalendarze zakupów i dat ReBalancingu są buforowane - klienci
+    o tym samym harmonogramie współdzielą jedno wyliczenie.
+    """
+    years = index.year.to_numpy()
+    year_starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+    months = index.month.to_numpy()
+    days = index.day.to_numpy()
+
+    purchase_cache = {}
+    rebalance_cache = {}
+    positions, clients, kinds = [], [], []
+
+    def add(pos, client, kind):
+        positions.append(pos)
+        clients.append(np.full(len(pos), client))
+        kinds.append(np.full(len(pos), kind))
+
+    starts = pd.DatetimeIndex([c["initial_date"] for c in configs])
+    ends = pd.DatetimeIndex([c["end_purchase_date"] for c in configs])
+    lo = index.searchsorted(starts, side="left")
+    hi = index.searchsorted(ends, side="right")
+    initial = index.get_indexer(starts, method="nearest")
+
+    for k, config in enumerate(configs):
+        add(initial[k:k + 1], k, INITIAL)
+
+        key = (config["initial_date"], config["end_purchase_date"], config["purchase_freq"], config["purchase_day"])
+        if key not in purchase_cache:
+            purchase_cache[key] = np.unique(purchase_positions(index, key[0], key[2], key[3], key[1]))
+        pos = purchase_cache[key]
+        add(pos[(pos >= lo[k]) & (pos < hi[k])], k, PURCHASE)
+
+        for n, kind in ((1, REBALANCE_1), (2, REBALANCE_2)):
+            if config[f"rebalance_{n}"]:
+                start = pd.to_datetime(config[f"rebalance_{n}_start"])
+                if start not in rebalance_cache:
+                    rebalance_cache[start] = np.flatnonzero(
+                        (months == start.month) & (days == start.day) & (index >= start)
+                    )
+                pos = rebalance_cache[start]
+                add(pos[(pos >= lo[k]) & (pos < hi[k])], k, kind)
+
+        add(year_starts[(year_starts > lo[k]) & (year_starts < hi[k])], k, STORAGE)
+
+    positions = np.concatenate(positions).astype(np.intp)
+    clients = np.concatenate(clients).astype(np.intp)
+    kinds = np.concatenate(kinds).astype(np.int8)
+    order = np.lexsort((clients, kinds, positions))
+    return positions[order], clients[order], kinds[order], year_starts
+
+
+def simulate_fixed_book(data, configs, dtype=np.float64):
+    """
+    Symuluje klientów ze stałą alokacją jednym przebiegiem po dniach ze zdarzeniami.
+
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Ceny metali
+    configs : list of dict
+        Kompletne konfiguracje klientów (normalize_config)
+    dtype : numpy dtype
+        Typ obliczeń: np.float64 (domyślnie, wynik identyczny z engine.simulate)
+        lub np.float32 (połowa pamięci; błąd sprawdza precision.check_fixed_book)
+
+    Returns:
+    --------
+    list
+        Wyniki klientów (DataFrame w formacie engine.simulate) w kolejności configs
+    """
+    if not configs:
+        return []
+
+    # Klienci z różnymi fixingami wykonania - osobny przebieg dla każdego wyboru
+    executions = [tuple(sorted((c.get("execution_fix") or {}).items())) for c in configs]
+    if len(set(executions)) > 1:
+        results = [None] * len(configs)
+        for execution in dict.fromkeys(executions):
+            group = [k for k, e in enumerate(executions) if e == execution]
+            for k, result in zip(group, simulate_fixed_book(data, [configs[k] for k in group], dtype=dtype)):
+                results[k] = result
+        return results
+
+    index = data.index
+    px = execution_prices(data, configs[0], dtype=dtype)
+    day_numbers = index.to_numpy(dtype="datetime64[D]").astype(np.int64)
+    n_clients = len(configs)
+
+    assets = asset_names(data)
+
+    def per_metal(key):
+        return np.array([asset_vector(c[key], assets, dtype) for c in configs], dtype=dtype)
+
+    def per_client(key, kind=dtype):
+        return np.array([c[key] for c in configs], dtype=kind)
+
+    alloc = per_metal("allocation")
+    margins = per_metal("margins")
+    buyback = per_metal("buyback_discounts")
+    markup = per_metal("rebalance_markup")
+    initial_amount = per_client("initial_allocation")
+    purchase_amount = per_client("purchase_amount")
+    storage_fee = per_client("storage_fee")
+    vat = per_client("vat")
+    storage_metal = per_client("storage_metal", object)
+    conditions = np.array([per_client(f"rebalance_{n}_condition", bool) for n in (1, 2)])
+    thresholds = np.array([per_client(f"rebalance_{n}_threshold") for n in (1, 2)])
+
+    positions, clients, kinds, year_starts = _client_events(index, configs)
+
+    portfolio = np.zeros((n_clients, len(assets)), dtype=dtype)
+    invested = np.zeros(n_clients, dtype=dtype)
+    last_rebalance = np.full((2, n_clients), np.iinfo(np.int64).min // 2, dtype=np.int64)
+    records = []  # (pozycja, klienci, gramy, zainwestowane, akcja lub tablica akcji)
+    best_metal = {}
+
+    bounds = np.flatnonzero(np.r_[True, positions[1:] != positions[:-1], True])
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        pos = positions[start]
+        p = px["purchase"][pos]
+        day_clients = clients[start:stop]
+        cuts = np.r_[0, np.searchsorted(kinds[start:stop], [PURCHASE, REBALANCE_1, REBALANCE_2, STORAGE]), stop - start]
+        initial_c, purchase_c, rebalance_1_c, rebalance_2_c, storage_c = (
+            day_clients[a:b] for a, b in zip(cuts[:-1], cuts[1:])
+        )
+
+        if len(initial_c):
+            portfolio[initial_c] += (initial_amount[initial_c, None] * alloc[initial_c]) / (p * (1 + margins[initial_c] / 100))
+            invested[initial_c] += initial_amount[initial_c]
+            records.append((pos, initial_c, portfolio[initial_c], invested[initial_c], "initial"))
+
+        if len(purchase_c):
+            portfolio[purchase_c] += (purchase_amount[purchase_c, None] * alloc[purchase_c]) / (p * (1 + margins[purchase_c] / 100))
+            invested[purchase_c] += purchase_amount[purchase_c]
+
+        rebalance_actions = []
+        for slot, label, group in ((0, "rebalance_1", rebalance_1_c), (1, "rebalance_2", rebalance_2_c)):
+            if not len(group):
+                continue
+            too_soon = (day_numbers[pos] - last_rebalance[slot, group]) < MIN_DAYS_BETWEEN_REBALANCES
+            rows = portfolio[group]
+            act, no_value, no_deviation = rebalance_rows(
+                px["rebalance"][pos], rows, alloc[group], buyback[group], markup[group],
+                conditions[slot, group], thresholds[slot, group], too_soon
+            )
+            portfolio[group] = rows
+            last_rebalance[slot, group] = np.where(act, day_numbers[pos], last_rebalance[slot, group])
+            rebalance_actions.append((group, rebalance_labels(label, too_soon, no_value, no_deviation)))
+
+        # Koszty magazynowania za poprzedni rok (pierwszy dzień notowań nowego roku)
+        if len(storage_c):
+            end_pos = pos - 1
+            p_end = px["storage_fee"][end_pos]
+            storage_cost = invested[storage_c] * (storage_fee[storage_c] / 100) * (1 + vat[storage_c] / 100)
+            metals = storage_metal[storage_c]
+
+            for name in np.unique(metals):
+                mask = metals == name
+                group = storage_c[mask]
+                if name == "ALL":
+                    rows = portfolio[group]
+                    total_value = weighted_sum(p_end, rows)
+                    for i in range(len(assets)):
+                        with np.errstate(invalid="ignore", divide="ignore"):
+                            share = (p_end[i] * rows[:, i]) / total_value
+                        sell_price = p_end[i] * (1 + buyback[group, i] / 100)
+                        rows[:, i] -= np.minimum((storage_cost[mask] * share) / sell_price, rows[:, i])
+                    portfolio[group] = rows
+                    continue
+                if name == "Best of year":
+                    if pos not in best_metal:
+                        year_start = year_starts[np.searchsorted(year_starts, pos) - 1]
+                        best_metal[pos] = find_best_metal_of_year(data, index[year_start], index[end_pos])
+                    name = best_metal[pos]
+                i = assets.index(name)
+                sell_price = p_end[i] * (1 + buyback[group, i] / 100)
+                portfolio[group, i] -= np.minimum(storage_cost[mask] / sell_price, portfolio[group, i])
+
+            records.append((end_pos, storage_c, portfolio[storage_c], invested[storage_c], "storage_fee"))
+
+        if rebalance_actions:
+            actions = {c: ["recurring"] for c in purchase_c.tolist()}
+            for group, labels in rebalance_actions:
+                for c, label in zip(group.tolist(), labels):
+                    actions.setdefault(c, []).append(label)
+            acting = np.array(sorted(actions), dtype=np.intp)
+            records.append((pos, acting, portfolio[acting], invested[acting],
+                            np.array([", ".join(actions[c]) for c in acting.tolist()], dtype=object)))
+        elif len(purchase_c):
+            records.append((pos, purchase_c, portfolio[purchase_c], invested[purchase_c], "recurring"))
+
+    record_pos = np.concatenate([np.full(len(r[1]), r[0]) for r in records])
+    record_client = np.concatenate([r[1] for r in records])
+    record_grams = np.concatenate([r[2] for r in records])
+    record_invested = np.concatenate([r[3] for r in records])
+    record_action = np.concatenate([
+        np.full(len(r[1]), r[4], dtype=object) if isinstance(r[4], str) else r[4] for r in records
+    ])
+    values = weighted_sum(px["valuation"][record_pos] * (1 + buyback[record_client] / 100), record_grams)
+
+    # Kolejność zapisu jest chronologiczna - sortowanie stabilne ją zachowuje
+    order = np.argsort(record_client, kind="stable")
+    splits = np.searchsorted(record_client[order], np.arange(n_clients + 1))
+    results = []
+    for k in range(n_clients):
+        rows = order[splits[k]:splits[k + 1]]
+        results.append(pd.DataFrame({
+            "Date": index[record_pos[rows]],
+            "Invested": record_invested[rows],
+            **{m: record_grams[rows, i] for i, m in enumerate(assets)},
+            "Portfolio Value": values[rows],
+            "Akcja": record_action[rows],
+        }).set_index("Date"))
+    return results
+
+
+def _init_worker(data):
+    global _DATA
+    _DATA = data
+
+
+def _simulate_one(config):
+    return simulate(_DATA, config)
+
+
+def _simulate_each(data, configs, workers=1):
+    """Osobne symulacje engine.simulate() (klienci z TREND), opcjonalnie w puli procesów."""
+    workers = min(workers or os.cpu_count() or 1, len(configs)) or 1
+    if workers == 1:
+        return [simulate(data, config) for config in configs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data,)) as pool:
+        return list(pool.map(_simulate_one, configs))
+
+
+def book_exposure(data, results, end_dates):
+    """
+    Łączna ekspozycja księgi na metale w czasie (gramy).
+
+    Stan klienta obowiązuje od jego pierwszego zdarzenia do daty końcowej
+    symulacji (włącznie); później klient nie jest już liczony.
+
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Ceny metali
+    results : dict
+        Wyniki klientów {nazwa: DataFrame w formacie engine.simulate}
+    end_dates : dict
+        Daty końcowe klientów {nazwa: data}
+
+    Returns:
+    --------
+    pd.DataFrame
+        Gramy poszczególnych metali dla każdego dnia notowań
+    """
+    index = data.index
+    assets = asset_names(data)
+    totals = np.zeros((len(index), len(assets)))
+    first, last = len(index), 0
+
+    for name, result in results.items():
+        pos = index.get_indexer(result.index)
+        grams = result[assets].to_numpy(dtype=float)
+        # Kilka wpisów w jednym dniu - obowiązuje ostatni
+        keep = np.r_[pos[1:] != pos[:-1], True]
+        pos, grams = pos[keep], grams[keep]
+        stop = max(index.searchsorted(pd.to_datetime(end_dates[name]), side="right"), pos[-1] + 1)
+        totals[pos[0]:stop] += np.repeat(grams, np.diff(np.r_[pos, stop]), axis=0)
+        first, last = min(first, pos[0]), max(last, stop)
+
+    if first >= last:
+        return pd.DataFrame(columns=assets, dtype=float)
+    return pd.DataFrame(totals[first:last], index=index[first:last], columns=assets)
+
+
+def exposure_value(data, exposure):
+    """Wartość ekspozycji po cenach rynkowych (EUR) z kolumną "Total"."""
+    value = exposure * data.loc[exposure.index, asset_columns(exposure.columns)].to_numpy()
+    value["Total"] = value.sum(axis=1)
+    return value
+
+
+def simulate_book(data, clients, base_config=None, workers=1, dtype=np.float64, inflation=None):
+    """
+    Symuluje całą księgę klientów.
+
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Ceny metali (wspólne dla wszystkich klientów)
+    clients : pd.DataFrame or list
+        Tabela klientów (patrz client_configs)
+    base_config : dict or None
+        Parametry wspólne (np. harmonogram kosztów)
+    workers : int
+        Liczba procesów dla klientów z TREND (1 = bez puli procesów)
+    dtype : numpy dtype
+        Typ obliczeń klientów ze stałą alokacją (np.float32 - tryb oszczędzania pamięci)
+    inflation : pd.DataFrame or None
+        Inflacja (engine.load_inflation) do metryk realnych; None - metryki
+        realne (final_value_real, cagr_real) są puste (NaN)
+
+    Returns:
+    --------
+    dict
+        "results" - {nazwa: DataFrame}, "trend_data" - {nazwa: DataFrame},
+        "configs" - {nazwa: konfiguracja}, "summary" - metryki klientów,
+        "exposure" - łączne gramy metali w czasie, "exposure_value" - ich wartość (EUR)
+    """
+    configs = client_configs(clients, base_config, data)
+    names = [name for name, _ in configs]
+    fixed = [k for k, (_, c) in enumerate(configs) if not c["trend_active"]]
+    trend = [k for k, (_, c) in enumerate(configs) if c["trend_active"]]
+
+    frames = [None] * len(configs)
+    trend_frames = {}
+    for k, result in zip(fixed, simulate_fixed_book(data, [configs[k][1] for k in fixed], dtype=dtype)):
+        frames[k] = result
+    for k, (result, trend_data) in zip(trend, _simulate_each(data, [configs[k][1] for k in trend], workers)):
+        frames[k] = result
+        if trend_data is not None:
+            trend_frames[names[k]] = trend_data
+
+    results = dict(zip(names, frames))
+    configs = dict(configs)
+
+    rows = []
+    for name, result in results.items():
+        config = configs[name]
+        if inflation is not None:
+            add_real_values(result, inflation)
+        metrics = summarize(result, config["storage_fee"], config["vat"])
+        if inflation is None:
+            # Bez danych o inflacji summarize() powtarza wartości nominalne
+            metrics.update(final_value_real=np.nan, cagr_real=np.nan)
+        rows.append({"name": name, "trend_active": config["trend_active"], **metrics})
+    summary = pd.DataFrame(rows).set_index("name") if rows else pd.DataFrame()
+
+    exposure = book_exposure(data, results, {name: c["end_purchase_date"] for name, c in configs.items()})
+    return {
+        "results": results,
+        "trend_data": trend_frames,
+        "configs": configs,
+        "summary": summary,
+        "exposure": exposure,
+        "exposure_value": exposure_value(data, exposure),
+    }
+
+
+def read_clients(path):
+    """
+    Wczytuje tabelę klientów z pliku CSV, JSON lub YAML.
+
+    Pliki JSON/YAML mają format cli.read_configs (lista lub {"defaults", "runs"}).
+    """
+    if path.endswith(".csv"):
+        return pd.read_csv(path)
+    from cli import read_configs
+    return read_configs(path)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Symulacja całej księgi klientów na wspólnej historii cen.")
+    parser.add_argument("clients", help="Tabela klientów (CSV, JSON lub YAML)")
+    parser.add_argument("--base", default=None, help="Plik JSON z parametrami wspólnymi (np. koszty)")
+    parser.add_argument("--out", default="ksiega", help="Katalog wynikowy (domyślnie: ksiega)")
+    parser.add_argument("--data", default="lbma_data.csv", help="Plik z cenami metali")
+    parser.add_argument("--inflation", default="inflacja.csv", help="Plik z danymi o inflacji (metryki realne)")
+    parser.add_argument("--workers", type=int, default=1, help="Liczba procesów dla klientów z TREND")
+    parser.add_argument("--events", action="store_true", help="Zapisz historię zdarzeń każdego klienta")
+    parser.add_argument("--store", default=None, help="Dopisz metryki klientów do bazy eksperymentów SQLite")
+    parser.add_argument("--float32", action="store_true",
+                        help="Obliczenia klientów ze stałą alokacją w float32 (błąd: python precision.py)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    base = None
+    if args.base:
+        import json
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+
+    started = time.perf_counter()
+    data = load_prices(args.data)
+    try:
+        inflation = load_inflation(args.inflation)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Brak danych o inflacji ({e}) - metryki realne pozostaną puste", file=sys.stderr)
+        inflation = None
+    try:
+        book = simulate_book(data, read_clients(args.clients), base, workers=args.workers,
+                             dtype=np.float32 if args.float32 else np.float64, inflation=inflation)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    os.makedirs(args.out, exist_ok=True)
+    book["summary"].to_csv(os.path.join(args.out, "summary.csv"))
+    write_csv(book["exposure"], os.path.join(args.out, "exposure_grams.csv"))
+    write_csv(book["exposure_value"], os.path.join(args.out, "exposure_value.csv"))
+    if args.events:
+        for name, result in book["results"].items():
+            write_csv(result, os.path.join(args.out, name + ".csv"))
+    if args.store:
+        with ExperimentStore(args.store) as store:
+            store.add_many(
+                ((name, book["configs"][name], metrics) for name, metrics in book["summary"].to_dict("index").items()),
+                run=os.path.splitext(os.path.basename(args.clients))[0], source="book",
+            )
+
+    print(f"Klienci: {len(book['results'])}, czas: {time.perf_counter() - started:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Zmniejszanie długich serii do wykresów.
+
+Wykres ma kilkaset do ok. tysiąca pikseli szerokości, więc przesyłanie do
+przeglądarki ~12 000 notowań dziennych na serię nie poprawia obrazu, a
+wydłuża każde przeładowanie strony. Serie są redukowane do liczby punktów
+odpowiadającej szerokości wykresu metodami zachowującymi kształt:
+
+- LTTB (Largest-Triangle-Three-Buckets) - w każdym kubełku wybierany jest
+  punkt tworzący największy trójkąt z punktem poprzednim i średnią kubełka
+  następnego (zachowuje szczyty, dołki i przebieg linii),
+- min/max - w każdym kubełku zachowywane jest minimum i maksimum (dobre
+  dla serii o dużej zmienności, np. korelacji kroczących).
+
+Dla ramek z wieloma seriami wybierane są punkty każdej serii osobno, a wynik
+to ich suma (wspólny indeks dat). Zawężenie zakresu dat daje więcej punktów
+na dzień przy tym samym budżecie punktów.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Liczba punktów wykresu (ok. 1,5 punktu na piksel typowej szerokości wykresu)
+DEFAULT_POINTS = 1200
+
+METHODS = ("lttb", "minmax")
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Pozycje punktów wybranych algorytmem LTTB.
+
+    Parameters:
+    -----------
+    x : np.ndarray
+        Współrzędne poziome (rosnące, np. daty jako liczby)
+    y : np.ndarray
+        Wartości serii (NaN są pomijane przy wyborze punktów)
+    threshold : int
+        Docelowa liczba punktów (pierwszy i ostatni punkt są zawsze zachowane)
+
+    Returns:
+    --------
+    np.ndarray
+        Rosnące pozycje wybranych punktów
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Granice kubełków (pierwszy i ostatni punkt poza kubełkami)
+    edges = np.floor(np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    # Średnie kubełków z sum narastających (NaN pomijane)
+    valid = ~np.isnan(y)
+    cum_x = np.concatenate(([0.0], np.cumsum(np.where(valid, x, 0.0))))
+    cum_y = np.concatenate(([0.0], np.cumsum(np.where(valid, y, 0.0))))
+    cum_n = np.concatenate(([0], np.cumsum(valid)))
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start, next_stop = stop, (edges[i + 2] if i + 2 < len(edges) else n)
+        count = cum_n[next_stop] - cum_n[next_start]
+        if count:
+            avg_x = (cum_x[next_stop] - cum_x[next_start]) / count
+            avg_y = (cum_y[next_stop] - cum_y[next_start]) / count
+        else:
+            avg_x, avg_y = x[next_stop - 1], y[a]
+
+        area = np.abs((x[a] - avg_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (avg_y - y[a]))
+        area = np.where(np.isnan(area), -1.0, area)
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, buckets):
+    """
+    Pozycje minimum i maksimum w każdym z kubełków (plus pierwszy i ostatni punkt).
+
+    Parameters:
+    -----------
+    y : np.ndarray
+        Wartości serii
+    buckets : int
+        Liczba kubełków (wynik ma najwyżej 2 × buckets + 2 punkty)
+
+    Returns:
+    --------
+    np.ndarray
+        Rosnące pozycje wybranych punktów
+    """
+    n = len(y)
+    if buckets < 1 or 2 * buckets + 2 >= n:
+        return np.arange(n)
+
+    size = -(-n // buckets)
+    padded = np.full(size * buckets, np.nan)
+    padded[:n] = y
+    blocks = padded.reshape(buckets, size)
+    filled = ~np.isnan(blocks).all(axis=1)
+
+    offsets = np.arange(buckets)[filled] * size
+    lows = offsets + np.nanargmin(blocks[filled], axis=1)
+    highs = offsets + np.nanargmax(blocks[filled], axis=1)
+    return np.unique(np.concatenate(([0, n - 1], lows, highs)))
+
+
+def downsample(frame, max_points=DEFAULT_POINTS, method="lttb"):
+    """
+    Zmniejsza ramkę serii (indeks dat × serie) do ok. max_points wierszy.
+
+    Budżet punktów dzielony jest między serie, a wybrane wiersze wszystkich
+    serii są łączone, więc wynik ma najwyżej ok. max_points wierszy.
+
+    Parameters:
+    -----------
+    frame : pd.DataFrame or pd.Series
+        Serie z rosnącym indeksem dat
+    max_points : int
+        Budżet punktów wykresu
+    method : str
+        "lttb" lub "minmax"
+
+    Returns:
+    --------
+    pd.DataFrame or pd.Series
+        Wybrane wiersze (ramka bez zmian, jeśli mieści się w budżecie)
+    """
+    if method not in METHODS:
+        raise ValueError(f"Nieznana metoda: {method}")
+    if len(frame) <= max_points:
+        return frame
+
+    values = frame.to_numpy(dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    per_series = max(max_points // values.shape[1], 3)
+
+    if isinstance(frame.index, pd.DatetimeIndex):
+        x = frame.index.asi8.astype(float)
+    else:
+        x = np.arange(len(frame), dtype=float)
+
+    rows = []
+    for column in values.T:
+        if method == "lttb":
+            rows.append(lttb_indices(x, column, per_series))
+        else:
+            rows.append(minmax_indices(column, max(per_series // 2 - 1, 1)))
+    return frame.iloc[np.unique(np.concatenate(rows))]
+
+
+def chart_window(frame, start=None, end=None, max_points=DEFAULT_POINTS, method="lttb"):
+    """
+    Wycinek ramki z zakresu dat [start, end] zmniejszony do max_points punktów.
+
+    Węższy zakres daje więcej punktów na dzień (przy pełnej rozdzielczości,
+    gdy wycinek mieści się w budżecie).
+
+    Returns:
+    --------
+    pd.DataFrame or pd.Series
+    """
+    if start is not None or end is not None:
+        frame = frame.loc[start:end]
+    return downsample(frame, max_points=max_points, method=method)
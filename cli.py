@@ -0,0 +1,265 @@
+"""
+Wsadowe uruchamianie symulacji z linii poleceń (np. z crona).
+
+Przykład:
+    python cli.py klienci.yaml --out wyniki/ --workers 4
+
+Plik konfiguracyjny (JSON lub YAML) może zawierać:
+    - pojedynczy słownik parametrów (jedna symulacja),
+    - listę słowników (wiele symulacji),
+    - słownik {"defaults": {...}, "runs": [{...}, ...]}.
+
+Każda symulacja może mieć pole "name" - używane jako nazwa plików wynikowych.
+Nazwy parametrów odpowiadają kluczom engine.DEFAULT_CONFIG. Podana alokacja
+zastępuje domyślną w całości; koszty per metal są uzupełniane domyślnymi
+(engine.normalize_config).
+
+Moduł nie importuje Streamlit ani bibliotek wykresów.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from engine import (
+    add_real_values,
+    config_to_json,
+    load_inflation,
+    load_prices,
+    normalize_config,
+    simulate,
+    summarize,
+    zero_inflation,
+)
+from experiments import ExperimentStore
+from export import CSV_SUFFIXES, write_csv
+
+# Dane współdzielone przez zadania w obrębie jednego procesu roboczego
+_DATA = None
+_INFLATION = None
+
+
+def read_configs(path):
+    """
+    Wczytuje listę konfiguracji symulacji z pliku JSON lub YAML.
+
+    Parameters:
+    -----------
+    path : str
+        Ścieżka do pliku (.json, .yaml lub .yml)
+
+    Returns:
+    --------
+    list
+        Lista par (nazwa, słownik parametrów)
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise SystemExit("Pliki YAML wymagają pakietu PyYAML (pip install pyyaml).")
+            content = yaml.safe_load(f)
+        else:
+            content = json.load(f)
+
+    defaults = {}
+    if isinstance(content, dict) and "runs" in content:
+        defaults = content.get("defaults") or {}
+        runs = content["runs"]
+    elif isinstance(content, dict):
+        runs = [content]
+    else:
+        runs = content
+
+    base = os.path.splitext(os.path.basename(path))[0]
+    configs = []
+    for i, run in enumerate(runs):
+        raw = {**defaults, **run}
+        name = str(raw.pop("name", f"{base}_{i + 1:03d}"))
+        configs.append((name, raw))
+    return configs
+
+
+def _init_worker(data_path, inflation_path):
+    """Wczytuje dane cenowe i inflację raz na proces roboczy."""
+    global _DATA, _INFLATION
+    _DATA = load_prices(data_path)
+    try:
+        _INFLATION = load_inflation(inflation_path)
+    except Exception:
+        _INFLATION = zero_inflation(_DATA)
+
+
+def run_one(name, raw, out_dir, compression=None, write_events=True):
+    """
+    Uruchamia pojedynczą symulację i zapisuje jej wyniki.
+
+    Parameters:
+    -----------
+    name : str
+        Nazwa symulacji (prefiks plików wynikowych)
+    raw : dict
+        Parametry symulacji
+    out_dir : str
+        Katalog wynikowy
+    compression : str or None
+        Kompresja plików CSV
+    write_events : bool
+        Czy zapisywać pełną historię zdarzeń
+
+    Returns:
+    --------
+    dict
+        Metryki symulacji (lub opis błędu w polu "error")
+    """
+    started = time.perf_counter()
+    try:
+        config = normalize_config(raw, _DATA)
+        result, trend_data = simulate(_DATA, config)
+        add_real_values(result, _INFLATION)
+        metrics = summarize(result, config["storage_fee"], config["vat"])
+
+        suffix = CSV_SUFFIXES[compression]
+        if write_events:
+            write_csv(result, os.path.join(out_dir, name + suffix), compression=compression)
+            if trend_data is not None:
+                write_csv(trend_data, os.path.join(out_dir, name + "_trend" + suffix), compression=compression)
+        with open(os.path.join(out_dir, name + "_config.json"), "w", encoding="utf-8") as f:
+            json.dump(config_to_json(config), f, indent=2, ensure_ascii=False)
+    except Exception as e:
+        return {"name": name, "error": f"{type(e).__name__}: {e}"}
+
+    metrics["start_date"] = metrics["start_date"].strftime("%Y-%m-%d")
+    metrics["end_date"] = metrics["end_date"].strftime("%Y-%m-%d")
+    return {"name": name, **metrics, "seconds": time.perf_counter() - started, "error": None,
+            "config": config_to_json(config)}
+
+
+def run_batch(configs, out_dir, data_path="lbma_data.csv", inflation_path="inflacja.csv",
+              workers=None, compression=None, write_events=True, store=None, run=None):
+    """
+    Uruchamia wiele symulacji równolegle i zapisuje zbiorcze metryki.
+
+    Parameters:
+    -----------
+    configs : list
+        Lista par (nazwa, parametry)
+    out_dir : str
+        Katalog wynikowy
+    data_path : str
+        Plik z cenami metali
+    inflation_path : str
+        Plik z inflacją
+    workers : int or None
+        Liczba procesów (None = liczba rdzeni, 1 = bez puli procesów)
+    compression : str or None
+        Kompresja plików CSV
+    write_events : bool
+        Czy zapisywać pełną historię zdarzeń
+    store : str or None
+        Plik bazy eksperymentów (SQLite), do której trafią metryki
+    run : str or None
+        Etykieta serii w bazie eksperymentów
+
+    Returns:
+    --------
+    pd.DataFrame
+        Metryki wszystkich symulacji
+
+    Raises:
+    -------
+    ValueError
+        Gdy lista konfiguracji jest pusta
+    """
+    if not configs:
+        raise ValueError("Brak symulacji do uruchomienia - pliki konfiguracyjne nie zawierają żadnej konfiguracji.")
+
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(configs)) or 1
+
+    if workers == 1:
+        _init_worker(data_path, inflation_path)
+        rows = [run_one(name, raw, out_dir, compression, write_events) for name, raw in configs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(data_path, inflation_path)) as pool:
+            futures = [pool.submit(run_one, name, raw, out_dir, compression, write_events) for name, raw in configs]
+            rows = [f.result() for f in futures]
+
+    run_configs = [row.pop("config", None) for row in rows]
+    if store:
+        with ExperimentStore(store) as experiments:
+            experiments.add_many(
+                ((row["name"], config, row) for row, config in zip(rows, run_configs) if config is not None),
+                run=run, source="cli",
+            )
+
+    metrics = pd.DataFrame(rows).set_index("name")
+    metrics.to_csv(os.path.join(out_dir, "metrics.csv"))
+    with open(os.path.join(out_dir, "metrics.json"), "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=2, ensure_ascii=False, default=str)
+    return metrics
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Wsadowe symulacje portfela metali szlachetnych (bez interfejsu Streamlit)."
+    )
+    parser.add_argument("configs", nargs="+", help="Pliki konfiguracyjne JSON/YAML")
+    parser.add_argument("--out", default="wyniki", help="Katalog wynikowy (domyślnie: wyniki)")
+    parser.add_argument("--data", default="lbma_data.csv", help="Plik z cenami metali")
+    parser.add_argument("--inflation", default="inflacja.csv", help="Plik z danymi o inflacji")
+    parser.add_argument("--workers", type=int, default=None, help="Liczba procesów (domyślnie: liczba rdzeni)")
+    parser.add_argument("--compression", choices=["gzip", "bz2", "xz"], default=None, help="Kompresja plików CSV")
+    parser.add_argument("--metrics-only", action="store_true", help="Zapisz tylko metryki, bez historii zdarzeń")
+    parser.add_argument("--store", default=None, help="Dopisz metryki do bazy eksperymentów SQLite")
+    parser.add_argument("--run", default=None, help="Etykieta serii w bazie eksperymentów (domyślnie: nazwy plików)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    configs = []
+    for path in args.configs:
+        configs.extend(read_configs(path))
+
+    names = [name for name, _ in configs]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        print(f"Zduplikowane nazwy symulacji: {', '.join(duplicates)}", file=sys.stderr)
+        return 2
+
+    started = time.perf_counter()
+    try:
+        metrics = run_batch(
+            configs,
+            args.out,
+            data_path=args.data,
+            inflation_path=args.inflation,
+            workers=args.workers,
+            compression=args.compression,
+            write_events=not args.metrics_only,
+            store=args.store,
+            run=args.run or "+".join(os.path.splitext(os.path.basename(p))[0] for p in args.configs),
+        )
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    failed = metrics[metrics["error"].notna()]
+
+    print(f"Symulacje: {len(metrics)}, błędy: {len(failed)}, czas: {time.perf_counter() - started:.1f} s")
+    for name, error in failed["error"].items():
+        print(f"  {name}: {error}", file=sys.stderr)
+    return 1 if len(failed) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
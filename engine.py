@@ -0,0 +1,1304 @@
+"""
+Silnik symulacji portfela metali szlachetnych.
+
+Moduł nie zależy od Streamlit ani bibliotek wykresów - korzysta z niego
+zarówno aplikacja (app.py), jak i narzędzia wsadowe (cli.py).
+"""
+
+import hashlib
+import json
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from strategies import STRATEGIES
+
+# Rejestr aktywów: każda kolumna "<nazwa>_EUR" pliku z cenami to jedno aktywo
+# (asset_names). METALS to aktywa dołączonego pliku lbma_data.csv, do których
+# odnoszą się domyślne parametry (DEFAULT_CONFIG).
+PRICE_SUFFIX = "_EUR"
+
+METALS = ["Gold", "Silver", "Platinum", "Palladium"]
+
+REQUIRED_COLUMNS = [m + PRICE_SUFFIX for m in METALS]
+
+# Minimalny odstęp między ReBalancingami (dni)
+MIN_DAYS_BETWEEN_REBALANCES = 30
+
+# Nazwy częstotliwości używane w aplikacji oraz ich aliasy dla plików konfiguracyjnych
+FREQ_ALIASES = {
+    "Brak": "Brak", "none": "Brak", "Keine": "Brak",
+    "Tydzień": "Tydzień", "week": "Tydzień", "weekly": "Tydzień", "Woche": "Tydzień",
+    "Miesiąc": "Miesiąc", "month": "Miesiąc", "monthly": "Miesiąc", "Monat": "Miesiąc",
+    "Kwartał": "Kwartał", "quarter": "Kwartał", "quarterly": "Kwartał", "Quartal": "Kwartał",
+}
+
+DATE_KEYS = ["initial_date", "end_purchase_date", "rebalance_1_start", "rebalance_2_start"]
+
+# Parametry podawane osobno dla każdego aktywa
+PER_ASSET_KEYS = ["allocation", "margins", "buyback_discounts", "rebalance_markup"]
+
+# Kolumny wyniku symulacji poza gramami aktywów
+RESULT_VALUE_COLUMNS = ["Invested", "Portfolio Value", "Portfolio Value Real", "Akcja"]
+
+# Kilka notowań dziennie (np. fixingi LBMA AM i PM): plik w formacie długim
+# z kolumną FIX_COLUMN albo z godziną w dacie. Po wczytaniu dzień to jeden
+# wiersz - kolumny cen "<nazwa>_EUR" zawierają fixing domyślny, a kolumny
+# "<kolumna>@<fixing>" ceny poszczególnych fixingów.
+FIX_COLUMN = "Fix"
+FIX_SEPARATOR = "@"
+DEFAULT_FIX = "PM"
+
+# Godziny fixingów nazwanych (czas Londynu) - kolejność fixingów w ciągu dnia
+FIX_TIMES = {"AM": "10:30", "PM": "15:00"}
+
+# Typy zdarzeń, dla których można wybrać fixing (config["execution_fix"]);
+# sygnały TREND i wybór "Best of year" korzystają z fixingu domyślnego
+EXECUTION_EVENTS = ["purchase", "rebalance", "storage_fee", "valuation"]
+
+
+class SimulationCancelled(Exception):
+    """Symulacja przerwana na żądanie (ustawiony sygnał cancel)."""
+
+# Domyślne parametry symulacji (odpowiadają domyślnym ustawieniom panelu bocznego)
+DEFAULT_CONFIG = {
+    "initial_allocation": 100000.0,
+    "initial_date": None,
+    "end_purchase_date": None,
+    "allocation": {"Gold": 0.4, "Silver": 0.2, "Platinum": 0.2, "Palladium": 0.2},
+    "purchase_freq": "Tydzień",
+    "purchase_day": 0,
+    "purchase_amount": 250.0,
+    "rebalance_1": True,
+    "rebalance_1_condition": False,
+    "rebalance_1_threshold": 12.0,
+    "rebalance_1_start": None,
+    "rebalance_2": False,
+    "rebalance_2_condition": False,
+    "rebalance_2_threshold": 12.0,
+    "rebalance_2_start": None,
+    "trend_active": False,
+    "trend_period": "last_purchase",
+    "trend_strategy_type": "simple",
+    "max_allocation_change": 50,
+    "trend_priorities": [40, 30, 20, 10],
+    "storage_fee": 1.5,
+    "vat": 19.0,
+    "storage_metal": "Gold",
+    "margins": {"Gold": 15.6, "Silver": 18.36, "Platinum": 24.24, "Palladium": 22.49},
+    "buyback_discounts": {"Gold": -1.5, "Silver": -3.0, "Platinum": -3.0, "Palladium": -3.0},
+    "rebalance_markup": {"Gold": 6.5, "Silver": 6.5, "Platinum": 6.5, "Palladium": 6.5},
+}
+
+# =========================================
+# Wczytywanie danych
+# =========================================
+
+def _time_labels(offsets):
+    """Etykiety godzin notowań ("HH:MM") dla przesunięć od północy."""
+    minutes = offsets // pd.Timedelta(minutes=1)
+    return [f"{m // 60:02d}:{m % 60:02d}" for m in minutes]
+
+
+def _fix_minute(label):
+    """Minuta dnia fixingu ("AM", "PM" wg FIX_TIMES lub "HH:MM"); None - nieznana."""
+    label = FIX_TIMES.get(str(label).upper(), str(label))
+    try:
+        hours, minutes = label.split(":")
+        return int(hours) * 60 + int(minutes)
+    except ValueError:
+        return None
+
+
+def pivot_fixes(df):
+    """
+    Zamienia notowania w formacie długim (kilka wierszy na dzień) na jeden wiersz na dzień.
+
+    Fixing wiersza pochodzi z kolumny FIX_COLUMN (np. "AM"/"PM"), a gdy jej
+    brak - z godziny w dacie notowania ("10:30"). Fixingi uporządkowane są wg
+    godziny w ciągu dnia (FIX_TIMES, etykiety "HH:MM"; nieznane - na końcu,
+    w kolejności pliku), niezależnie od kolejności wierszy. Brakujący fixing
+    danego dnia (np. srebro ma jeden fixing) uzupełniany jest najbliższym wcześniejszym,
+    a gdy go brak - późniejszym fixingiem tego dnia. Przekształcenie działa
+    na kodach dni i fixingów (pd.factorize), więc czas i pamięć rosną
+    liniowo z liczbą wierszy.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Notowania indeksowane datą (z godziną) z kolumnami cen i opcjonalnie FIX_COLUMN
+
+    Returns:
+    --------
+    pd.DataFrame
+        Jeden wiersz na dzień: kolumny cen fixingu domyślnego (DEFAULT_FIX
+        lub ostatni fixing dnia) oraz kolumny "<kolumna>@<fixing>"
+
+    Raises:
+    -------
+    ValueError
+        Gdy ten sam fixing występuje w danym dniu więcej niż raz
+    """
+    days = df.index.normalize()
+    if FIX_COLUMN in df.columns:
+        fix_codes, fixes = pd.factorize(df[FIX_COLUMN].astype(str))
+        minutes = [_fix_minute(fix) for fix in fixes]
+        order = sorted(range(len(fixes)), key=lambda k: (minutes[k] is None, minutes[k] or 0, k))
+        fix_codes = np.argsort(order)[fix_codes]
+        fixes = [fixes[k] for k in order]
+        df = df.drop(columns=FIX_COLUMN)
+    else:
+        fix_codes, offsets = pd.factorize(df.index - days, sort=True)
+        fixes = _time_labels(offsets)
+    day_codes, day_index = pd.factorize(days, sort=True)
+
+    n_days, n_fixes = len(day_index), len(fixes)
+    slots = day_codes.astype(np.int64) * n_fixes + fix_codes
+    if len(slots) and np.bincount(slots, minlength=n_days * n_fixes).max() > 1:
+        raise ValueError("Zduplikowane notowania: ten sam fixing występuje kilka razy w jednym dniu.")
+
+    columns = list(df.columns)
+    values = np.full((n_days, n_fixes, len(columns)), np.nan)
+    values[day_codes, fix_codes] = df.to_numpy(dtype=float)
+
+    # Braki w ciągu dnia: najpierw wcześniejszy fixing, potem późniejszy
+    for k in range(1, n_fixes):
+        gaps = np.isnan(values[:, k])
+        values[:, k][gaps] = values[:, k - 1][gaps]
+    for k in range(n_fixes - 2, -1, -1):
+        gaps = np.isnan(values[:, k])
+        values[:, k][gaps] = values[:, k + 1][gaps]
+
+    default = fixes.index(DEFAULT_FIX) if DEFAULT_FIX in fixes else n_fixes - 1
+    frame = {col: values[:, default, j] for j, col in enumerate(columns)}
+    for k, fix in enumerate(fixes):
+        frame.update({f"{col}{FIX_SEPARATOR}{fix}": values[:, k, j] for j, col in enumerate(columns)})
+    return pd.DataFrame(frame, index=pd.DatetimeIndex(day_index, name=df.index.name))
+
+
+def asset_names(data):
+    """Aktywa w danych: nazwy z kolumn "<nazwa>_EUR" w kolejności pliku."""
+    return [col[:-len(PRICE_SUFFIX)] for col in data.columns if col.endswith(PRICE_SUFFIX)]
+
+
+def asset_columns(assets, fix=None):
+    """Kolumny cen aktywów dla fixingu (None - fixing domyślny)."""
+    columns = [a + PRICE_SUFFIX for a in assets]
+    if fix is None:
+        return columns
+    return [f"{col}{FIX_SEPARATOR}{fix}" for col in columns]
+
+
+def asset_vector(values, assets, dtype=float):
+    """Parametr per aktywo (słownik) jako wektor w kolejności assets (brak wpisu = 0)."""
+    return np.array([values.get(a, 0.0) for a in assets], dtype=dtype)
+
+
+def result_assets(result):
+    """Aktywa w wyniku symulacji (kolumny gramów)."""
+    return [col for col in result.columns if col not in RESULT_VALUE_COLUMNS]
+
+
+def price_fixes(data):
+    """Fixingi dostępne w danych (kolejność w ciągu dnia); pusta lista - jedno notowanie dziennie."""
+    prefix = asset_columns(asset_names(data)[:1])[0] + FIX_SEPARATOR
+    return [col[len(prefix):] for col in data.columns if col.startswith(prefix)]
+
+
+def execution_prices(data, config, dtype=float):
+    """
+    Macierze cen (dni × metale) dla typów zdarzeń wg config["execution_fix"].
+
+    Returns:
+    --------
+    dict
+        Typ zdarzenia (EXECUTION_EVENTS) -> macierz cen; zdarzenia z tym samym
+        fixingiem dzielą jedną macierz
+    """
+    execution = config.get("execution_fix") or {}
+    assets = asset_names(data)
+    matrices = {}
+    out = {}
+    for event in EXECUTION_EVENTS:
+        fix = execution.get(event)
+        if fix not in matrices:
+            matrices[fix] = data[asset_columns(assets, fix)].to_numpy(dtype=dtype)
+        out[event] = matrices[fix]
+    return out
+
+
+def load_prices(path="lbma_data.csv"):
+    """
+    Wczytuje dane o cenach metali szlachetnych z pliku CSV lub Parquet.
+
+    Plik może zawierać kilka notowań dziennie (kolumna FIX_COLUMN lub data
+    z godziną) - są one wtedy łączone w jeden wiersz na dzień (pivot_fixes).
+    Plik Parquet (kolumnowy, wymaga pyarrow) wczytuje się znacznie szybciej
+    od CSV przy dużej liczbie wierszy.
+
+    Parameters:
+    -----------
+    path : str
+        Ścieżka do pliku z cenami
+
+    Returns:
+    --------
+    pd.DataFrame
+        Ceny aktywów (kolumny "<nazwa>_EUR") indeksowane datą
+
+    Raises:
+    -------
+    ValueError
+        Gdy w danych nie ma żadnej kolumny cen
+    """
+    if str(path).endswith(".parquet"):
+        df = pd.read_parquet(path)
+        if not isinstance(df.index, pd.DatetimeIndex):
+            df = df.set_index(df.columns[0])
+        df.index = pd.to_datetime(df.index)
+    else:
+        df = pd.read_csv(path, parse_dates=True, index_col=0)
+    if FIX_COLUMN in df.columns or df.index.has_duplicates or (df.index != df.index.normalize()).any():
+        df = pivot_fixes(df)
+    df = df.sort_index()
+    df = df.dropna()
+
+    # Sprawdź integralność danych
+    if not asset_names(df):
+        raise ValueError(f"Brak kolumn cen w danych (oczekiwane kolumny <nazwa>{PRICE_SUFFIX}).")
+
+    return df
+
+
+def load_inflation(path="inflacja.csv"):
+    """
+    Wczytuje dane o inflacji z pliku CSV (format GUS, separator ';').
+
+    Parameters:
+    -----------
+    path : str
+        Ścieżka do pliku z inflacją
+
+    Returns:
+    --------
+    pd.DataFrame
+        Kolumny "Rok" i "Inflacja (%)"
+    """
+    df = pd.read_csv(path, sep=";", encoding="cp1250")
+    df = df[["Rok", "Wartość"]].copy()
+    df["Wartość"] = df["Wartość"].str.replace(",", ".").astype(float)
+    df["Inflacja (%)"] = df["Wartość"] - 100
+    return df[["Rok", "Inflacja (%)"]]
+
+
+def zero_inflation(data):
+    """Tworzy tabelę zerowej inflacji dla lat obecnych w danych cenowych."""
+    years = range(data.index.min().year, data.index.max().year + 1)
+    return pd.DataFrame({"Rok": years, "Inflacja (%)": [0.0] * len(years)})
+
+# =========================================
+# Konfiguracja
+# =========================================
+
+def _to_timestamp(value):
+    if value is None or isinstance(value, pd.Timestamp):
+        return value
+    return pd.Timestamp(value)
+
+
+def normalize_config(raw, data=None):
+    """
+    Uzupełnia konfigurację wartościami domyślnymi i ujednolica typy.
+
+    Podana alokacja zastępuje domyślną w całości (aktywa niewymienione mają
+    udział 0), więc sama musi sumować się do 100%. Koszty per aktywo (marże,
+    odkup, narzut ReBalancingu) są łączone z domyślnymi - wystarczy podać
+    te, które się zmieniają.
+
+    Parameters:
+    -----------
+    raw : dict
+        Parametry podane przez użytkownika (np. z pliku JSON/YAML)
+    data : pd.DataFrame or None
+        Ceny metali - potrzebne do wyznaczenia domyślnych dat
+
+    Returns:
+    --------
+    dict
+        Kompletna konfiguracja gotowa dla simulate()
+
+    Raises:
+    -------
+    ValueError
+        Gdy parametry są niespójne (np. alokacja nie sumuje się do 100%)
+    """
+    config = dict(DEFAULT_CONFIG)
+    for key in PER_ASSET_KEYS:
+        config[key] = dict(DEFAULT_CONFIG[key])
+        if key == "allocation" and raw.get(key):
+            config[key] = {}
+        config[key].update(raw.get(key) or {})
+    config.update({k: v for k, v in raw.items() if k not in PER_ASSET_KEYS})
+
+    for key in DATE_KEYS:
+        config[key] = _to_timestamp(config[key])
+
+    if data is not None:
+        if config["end_purchase_date"] is None:
+            config["end_purchase_date"] = data.index.max()
+        if config["initial_date"] is None:
+            config["initial_date"] = config["end_purchase_date"] - pd.DateOffset(years=20)
+    if config["initial_date"] is not None:
+        # Domyślne daty ReBalancingu: 1 kwietnia i 1 października roku po pierwszym zakupie
+        base_year = config["initial_date"].year + 1
+        if config["rebalance_1_start"] is None:
+            config["rebalance_1_start"] = pd.Timestamp(base_year, 4, 1)
+        if config["rebalance_2_start"] is None:
+            config["rebalance_2_start"] = pd.Timestamp(base_year, 10, 1)
+
+    if data is not None:
+        _fit_assets(config, raw, asset_names(data))
+
+    if config["purchase_freq"] not in FREQ_ALIASES:
+        raise ValueError(f"Nieznana częstotliwość zakupów: {config['purchase_freq']}")
+    config["purchase_freq"] = FREQ_ALIASES[config["purchase_freq"]]
+    if config["purchase_freq"] == "Brak":
+        config["purchase_day"] = None
+
+    # Alokacja może być podana w procentach (40/20/20/20) lub ułamkach (0.4/0.2/...)
+    alloc_total = sum(config["allocation"].values())
+    if abs(alloc_total - 100) < 1e-6:
+        config["allocation"] = {m: v / 100 for m, v in config["allocation"].items()}
+    elif abs(alloc_total - 1) > 1e-6:
+        raise ValueError(f"Suma alokacji: {alloc_total} – musi wynosić 100% (lub 1.0).")
+
+    if sum(config["trend_priorities"]) != 100:
+        raise ValueError(f"Suma przydziału TREND wynosi {sum(config['trend_priorities'])}%. Musi być dokładnie 100%.")
+
+    if config["trend_period"] != "last_purchase":
+        config["trend_period"] = int(config["trend_period"])
+
+    # Fixingi wykonania - klucz tylko gdy wybrano inny niż domyślny (odcisk
+    # konfiguracji z jednym notowaniem dziennie pozostaje bez zmian)
+    execution = {event: fix for event, fix in (config.pop("execution_fix", None) or {}).items() if fix}
+    unknown_events = [event for event in execution if event not in EXECUTION_EVENTS]
+    if unknown_events:
+        raise ValueError(f"Nieznane typy zdarzeń w execution_fix: {', '.join(unknown_events)}")
+    if data is not None:
+        available = price_fixes(data)
+        missing_fixes = sorted({fix for fix in execution.values() if fix not in available})
+        if missing_fixes:
+            raise ValueError(f"Brak fixingów w danych: {', '.join(missing_fixes)} (dostępne: {', '.join(available) or 'brak'})")
+    if execution:
+        config["execution_fix"] = execution
+
+    return config
+
+
+def _fit_assets(config, raw, assets):
+    """
+    Dopasowuje parametry per aktywo do aktywów w danych (normalize_config).
+
+    Aktywa bez podanych parametrów otrzymują alokację i koszty 0; parametry
+    aktywów spoza danych są pomijane. Wartości domyślne, które nie pasują do
+    danych, są dostosowywane: alokacja - po równo, priorytety TREND - ostatnie
+    miejsca łączone, metal na koszty - "ALL". Niepasujące wartości podane
+    jawnie są błędem.
+    """
+    requested = raw.get("allocation") or {}
+    outside = [a for a, share in requested.items() if share and a not in assets]
+    if outside:
+        raise ValueError(f"Alokacja dla aktywów spoza danych: {', '.join(outside)}")
+    if any(share and a not in assets for a, share in DEFAULT_CONFIG["allocation"].items()):
+        # Domyślna alokacja nie pasuje do danych - tylko podane udziały albo po równo
+        config["allocation"] = dict(requested) if requested else dict.fromkeys(assets, 1 / len(assets))
+    for key in PER_ASSET_KEYS:
+        config[key] = {a: config[key].get(a, 0.0) for a in assets}
+
+    priorities = list(config["trend_priorities"])
+    if len(priorities) > len(assets):
+        if "trend_priorities" in raw:
+            raise ValueError(f"Priorytetów TREND ({len(priorities)}) jest więcej niż aktywów w danych ({len(assets)}).")
+        config["trend_priorities"] = priorities[:len(assets) - 1] + [sum(priorities[len(assets) - 1:])]
+
+    if config["storage_metal"] not in ("ALL", "Best of year") and config["storage_metal"] not in assets:
+        if "storage_metal" in raw:
+            raise ValueError(f"Aktywo do pokrycia kosztów ({config['storage_metal']}) nie występuje w danych.")
+        config["storage_metal"] = "ALL"
+
+
+def config_to_json(config):
+    """Zamienia konfigurację na słownik zapisywalny w JSON (daty jako ISO)."""
+    out = {}
+    for key, value in config.items():
+        if isinstance(value, (pd.Timestamp, datetime, date)):
+            value = value.strftime("%Y-%m-%d")
+        out[key] = value
+    return out
+
+
+def config_fingerprint(config):
+    """Stabilny skrót konfiguracji - klucz buforowanych wyników."""
+    payload = json.dumps(config_to_json(config), sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+# =========================================
+# Funkcje pomocnicze silnika
+# =========================================
+
+def weighted_sum(prices, grams):
+    """
+    Suma iloczynów po aktywach (ostatnia oś), liczona kolejno od pierwszego aktywa.
+
+    Stała kolejność dodawania daje te same wyniki we wszystkich silnikach
+    (simulate, batch, book) niezależnie od kształtu tablic.
+    """
+    total = 0
+    for i in range(np.shape(grams)[-1]):
+        total = total + prices[..., i] * grams[..., i]
+    return total
+
+
+def rebalance_rows(p, portfolio, alloc, buyback, markup, condition_enabled, threshold_percent, too_soon):
+    """
+    ReBalancing wielu portfeli naraz.
+
+    Aktywa powyżej alokacji docelowej sprzedawane są po cenie odkupu,
+    a uzyskana gotówka kupuje kolejno (w kolejności aktywów) aktywa poniżej
+    alokacji po cenie z narzutem ReBalancingu.
+
+    Parameters:
+    -----------
+    p : np.ndarray
+        Ceny aktywów w dniu ReBalancingu
+    portfolio : np.ndarray
+        Gramy (portfele × aktywa) - modyfikowane w miejscu
+    alloc : np.ndarray
+        Alokacja docelowa (aktywa) lub (portfele × aktywa)
+    buyback, markup : np.ndarray
+        Ceny odkupu i narzuty (portfele × aktywa)
+    condition_enabled : bool or np.ndarray
+        Czy ReBalancing wymaga odchylenia od alokacji
+    threshold_percent : float or np.ndarray
+        Próg odchylenia (%)
+    too_soon : np.ndarray
+        Maska portfeli, dla których od poprzedniego ReBalancingu minęło za mało dni
+
+    Returns:
+    --------
+    tuple
+        Maski (wykonany, brak wartości, brak odchylenia)
+    """
+    n_assets = portfolio.shape[1]
+    total_value = weighted_sum(p, portfolio)
+    no_value = total_value == 0
+    safe_total = np.where(no_value, 1.0, total_value)
+    shares = (p * portfolio) / safe_total[:, None]
+    threshold = np.asarray(threshold_percent, dtype=float)[..., None]
+    trigger = (np.abs(shares - alloc) * 100 >= threshold).any(axis=1)
+    no_deviation = condition_enabled & ~trigger
+
+    act = ~too_soon & ~no_value & ~no_deviation
+    target = safe_total[:, None] * alloc
+
+    for i in range(n_assets):
+        diff = p[i] * portfolio[:, i] - target[:, i]
+        selling = act & (diff > 0)
+        if not selling.any():
+            continue
+        sell_price = p[i] * (1 + buyback[:, i] / 100)
+        grams = np.where(selling, np.minimum(diff / sell_price, portfolio[:, i]), 0.0)
+        portfolio[:, i] -= grams
+        cash = grams * sell_price
+        buying = selling.copy()
+        for j in range(n_assets):
+            if not buying.any():
+                # Gotówka ze sprzedaży wydana we wszystkich portfelach
+                break
+            needed = target[:, j] - p[j] * portfolio[:, j]
+            step = buying & (needed > 0)
+            buy_price = p[j] * (1 + markup[:, j] / 100)
+            buy_grams = np.minimum(cash / buy_price, needed / buy_price)
+            portfolio[:, j] = np.where(step, portfolio[:, j] + buy_grams, portfolio[:, j])
+            cash = np.where(step, cash - buy_grams * buy_price, cash)
+            buying &= ~(step & (cash <= 0))
+
+    return act, no_value, no_deviation
+
+
+def rebalance_labels(label, too_soon, no_value, no_deviation):
+    """Opisy akcji ReBalancingu dla kolejnych portfeli."""
+    return np.select(
+        [too_soon, no_value, no_deviation],
+        [f"rebalancing_skipped_{label}_too_soon", f"rebalancing_skipped_{label}_no_value",
+         f"rebalancing_skipped_{label}_no_deviation"],
+        default=label,
+    ).astype(object)
+
+
+def purchase_positions(index, start_date, freq, day, end_date):
+    """
+    Pozycje dni zakupów w indeksie notowań (wektorowo, jednym wywołaniem get_indexer).
+
+    Kalendarz odpowiada generate_purchase_dates(): daty zakupów wyznaczane są
+    od start_date co tydzień/miesiąc/kwartał, a każda z nich przypisywana
+    jest do najbliższego dnia notowań (pozycje mogą się powtarzać).
+
+    Parameters:
+    -----------
+    index : pd.DatetimeIndex
+        Daty notowań (rosnące)
+    start_date, end_date : datetime
+        Zakres dat zakupów
+    freq : str
+        Częstotliwość zakupów ("Tydzień", "Miesiąc", "Kwartał" lub "Brak")
+    day : int
+        Dzień tygodnia/miesiąca/kwartału na zakup
+
+    Returns:
+    --------
+    np.ndarray
+        Pozycje dni zakupów
+    """
+    start = pd.to_datetime(start_date)
+    end = pd.to_datetime(end_date)
+
+    if freq == "Tydzień":
+        first = start + pd.Timedelta(days=(int(day) - start.weekday()) % 7)
+        dates = pd.date_range(first, end, freq="7D")
+    elif freq in ("Miesiąc", "Kwartał"):
+        first = start.replace(day=min(int(day), 28))
+        dates = pd.date_range(first, end, freq=pd.DateOffset(months=1 if freq == "Miesiąc" else 3))
+    else:
+        # Brak zakupów jeśli "Brak"
+        return np.array([], dtype=np.intp)
+
+    if len(dates) == 0:
+        return np.array([], dtype=np.intp)
+    return index.get_indexer(dates, method="nearest")
+
+
+def generate_purchase_dates(data, start_date, freq, day, end_date):
+    """
+    Generuje daty zakupów w oparciu o wybraną częstotliwość.
+
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Ceny metali (indeks dat notowań)
+    start_date : datetime
+        Data początkowa
+    freq : str
+        Częstotliwość zakupów ("Tydzień", "Miesiąc", "Kwartał" lub "Brak")
+    day : int
+        Dzień tygodnia/miesiąca/kwartału na zakup
+    end_date : datetime
+        Data końcowa
+
+    Returns:
+    --------
+    list
+        Lista dat zakupów
+    """
+    return list(data.index[purchase_positions(data.index, start_date, freq, day, end_date)])
+
+
+def find_best_metal_of_year(data, start_date, end_date):
+    """
+    Znajduje metal o najlepszych wynikach w danym okresie.
+
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Ceny metali
+    start_date : datetime
+        Data początkowa
+    end_date : datetime
+        Data końcowa
+
+    Returns:
+    --------
+    str
+        Nazwa metalu o najlepszych wynikach
+    """
+    assets = asset_names(data)
+    columns = asset_columns(assets)
+    growth = data.loc[end_date, columns].to_numpy(dtype=float) / data.loc[start_date, columns].to_numpy(dtype=float) - 1
+    return assets[int(np.argmax(growth))]
+
+
+def lookback_windows(index, positions, previous, trend_period):
+    """
+    Okresy analizy TREND dla dni zakupów.
+
+    Parameters:
+    -----------
+    index : pd.DatetimeIndex
+        Daty notowań
+    positions : array-like
+        Pozycje dni zakupów
+    previous : array-like
+        Pozycje poprzednich zakupów (dla pierwszego - zakupu początkowego)
+    trend_period : str or int
+        Okres analizy ('last_purchase' lub liczba dni)
+
+    Returns:
+    --------
+    tuple
+        (pozycje początków okresów, długości okresów w dniach)
+    """
+    positions = np.asarray(positions, dtype=np.intp)
+    previous = np.asarray(previous, dtype=np.intp)
+
+    if trend_period == "last_purchase":
+        day_numbers = index.to_numpy(dtype="datetime64[D]").astype(np.int64)
+        period_days = day_numbers[positions] - day_numbers[previous]
+        # Zabezpieczenie przed zbyt krótkim okresem (momentum)
+        return previous, np.where(period_days < 7, 30, period_days)
+
+    days = int(trend_period)
+    starts = index.get_indexer(index[positions] - pd.Timedelta(days=days), method="nearest")
+    return starts, np.full(len(positions), days)
+
+
+def rank_allocations(scores, trend_priorities):
+    """
+    Ranking metali i alokacja wg priorytetów miejsc.
+
+    Parameters:
+    -----------
+    scores : np.ndarray
+        Oceny strategii (dni × metale)
+    trend_priorities : list
+        Priorytety alokacji dla kolejnych miejsc (%); miejsca bez priorytetu dostają 0
+
+    Returns:
+    --------
+    tuple
+        (indeksy metali od najlepszego (dni × metale), alokacja (dni × metale))
+    """
+    # Sortowanie stabilne - przy równych ocenach zachowana jest kolejność aktywów
+    order = np.argsort(-scores, axis=1, kind="stable")
+    priorities = np.zeros(scores.shape[1])
+    priorities[:len(trend_priorities)] = np.asarray(trend_priorities, dtype=float)[:scores.shape[1]]
+    weights = np.empty_like(scores, dtype=float)
+    np.put_along_axis(weights, order, priorities / 100, axis=1)
+    return order, weights
+
+
+def limit_allocations(weights, order, max_change_percent):
+    """
+    Ogranicza zmiany kolejnych alokacji (jak apply_allocation_limit, zakup po zakupie).
+
+    Parameters:
+    -----------
+    weights : np.ndarray
+        Alokacje kolejnych zakupów (zakupy × metale)
+    order : np.ndarray
+        Ranking metali dla każdego zakupu (rank_allocations)
+    max_change_percent : float
+        Maksymalna zmiana w procentach
+
+    Returns:
+    --------
+    np.ndarray
+        Ograniczone alokacje
+    """
+    if max_change_percent >= 100 or len(weights) < 2:
+        return weights
+
+    max_change = max_change_percent / 100
+    out = weights.copy()
+    for k in range(1, len(out)):
+        prev, curr = out[k - 1], weights[k]
+        limited = np.where(curr > prev, np.minimum(curr, prev + max_change), np.maximum(curr, prev - max_change))
+        # Suma w kolejności rankingu (jak kolejność słownika w apply_allocation_limit)
+        total = 0
+        for i in order[k]:
+            total = total + limited[i]
+        out[k] = limited / total
+    return out
+
+
+def trend_allocations(data, config, positions, initial_pos):
+    """
+    Alokacje TREND dla wszystkich dni zakupów naraz.
+
+    Strategia (strategies.STRATEGIES[config["trend_strategy_type"]]) wylicza
+    macierz ocen jednym wywołaniem; ranking, priorytety i limit zmian
+    liczone są na tablicach.
+
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Ceny metali
+    config : dict
+        Parametry symulacji
+    positions : array-like
+        Pozycje kolejnych dni zakupów (rosnąco)
+    initial_pos : int
+        Pozycja zakupu początkowego
+
+    Returns:
+    --------
+    dict
+        "scores", "order", "weights" (dni zakupów × aktywa) i "assets" (nazwy aktywów)
+    """
+    positions = np.asarray(positions, dtype=np.intp)
+    previous = np.r_[initial_pos, positions[:-1]].astype(np.intp)
+    starts, period_days = lookback_windows(data.index, positions, previous, config["trend_period"])
+
+    score_fn = STRATEGIES.get(config["trend_strategy_type"], STRATEGIES["simple"])
+    assets = asset_names(data)
+    prices = data[asset_columns(assets)].to_numpy(dtype=float)
+    scores = np.asarray(score_fn(prices, positions, starts, period_days), dtype=float).reshape(len(positions), len(assets))
+
+    order, weights = rank_allocations(scores, config["trend_priorities"])
+    weights = limit_allocations(weights, order, config["max_allocation_change"])
+    return {"scores": scores, "order": order, "weights": weights, "assets": assets}
+
+
+def calculate_trend_allocation(data, current_date, last_purchase_date, trend_period, trend_strategy_type, trend_priorities):
+    """
+    Oblicza alokację TREND dla jednego dnia (bez limitu zmian).
+
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Ceny metali
+    current_date : datetime
+        Aktualna data
+    last_purchase_date : datetime
+        Data ostatniego zakupu
+    trend_period : str or int
+        Okres analizy ('last_purchase' lub liczba dni)
+    trend_strategy_type : str
+        Nazwa strategii (klucz strategies.STRATEGIES)
+    trend_priorities : list
+        Lista wartości priorytetów dla miejsc 1-4
+
+    Returns:
+    --------
+    tuple
+        (słownik alokacji, lista (metal, ocena) od najlepszego)
+    """
+    plan = trend_allocations(
+        data,
+        {"trend_period": trend_period, "trend_strategy_type": trend_strategy_type,
+         "trend_priorities": trend_priorities, "max_allocation_change": 100},
+        [data.index.get_loc(current_date)],
+        data.index.get_loc(last_purchase_date),
+    )
+    order = plan["order"][0]
+    assets = plan["assets"]
+    trend_alloc = {assets[i]: float(plan["weights"][0, i]) for i in order}
+    sorted_metals = [(assets[i], plan["scores"][0, i]) for i in order]
+    return trend_alloc, sorted_metals
+
+
+def trend_log(index, positions, plan, strategy):
+    """
+    Dziennik decyzji TREND w postaci płaskich kolumn.
+
+    Parameters:
+    -----------
+    index : pd.DatetimeIndex
+        Daty notowań
+    positions : np.ndarray
+        Pozycje dni zakupów TREND
+    plan : dict
+        Wynik trend_allocations()
+    strategy : str
+        Nazwa strategii
+
+    Returns:
+    --------
+    pd.DataFrame
+        "Position", "Date", "Strategy" (kategoria) oraz dla każdego metalu
+        "<metal> rank" (1 = najlepszy), "<metal> %" (alokacja) i "<metal> score"
+    """
+    order = plan["order"]
+    assets = plan["assets"]
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, len(assets) + 1), axis=1)
+    categories = list(dict.fromkeys([*STRATEGIES, strategy]))
+
+    return pd.DataFrame({
+        "Position": np.asarray(positions, dtype=np.int32),
+        "Date": index[positions],
+        "Strategy": pd.Categorical.from_codes(
+            np.full(len(positions), categories.index(strategy), dtype=np.int8), categories
+        ),
+        **{f"{m} rank": ranks[:, i].astype(np.int16 if len(assets) > 127 else np.int8) for i, m in enumerate(assets)},
+        **{f"{m} %": plan["weights"][:, i] * 100 for i, m in enumerate(assets)},
+        **{f"{m} score": plan["scores"][:, i] for i, m in enumerate(assets)},
+    })
+
+
+def trend_assets(trend_data):
+    """Aktywa w dzienniku decyzji TREND (kolumny "<aktywo> rank")."""
+    return [col[:-len(" rank")] for col in trend_data.columns if col.endswith(" rank")]
+
+
+def trend_extremes(trend_data):
+    """
+    Najlepszy i najgorszy metal każdej decyzji TREND.
+
+    Returns:
+    --------
+    tuple
+        (pd.Series najlepszych metali, pd.Series najgorszych metali)
+    """
+    assets = trend_assets(trend_data)
+    ranks = trend_data[[f"{m} rank" for m in assets]].to_numpy()
+    names = np.array(assets, dtype=object)
+    return (
+        pd.Series(names[ranks.argmin(axis=1)], index=trend_data.index, name="Best Metal"),
+        pd.Series(names[ranks.argmax(axis=1)], index=trend_data.index, name="Worst Metal"),
+    )
+
+
+def trend_rank_counts(trend_data):
+    """
+    Liczba decyzji TREND, w których metal był najlepszy / najgorszy.
+
+    Returns:
+    --------
+    pd.DataFrame
+        Indeks aktywów, kolumny "best" i "worst"
+    """
+    assets = trend_assets(trend_data)
+    ranks = trend_data[[f"{m} rank" for m in assets]].to_numpy()
+    return pd.DataFrame({
+        "best": (ranks == 1).sum(axis=0),
+        "worst": (ranks == len(assets)).sum(axis=0),
+    }, index=assets)
+
+
+def apply_allocation_limit(new_alloc, prev_alloc, max_change_percent):
+    """
+    Ogranicza maksymalne zmiany alokacji między zakupami.
+
+    Parameters:
+    -----------
+    new_alloc : dict
+        Nowa alokacja
+    prev_alloc : dict
+        Poprzednia alokacja
+    max_change_percent : float
+        Maksymalna zmiana w procentach
+
+    Returns:
+    --------
+    dict
+        Ograniczona alokacja
+    """
+    if prev_alloc is None:
+        return new_alloc
+
+    max_change = max_change_percent / 100
+    final_alloc = {}
+
+    for metal in new_alloc:
+        prev = prev_alloc.get(metal, 0)
+        curr = new_alloc[metal]
+
+        # Ogranicz zmianę do zadanego procentu
+        if curr > prev:
+            final_alloc[metal] = min(curr, prev + max_change)
+        else:
+            final_alloc[metal] = max(curr, prev - max_change)
+
+    # Normalizuj alokację, aby suma była 1.0
+    total = sum(final_alloc.values())
+    normalized_alloc = {m: v/total for m, v in final_alloc.items()}
+
+    return normalized_alloc
+
+# =========================================
+# Symulacja
+# =========================================
+
+def is_plain_dca(config, use_trend=None, fixed_allocation=False):
+    """Czy konfiguracja to zwykłe DCA: stała alokacja, bez TREND i bez ReBalancingu."""
+    if use_trend is None:
+        use_trend = config["trend_active"]
+    return (fixed_allocation or not use_trend) and not config["rebalance_1"] and not config["rebalance_2"]
+
+
+def simulate_plain_dca(data, config):
+    """
+    Symulacja zwykłego DCA bez pętli po dniach.
+
+    Gramy to skumulowane sumy zakupów (kwota × udział / cena z marżą),
+    pomniejszane raz w roku o koszty magazynowania. Sumy liczone są
+    kolejno (np.cumsum) w odcinkach między kosztami rocznymi, więc wynik
+    jest identyczny z pętlą w simulate().
+
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Ceny metali
+    config : dict
+        Parametry symulacji (is_plain_dca(config) == True)
+
+    Returns:
+    --------
+    pd.DataFrame
+        Wynik w formacie simulate()
+    """
+    index = data.index
+    px = execution_prices(data, config)
+    prices = px["purchase"]
+    initial_date = pd.to_datetime(config["initial_date"])
+    end_purchase_date = pd.to_datetime(config["end_purchase_date"])
+    assets = asset_names(data)
+    alloc = asset_vector(config["allocation"], assets)
+    margins = asset_vector(config["margins"], assets)
+    buyback = asset_vector(config["buyback_discounts"], assets)
+    storage_fee = config["storage_fee"]
+    vat = config["vat"]
+    storage_metal = config["storage_metal"]
+
+    lo = index.searchsorted(initial_date, side="left")
+    hi = index.searchsorted(end_purchase_date, side="right")
+    initial_pos = index.get_indexer([initial_date], method="nearest")[0]
+
+    purchases = np.unique(purchase_positions(index, initial_date, config["purchase_freq"], config["purchase_day"], end_purchase_date))
+    purchases = purchases[(purchases >= lo) & (purchases < hi)]
+    years = index.year.to_numpy()
+    year_starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+    storage_days = year_starts[(year_starts > lo) & (year_starts < hi)]
+
+    initial_grams = (config["initial_allocation"] * alloc) / (prices[initial_pos] * (1 + margins / 100))
+    purchase_grams = (config["purchase_amount"] * alloc) / (prices[purchases] * (1 + margins / 100))
+    invested = np.cumsum(np.r_[config["initial_allocation"], np.full(len(purchases), float(config["purchase_amount"]))])
+
+    purchase_state = np.empty((len(purchases), len(assets)))
+    storage_state = np.empty((len(storage_days), len(assets)))
+    storage_invested = invested[np.searchsorted(purchases, storage_days, side="right")]
+
+    # Odcinki między kosztami rocznymi: zakupy do dnia kosztu włącznie, potem potrącenie
+    grams = initial_grams
+    done = 0
+    for j, day in enumerate(storage_days):
+        stop = np.searchsorted(purchases, day, side="right")
+        if stop > done:
+            segment = np.cumsum(np.vstack([grams, purchase_grams[done:stop]]), axis=0)[1:]
+            purchase_state[done:stop] = segment
+            grams = segment[-1]
+            done = stop
+
+        grams = grams.copy()
+        end_pos = day - 1
+        p_end = px["storage_fee"][end_pos]
+        storage_cost = storage_invested[j] * (storage_fee / 100) * (1 + vat / 100)
+        if storage_metal == "ALL":
+            share = (p_end * grams) / weighted_sum(p_end, grams)
+            sell_price = p_end * (1 + buyback / 100)
+            grams -= np.minimum((storage_cost * share) / sell_price, grams)
+        else:
+            metal = storage_metal
+            if metal == "Best of year":
+                metal = find_best_metal_of_year(data, index[year_starts[np.searchsorted(year_starts, day) - 1]], index[end_pos])
+            i = assets.index(metal)
+            sell_price = p_end[i] * (1 + buyback[i] / 100)
+            grams[i] -= min(storage_cost / sell_price, grams[i])
+        storage_state[j] = grams
+
+        # Zakup z dnia kosztu zapisywany jest po potrąceniu (jak w simulate)
+        if done and purchases[done - 1] == day:
+            purchase_state[done - 1] = grams
+
+    if done < len(purchases):
+        purchase_state[done:] = np.cumsum(np.vstack([grams, purchase_grams[done:]]), axis=0)[1:]
+
+    # Kolejność wpisów: dzień przetwarzania, w obrębie dnia koszt roczny przed zakupem
+    record_day = np.r_[-1, storage_days, purchases]
+    record_sub = np.r_[0, np.zeros(len(storage_days)), np.ones(len(purchases))]
+    order = np.lexsort((record_sub, record_day))
+    record_pos = np.r_[initial_pos, storage_days - 1, purchases][order]
+    record_grams = np.vstack([initial_grams[None], storage_state, purchase_state])[order]
+    record_invested = np.r_[invested[0], storage_invested, invested[1:]][order]
+    record_action = np.array(
+        ["initial"] + ["storage_fee"] * len(storage_days) + ["recurring"] * len(purchases), dtype=object
+    )[order]
+
+    values = weighted_sum(px["valuation"][record_pos] * (1 + buyback / 100), record_grams)
+
+    return pd.DataFrame({
+        "Date": index[record_pos],
+        "Invested": record_invested,
+        **{m: record_grams[:, i] for i, m in enumerate(assets)},
+        "Portfolio Value": values,
+        "Akcja": record_action,
+    }).set_index("Date")
+
+
+def simulate(data, config, use_trend=None, fixed_allocation=False, cancel=None):
+    """
+    Symuluje portfel metali szlachetnych w czasie.
+
+    Stan portfela to wektor gramów (aktywa z asset_names(data)), a ceny
+    zdarzeń pochodzą z macierzy (dni × aktywa) - koszt kroku rośnie
+    z liczbą aktywów bez pętli po słownikach.
+
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Ceny metali
+    config : dict
+        Parametry symulacji (patrz DEFAULT_CONFIG / normalize_config)
+    use_trend : bool or None
+        Czy użyć strategii TREND (None = wartość config["trend_active"])
+    fixed_allocation : bool
+        Czy używać stałej alokacji nawet gdy TREND jest aktywny
+    cancel : threading.Event or None
+        Sygnał przerwania sprawdzany w każdym dniu symulacji
+
+    Returns:
+    --------
+    tuple
+        (DataFrame z wynikami symulacji, dziennik decyzji TREND (trend_log) lub None)
+
+    Raises:
+    -------
+    SimulationCancelled
+        Gdy sygnał cancel zostanie ustawiony w trakcie symulacji
+    """
+    if use_trend is None:
+        use_trend = config["trend_active"]
+
+    # Zwykłe DCA - wynik z sum skumulowanych, bez pętli po dniach
+    if is_plain_dca(config, use_trend, fixed_allocation):
+        return simulate_plain_dca(data, config), None
+
+    initial_date = pd.to_datetime(config["initial_date"])
+    end_purchase_date = pd.to_datetime(config["end_purchase_date"])
+    purchase_amount = config["purchase_amount"]
+    storage_fee = config["storage_fee"]
+    vat = config["vat"]
+    storage_metal = config["storage_metal"]
+
+    # Ceny zdarzeń wg wybranych fixingów i parametry jako wektory aktywów
+    index = data.index
+    assets = asset_names(data)
+    px = execution_prices(data, config)
+    alloc = asset_vector(config["allocation"], assets)
+    margins = asset_vector(config["margins"], assets)
+    buyback = asset_vector(config["buyback_discounts"], assets)
+    markup = asset_vector(config["rebalance_markup"], assets)
+    years = index.year.to_numpy()
+
+    lo = index.searchsorted(initial_date, side="left")
+    hi = index.searchsorted(end_purchase_date, side="right")
+    all_dates = index[lo:hi]
+    purchase_rows = purchase_positions(index, initial_date, config["purchase_freq"], config["purchase_day"], end_purchase_date)
+    is_purchase = np.zeros(len(index), dtype=bool)
+    is_purchase[purchase_rows] = True
+
+    portfolio = np.zeros(len(assets))
+    history = []  # (pozycja, zainwestowane, kopia portfela, akcja)
+    invested = 0.0
+    last_year = None
+    last_rebalance_dates = {"rebalance_1": None, "rebalance_2": None}
+
+    def apply_rebalance(d, pos, label, condition_enabled, threshold_percent):
+        last_date = last_rebalance_dates.get(label)
+        too_soon = last_date is not None and (d - last_date).days < MIN_DAYS_BETWEEN_REBALANCES
+        rows = portfolio[None]
+        act, no_value, no_deviation = rebalance_rows(
+            px["rebalance"][pos], rows, alloc, buyback[None], markup[None],
+            condition_enabled, threshold_percent, np.array([too_soon])
+        )
+        portfolio[:] = rows[0]
+        if act[0]:
+            last_rebalance_dates[label] = d
+        return rebalance_labels(label, np.array([too_soon]), no_value, no_deviation)[0]
+
+    # Początkowy zakup (standardowo, wg allocation)
+    initial_pos = index.get_indexer([initial_date], method="nearest")[0]
+    portfolio += (config["initial_allocation"] * alloc) / (px["purchase"][initial_pos] * (1 + margins / 100))
+    invested += config["initial_allocation"]
+    history.append((initial_pos, invested, portfolio.copy(), "initial"))
+
+    # Alokacje TREND dla wszystkich dni zakupów (okres "last_purchase" liczony
+    # od poprzedniego zakupu; przed pierwszym - od zakupu początkowego)
+    trend_plan = None
+    if use_trend and not fixed_allocation:
+        trend_rows = np.unique(purchase_rows)
+        trend_rows = trend_rows[(trend_rows >= lo) & (trend_rows < hi)]
+        trend_plan = trend_allocations(data, config, trend_rows, initial_pos)
+    trend_row = 0
+
+    rebalances = []
+    for n in (1, 2):
+        if config[f"rebalance_{n}"]:
+            rebalances.append((
+                f"rebalance_{n}",
+                pd.to_datetime(config[f"rebalance_{n}_start"]),
+                config[f"rebalance_{n}_condition"],
+                config[f"rebalance_{n}_threshold"],
+            ))
+
+    for pos, d in enumerate(all_dates, start=lo):
+        if cancel is not None and cancel.is_set():
+            raise SimulationCancelled()
+
+        actions = []
+
+        if is_purchase[pos]:
+            if trend_plan is not None:
+                # Alokacja TREND (wyliczona z góry dla wszystkich zakupów)
+                weights = trend_plan["weights"][trend_row]
+                trend_row += 1
+            else:
+                # Standardowa alokacja
+                weights = alloc
+
+            portfolio += (purchase_amount * weights) / (px["purchase"][pos] * (1 + margins / 100))
+            invested += purchase_amount
+            actions.append("recurring")
+
+        # ReBalancing 1 i 2
+        for label, start, condition_enabled, threshold in rebalances:
+            if d >= start and d.month == start.month and d.day == start.day:
+                actions.append(apply_rebalance(d, pos, label, condition_enabled, threshold))
+
+        # Koszty magazynowania co rok
+        if last_year is None:
+            last_year = d.year
+
+        if d.year != last_year:
+            year_first = years.searchsorted(last_year, side="left")
+            last_year_end = years.searchsorted(last_year, side="right") - 1
+            storage_cost = invested * (storage_fee / 100) * (1 + vat / 100)
+            prices_end = px["storage_fee"][last_year_end]
+
+            if storage_metal == "ALL":
+                total_value = weighted_sum(prices_end, portfolio)
+                share = (prices_end * portfolio) / total_value
+                sell_price = prices_end * (1 + buyback / 100)
+                portfolio -= np.minimum((storage_cost * share) / sell_price, portfolio)
+            else:
+                metal_to_sell = storage_metal
+                if metal_to_sell == "Best of year":
+                    metal_to_sell = find_best_metal_of_year(data, index[year_first], index[last_year_end])
+                i = assets.index(metal_to_sell)
+                sell_price = prices_end[i] * (1 + buyback[i] / 100)
+                portfolio[i] -= min(storage_cost / sell_price, portfolio[i])
+
+            history.append((last_year_end, invested, portfolio.copy(), "storage_fee"))
+            last_year = d.year
+
+        if actions:
+            history.append((pos, invested, portfolio.copy(), ", ".join(actions)))
+
+    # Tworzenie dataframe wynikowego
+    positions = np.array([h[0] for h in history])
+    grams = np.array([h[2] for h in history])
+    df_result = pd.DataFrame({
+        "Date": index[positions],
+        "Invested": [h[1] for h in history],
+        **{m: grams[:, i] for i, m in enumerate(assets)},
+        "Portfolio Value": weighted_sum(px["valuation"][positions] * (1 + buyback / 100), grams),
+        "Akcja": [h[3] for h in history],
+    }).set_index("Date")
+
+    # Dołącz dziennik decyzji TREND
+    if trend_plan is not None and len(trend_rows):
+        return df_result, trend_log(index, trend_rows, trend_plan, config["trend_strategy_type"])
+
+    return df_result, None
+
+# =========================================
+# Inflacja i podsumowanie wyników
+# =========================================
+
+def add_real_values(result, inflation):
+    """
+    Dodaje kolumnę "Portfolio Value Real" - wartość portfela skorygowaną o inflację.
+
+    Parameters:
+    -----------
+    result : pd.DataFrame
+        Wynik symulacji
+    inflation : pd.DataFrame
+        Kolumny "Rok" i "Inflacja (%)"
+
+    Returns:
+    --------
+    pd.DataFrame
+        Wynik z dodaną kolumną (modyfikowany w miejscu)
+    """
+    # Słownik: Rok -> Inflacja
+    inflation_dict = dict(zip(inflation["Rok"], inflation["Inflacja (%)"]))
+
+    # Skumulowany współczynnik inflacji od roku początkowego (brak danych = 0% inflacji)
+    start_year = result.index.min().year
+    years = np.arange(start_year, result.index.max().year + 1)
+    factors = np.cumprod([1 + inflation_dict.get(year, 0.0) / 100 for year in years])
+    cumulative = factors[result.index.year - start_year]
+
+    nominal = result["Portfolio Value"].to_numpy()
+    result["Portfolio Value Real"] = np.where(cumulative != 0, nominal / np.where(cumulative != 0, cumulative, 1), nominal)
+    return result
+
+
+def summarize(result, storage_fee, vat):
+    """
+    Wylicza podstawowe metryki wyniku symulacji.
+
+    Parameters:
+    -----------
+    result : pd.DataFrame
+        Wynik symulacji (z kolumną "Portfolio Value Real", jeśli dostępna)
+    storage_fee : float
+        Roczny koszt magazynowania (%)
+    vat : float
+        VAT od kosztów magazynowania (%)
+
+    Returns:
+    --------
+    dict
+        Zainwestowany kapitał, wartości końcowe, roczne zwroty, koszty magazynowania
+        i maksymalne obsunięcie (ułamek)
+    """
+    start_date = result.index.min()
+    end_date = result.index.max()
+    years = (end_date - start_date).days / 365.25
+
+    invested = result["Invested"].max()
+    final_value = result["Portfolio Value"].iloc[-1]
+    final_value_real = result["Portfolio Value Real"].iloc[-1] if "Portfolio Value Real" in result else final_value
+
+    if invested > 0 and years > 0:
+        cagr = (final_value / invested) ** (1 / years) - 1
+        cagr_real = (final_value_real / invested) ** (1 / years) - 1
+    else:
+        cagr = 0.0
+        cagr_real = 0.0
+
+    storage_fees = result[result["Akcja"] == "storage_fee"]
+    total_storage_cost = storage_fees["Invested"].sum() * (storage_fee / 100) * (1 + vat / 100)
+
+    # Największy spadek wartości portfela od szczytu (na dniach zdarzeń)
+    values = result["Portfolio Value"].to_numpy(dtype=float)
+    peaks = np.maximum.accumulate(values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        drawdowns = np.where(peaks > 0, 1 - values / peaks, 0.0)
+    max_drawdown = float(np.nanmax(drawdowns)) if len(drawdowns) else 0.0
+
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "years": years,
+        "invested": invested,
+        "final_value": final_value,
+        "final_value_real": final_value_real,
+        "cagr": cagr,
+        "cagr_real": cagr_real,
+        "total_storage_cost": total_storage_cost,
+        "max_drawdown": max_drawdown,
+    }
@@ -0,0 +1,298 @@
+"""
+Baza eksperymentów: metryki symulacji w lokalnej bazie SQLite.
+
+Każdy wpis to odcisk konfiguracji (engine.config_fingerprint), parametry
+(JSON oraz najważniejsze jako osobne kolumny) i metryki z engine.summarize().
+Kolumny metryk są indeksowane, więc zapytania typu "20 najlepszych wg
+realnego CAGR przy obsunięciu < 30%" nie wymagają wczytywania całej bazy.
+
+Przykład:
+    python experiments.py eksperymenty.sqlite --metric cagr_real --top 20 --where "max_drawdown<0.3"
+
+Moduł korzysta wyłącznie z biblioteki standardowej (sqlite3) i pandas.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+
+import pandas as pd
+
+from engine import METALS, config_to_json
+
+DEFAULT_PATH = "eksperymenty.sqlite"
+
+# Metryki z engine.summarize() zapisywane jako kolumny (wszystkie indeksowane)
+METRICS = [
+    "invested", "final_value", "final_value_real", "cagr", "cagr_real",
+    "max_drawdown", "total_storage_cost", "years",
+]
+
+# Parametry zapisywane jako osobne kolumny (do filtrowania); alokacja innych
+# aktywów niż METALS dostępna jest w kolumnie "params" (JSON)
+PARAM_COLUMNS = {
+    "initial_date": "TEXT",
+    "end_purchase_date": "TEXT",
+    "purchase_freq": "TEXT",
+    "purchase_amount": "REAL",
+    "initial_allocation": "REAL",
+    "trend_active": "INTEGER",
+    "trend_strategy_type": "TEXT",
+    "storage_metal": "TEXT",
+    **{f"alloc_{m.lower()}": "REAL" for m in METALS},
+}
+
+COLUMNS = ["id", "run", "name", "source", "fingerprint", "created", *PARAM_COLUMNS, *METRICS, "params"]
+
+OPERATORS = {"<": "<", "<=": "<=", ">": ">", ">=": ">=", "=": "=", "==": "=", "!=": "!="}
+
+_FILTER = re.compile(r"^\s*(\w+)\s*(<=|>=|==|!=|<|>|=)\s*(.+?)\s*$")
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS experiments (
+    id INTEGER PRIMARY KEY,
+    run TEXT NOT NULL DEFAULT '',
+    name TEXT,
+    source TEXT,
+    fingerprint TEXT NOT NULL,
+    created REAL,
+    {", ".join(f"{column} {kind}" for column, kind in PARAM_COLUMNS.items())},
+    {", ".join(f"{metric} REAL" for metric in METRICS)},
+    params TEXT NOT NULL,
+    UNIQUE (run, fingerprint)
+);
+CREATE INDEX IF NOT EXISTS idx_experiments_fingerprint ON experiments (fingerprint);
+{"".join(f"CREATE INDEX IF NOT EXISTS idx_experiments_{metric} ON experiments ({metric});" for metric in METRICS)}
+"""
+
+
+def parse_filter(text):
+    """
+    Zamienia warunek tekstowy ("max_drawdown<0.3", "purchase_freq=Tydzień") na krotkę.
+
+    Returns:
+    --------
+    tuple
+        (kolumna, operator, wartość)
+
+    Raises:
+    -------
+    ValueError
+        Gdy warunek ma niepoprawną postać lub dotyczy nieznanej kolumny
+    """
+    match = _FILTER.match(text)
+    if not match:
+        raise ValueError(f"Niepoprawny warunek: {text}")
+    column, operator, value = match.groups()
+    if column not in COLUMNS:
+        raise ValueError(f"Nieznana kolumna: {column}")
+    try:
+        value = float(value)
+    except ValueError:
+        value = value.strip("'\"")
+    return column, operator, value
+
+
+def _where(filters):
+    """Klauzula WHERE z listy warunków (kolumny i operatory z białej listy)."""
+    clauses, args = [], []
+    for column, operator, value in filters or []:
+        if column not in COLUMNS or operator not in OPERATORS:
+            raise ValueError(f"Niepoprawny warunek: {column} {operator}")
+        clauses.append(f"{column} {OPERATORS[operator]} ?")
+        args.append(int(value) if isinstance(value, bool) else value)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+
+class ExperimentStore:
+    """
+    Baza wyników symulacji w pliku SQLite.
+
+    Parameters:
+    -----------
+    path : str
+        Ścieżka pliku bazy (":memory:" - baza w pamięci)
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM experiments").fetchone()[0]
+
+    @staticmethod
+    def _row(run, name, source, config, metrics, created):
+        params = config_to_json(config)
+        payload = json.dumps(params, sort_keys=True, default=str)
+        row = {
+            "run": run or "",
+            "name": name,
+            "source": source,
+            # Ten sam skrót co config_fingerprint(config), bez ponownej serializacji
+            "fingerprint": hashlib.sha1(payload.encode("utf-8")).hexdigest(),
+            "created": created,
+            "initial_date": params["initial_date"],
+            "end_purchase_date": params["end_purchase_date"],
+            "purchase_freq": params["purchase_freq"],
+            "purchase_amount": params["purchase_amount"],
+            "initial_allocation": params["initial_allocation"],
+            "trend_active": int(bool(params["trend_active"])),
+            "trend_strategy_type": params["trend_strategy_type"],
+            "storage_metal": params["storage_metal"],
+            **{f"alloc_{m.lower()}": params["allocation"].get(m) for m in METALS},
+            **{metric: (None if metrics.get(metric) is None else float(metrics[metric])) for metric in METRICS},
+            "params": payload,
+        }
+        return row
+
+    def add_many(self, entries, run=None, source=None, chunk_size=5000):
+        """
+        Zapisuje wiele wyników w transakcjach (po chunk_size wpisów).
+
+        Ta sama konfiguracja w obrębie jednego run zastępuje poprzedni wpis.
+
+        Parameters:
+        -----------
+        entries : iterable
+            Trójki (nazwa, konfiguracja, metryki z summarize())
+        run : str or None
+            Etykieta serii (np. nazwa przeszukiwania)
+        source : str or None
+            Źródło wyników ("cli", "book", "app", ...)
+
+        Returns:
+        --------
+        int
+            Liczba zapisanych wpisów
+        """
+        columns = COLUMNS[1:]
+        sql = (f"INSERT OR REPLACE INTO experiments ({', '.join(columns)}) "
+               f"VALUES ({', '.join('?' for _ in columns)})")
+        created = time.time()
+        count = 0
+        chunk = []
+
+        def flush():
+            with self._conn:
+                self._conn.executemany(sql, chunk)
+            chunk.clear()
+
+        for name, config, metrics in entries:
+            row = self._row(run, name, source, config, metrics, created)
+            chunk.append([row[column] for column in columns])
+            count += 1
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+        return count
+
+    def add(self, name, config, metrics, run=None, source=None):
+        """Zapisuje pojedynczy wynik."""
+        return self.add_many([(name, config, metrics)], run=run, source=source)
+
+    def top(self, n=20, metric="cagr_real", filters=None, ascending=False, with_params=False):
+        """
+        Najlepsze wpisy wg metryki (z użyciem indeksu).
+
+        Parameters:
+        -----------
+        n : int
+            Liczba wpisów
+        metric : str
+            Kolumna sortowania (metryka lub parametr)
+        filters : list or None
+            Warunki (kolumna, operator, wartość), np. [("max_drawdown", "<", 0.3)]
+        ascending : bool
+            Sortowanie rosnące (np. dla max_drawdown)
+        with_params : bool
+            Czy dołączyć pełne parametry (JSON)
+
+        Returns:
+        --------
+        pd.DataFrame
+        """
+        if metric not in COLUMNS:
+            raise ValueError(f"Nieznana kolumna: {metric}")
+        columns = [c for c in COLUMNS if with_params or c != "params"]
+        where, args = _where(filters)
+        direction = "ASC" if ascending else "DESC"
+        sql = (f"SELECT {', '.join(columns)} FROM experiments{where} "
+               f"{'AND' if where else 'WHERE'} {metric} IS NOT NULL "
+               f"ORDER BY {metric} {direction} LIMIT ?")
+        return pd.read_sql_query(sql, self._conn, params=[*args, int(n)])
+
+    def count(self, filters=None):
+        """Liczba wpisów spełniających warunki."""
+        where, args = _where(filters)
+        return self._conn.execute(f"SELECT COUNT(*) FROM experiments{where}", args).fetchone()[0]
+
+    def runs(self):
+        """Serie zapisane w bazie z liczbą wpisów i najlepszym realnym CAGR."""
+        return pd.read_sql_query(
+            "SELECT run, source, COUNT(*) AS entries, MAX(cagr_real) AS best_cagr_real, MAX(created) AS created "
+            "FROM experiments GROUP BY run, source ORDER BY created DESC",
+            self._conn,
+        )
+
+    def config(self, fingerprint):
+        """Parametry zapisanej konfiguracji (słownik jak config_to_json) lub None."""
+        row = self._conn.execute("SELECT params FROM experiments WHERE fingerprint = ? LIMIT 1", (fingerprint,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Zapytania do bazy eksperymentów (SQLite).")
+    parser.add_argument("path", nargs="?", default=DEFAULT_PATH, help=f"Plik bazy (domyślnie: {DEFAULT_PATH})")
+    parser.add_argument("--metric", default="cagr_real", help="Kolumna sortowania (domyślnie: cagr_real)")
+    parser.add_argument("--top", type=int, default=20, help="Liczba wpisów (domyślnie: 20)")
+    parser.add_argument("--where", action="append", default=[], help='Warunek, np. "max_drawdown<0.3" (można powtarzać)')
+    parser.add_argument("--ascending", action="store_true", help="Sortuj rosnąco")
+    parser.add_argument("--runs", action="store_true", help="Pokaż zapisane serie")
+    parser.add_argument("--csv", default=None, help="Zapisz wynik do pliku CSV")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not os.path.exists(args.path):
+        print(f"Brak bazy: {args.path}", file=sys.stderr)
+        return 2
+
+    with ExperimentStore(args.path) as store:
+        try:
+            if args.runs:
+                table = store.runs()
+            else:
+                table = store.top(args.top, args.metric, [parse_filter(w) for w in args.where], args.ascending)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+
+    if args.csv:
+        table.to_csv(args.csv, index=False)
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(table.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
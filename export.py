@@ -0,0 +1,272 @@
+"""
+Strumieniowy eksport wyników symulacji do CSV i Parquet.
+
+Wyniki zapisywane są porcjami (chunkami) bezpośrednio do pliku lub bufora,
+dzięki czemu szczytowe zużycie pamięci nie zależy od liczby wierszy wyniku.
+"""
+
+import bz2
+import gzip
+import io
+import json
+import lzma
+import os
+import tempfile
+import zipfile
+
+import pandas as pd
+
+DEFAULT_CHUNK_ROWS = 50_000
+
+# Obsługiwane kompresje strumieni CSV
+_CSV_OPENERS = {
+    "gzip": gzip.open,
+    "bz2": bz2.open,
+    "xz": lzma.open,
+}
+
+CSV_SUFFIXES = {None: ".csv", "gzip": ".csv.gz", "bz2": ".csv.bz2", "xz": ".csv.xz"}
+
+
+def parquet_available():
+    """Sprawdza, czy zainstalowano pyarrow (wymagany do zapisu Parquet)."""
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def iter_frame_chunks(frames, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Dzieli DataFrame (lub strumień DataFrame'ów) na porcje o ograniczonej liczbie wierszy.
+
+    Parameters:
+    -----------
+    frames : pd.DataFrame or iterable of pd.DataFrame
+        Pojedynczy wynik lub generator kolejnych porcji wyniku
+    chunk_rows : int
+        Maksymalna liczba wierszy w jednej porcji
+
+    Returns:
+    --------
+    generator
+        Kolejne porcje jako pd.DataFrame
+    """
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    for frame in frames:
+        for start in range(0, len(frame), chunk_rows):
+            yield frame.iloc[start:start + chunk_rows]
+
+
+def write_csv(frames, target, compression=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Zapisuje wynik do CSV porcjami, opcjonalnie z kompresją.
+
+    Parameters:
+    -----------
+    frames : pd.DataFrame or iterable of pd.DataFrame
+        Wynik do zapisania
+    target : str or binary file-like
+        Ścieżka pliku lub otwarty strumień binarny
+    compression : str or None
+        None, "gzip", "bz2" lub "xz"
+    chunk_rows : int
+        Liczba wierszy zapisywanych jednorazowo
+
+    Returns:
+    --------
+    int
+        Liczba zapisanych wierszy
+    """
+    if compression is not None and compression not in _CSV_OPENERS:
+        raise ValueError(f"Nieobsługiwana kompresja CSV: {compression}")
+
+    own_handle = isinstance(target, str)
+    raw = open(target, "wb") if own_handle else target
+    stream = _CSV_OPENERS[compression](raw, "wb") if compression else raw
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+
+    rows = 0
+    try:
+        header = True
+        for chunk in iter_frame_chunks(frames, chunk_rows):
+            chunk.to_csv(text, header=header)
+            header = False
+            rows += len(chunk)
+        text.flush()
+    finally:
+        # Odłącz wrapper, aby nie zamknął strumienia należącego do wywołującego
+        text.detach()
+        if compression:
+            stream.close()
+        if own_handle:
+            raw.close()
+    return rows
+
+
+def write_parquet(frames, target, compression="snappy", chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Zapisuje wynik do Parquet jako kolejne grupy wierszy (row groups).
+
+    Parameters:
+    -----------
+    frames : pd.DataFrame or iterable of pd.DataFrame
+        Wynik do zapisania
+    target : str or binary file-like
+        Ścieżka pliku lub otwarty strumień binarny
+    compression : str or None
+        Kodek Parquet ("snappy", "gzip", "zstd" lub None)
+    chunk_rows : int
+        Liczba wierszy w jednej grupie
+
+    Returns:
+    --------
+    int
+        Liczba zapisanych wierszy
+    """
+    if not parquet_available():
+        raise ImportError("Zapis Parquet wymaga pakietu pyarrow (pip install pyarrow).")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    rows = 0
+    try:
+        for chunk in iter_frame_chunks(frames, chunk_rows):
+            table = pa.Table.from_pandas(chunk, preserve_index=True)
+            if writer is None:
+                writer = pq.ParquetWriter(target, table.schema, compression=compression)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def iter_daily_nav(result, data, buyback_discounts, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Generuje dzienną wartość portfela (NAV) porcjami na podstawie wyniku zdarzeniowego.
+
+    Stan portfela z ostatniego zdarzenia przed danym dniem jest przenoszony
+    do przodu, a wycena odbywa się po cenach odkupu.
+
+    Parameters:
+    -----------
+    result : pd.DataFrame
+        Wynik symulacji (wiersz na zdarzenie)
+    data : pd.DataFrame
+        Ceny metali (kolumny *_EUR)
+    buyback_discounts : dict
+        Zniżki od ceny SPOT przy odkupie (%)
+    chunk_rows : int
+        Liczba dni w jednej porcji
+
+    Returns:
+    --------
+    generator
+        Kolejne porcje NAV jako pd.DataFrame
+    """
+    # Stan na koniec dnia = ostatnie zdarzenie danego dnia
+    events = result[~result.index.duplicated(keep="last")].sort_index(kind="stable")
+    # Aktywa wyniku - kolumny gramów, dla których dane mają kolumnę ceny "<aktywo>_EUR"
+    assets = [col for col in result.columns if col + "_EUR" in data.columns]
+    events = events[["Invested"] + assets]
+    days = data.loc[events.index.min():events.index.max()].index
+
+    for start in range(0, len(days), chunk_rows):
+        chunk_days = days[start:start + chunk_rows]
+        nav = events.reindex(chunk_days, method="ffill")
+        prices = data.loc[chunk_days]
+        nav["Portfolio Value"] = sum(
+            prices[m + "_EUR"] * (1 + buyback_discounts[m] / 100) * nav[m]
+            for m in assets
+        )
+        nav.index.name = "Date"
+        yield nav
+
+
+def write_archive(target, config, result, data, buyback_discounts, trend_data=None,
+                  fmt="csv", compression=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Zapisuje archiwum ZIP z konfiguracją, zdarzeniami, dziennym NAV i logiem TREND.
+
+    Każdy składnik jest zapisywany strumieniowo do osobnego wpisu archiwum.
+
+    Parameters:
+    -----------
+    target : str or binary file-like
+        Ścieżka pliku ZIP lub otwarty strumień binarny
+    config : dict
+        Parametry symulacji (zapisywane jako config.json)
+    result : pd.DataFrame
+        Wynik symulacji
+    data : pd.DataFrame
+        Ceny metali
+    buyback_discounts : dict
+        Zniżki od ceny SPOT przy odkupie (%)
+    trend_data : pd.DataFrame or None
+        Log decyzji TREND
+    fmt : str
+        "csv" lub "parquet"
+    compression : str or None
+        Kompresja plików CSV wewnątrz archiwum
+    chunk_rows : int
+        Liczba wierszy zapisywanych jednorazowo
+    """
+    if fmt == "parquet":
+        suffix = ".parquet"
+    elif fmt == "csv":
+        suffix = CSV_SUFFIXES[compression]
+    else:
+        raise ValueError(f"Nieobsługiwany format archiwum: {fmt}")
+
+    def write_entry(archive, name, frames):
+        with archive.open(name + suffix, "w", force_zip64=True) as entry:
+            if fmt == "parquet":
+                # ParquetWriter wymaga strumienia z możliwością przewijania
+                with tempfile.TemporaryFile() as tmp:
+                    write_parquet(frames, tmp, chunk_rows=chunk_rows)
+                    tmp.seek(0)
+                    while True:
+                        block = tmp.read(1 << 20)
+                        if not block:
+                            break
+                        entry.write(block)
+            else:
+                write_csv(frames, entry, compression=compression, chunk_rows=chunk_rows)
+
+    # Pliki już skompresowane zapisujemy bez ponownej kompresji ZIP
+    zip_compression = zipfile.ZIP_STORED if (fmt == "parquet" or compression) else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(target, "w", compression=zip_compression) as archive:
+        archive.writestr("config.json", json.dumps(config, indent=2, ensure_ascii=False, default=str))
+        write_entry(archive, "events", result)
+        write_entry(archive, "nav", iter_daily_nav(result, data, buyback_discounts, chunk_rows))
+        if trend_data is not None:
+            write_entry(archive, "trend_log", trend_data)
+
+
+def spool_export(write):
+    """
+    Wykonuje eksport do pliku tymczasowego na dysku i zwraca go przewinięty na początek.
+
+    Parameters:
+    -----------
+    write : callable
+        Funkcja przyjmująca otwarty strumień binarny, np. lambda f: write_csv(result, f)
+
+    Returns:
+    --------
+    io.BufferedReader
+        Plik tymczasowy otwarty do odczytu (zamyka go wywołujący, np. blokiem with)
+    """
+    with tempfile.TemporaryFile() as tmp:
+        write(tmp)
+        tmp.flush()
+        # Osobny deskryptor tylko do odczytu utrzymuje plik przy życiu po zamknięciu tmp
+        reader = open(os.dup(tmp.fileno()), "rb")
+    reader.seek(0)
+    return reader
@@ -0,0 +1,342 @@
+"""
+Wzorcowe wyniki silnika (golden outputs) i sprawdzanie szybkich ścieżek.
+
+Plik golden.npz zawiera zamrożone wyniki engine.simulate() dla macierzy
+konfiguracji obejmującej każdą częstotliwość zakupów, każdy tryb pobierania
+kosztów magazynowania, każdy wariant ReBalancingu (bez, bezwarunkowy,
+warunkowy, dwa terminy) oraz każdą strategię i okres TREND.
+
+Każda zarejestrowana ścieżka obliczeń (engine.simulate, batch, book, ...)
+porównywana jest z wzorcem: daty i akcje muszą być identyczne, wartości
+liczbowe zgodne w granicach tolerancji ścieżki (rtol/atol).
+
+Przykład:
+    python golden.py check              # sprawdzenie wszystkich ścieżek
+    python golden.py check --path batch # tylko wybrana ścieżka
+    python golden.py freeze             # zapis nowego wzorca (po zamierzonej zmianie wyników)
+
+Nową ścieżkę dodaje się dekoratorem:
+
+    @register_path("moja", rtol=1e-9)
+    def my_path(data, config):
+        return result, trend_data
+"""
+
+import argparse
+import hashlib
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from batch import simulate_cost_batch
+from book import simulate_fixed_book
+from engine import METALS, REQUIRED_COLUMNS, load_prices, normalize_config, simulate
+from precision import FLOAT32_BUDGET
+from strategies import STRATEGIES
+
+GOLDEN_PATH = "golden.npz"
+DATA_PATH = "lbma_data.csv"
+
+# Domyślne tolerancje porównania wartości liczbowych
+DEFAULT_RTOL = 1e-9
+DEFAULT_ATOL = 1e-6
+
+FREQUENCIES = ["Tydzień", "Miesiąc", "Kwartał", "Brak"]
+STORAGE_METALS = ["Gold", "Silver", "Platinum", "Palladium", "ALL", "Best of year"]
+REBALANCE_MODES = {
+    "bez": {"rebalance_1": False, "rebalance_2": False},
+    "roczny": {"rebalance_1": True, "rebalance_1_condition": False, "rebalance_2": False},
+    "warunkowy": {"rebalance_1": True, "rebalance_1_condition": True, "rebalance_1_threshold": 5.0,
+                  "rebalance_2": False},
+    "dwa": {"rebalance_1": True, "rebalance_1_condition": False, "rebalance_2": True,
+            "rebalance_2_condition": True, "rebalance_2_threshold": 8.0},
+}
+TREND_PERIODS = ["last_purchase", 30, 90, 365]
+
+RESULT_COLUMNS = ["Invested", *METALS, "Portfolio Value"]
+
+# Zarejestrowane ścieżki: nazwa -> (funkcja, rtol, atol, warunek stosowalności)
+PATHS = {}
+
+
+def register_path(name, rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL, applies=None):
+    """
+    Dekorator rejestrujący ścieżkę obliczeń porównywaną z wzorcem.
+
+    Funkcja ścieżki przyjmuje (data, config) i zwraca (wynik, historia TREND lub None)
+    w formacie engine.simulate(). applies(config) pozwala pominąć konfiguracje,
+    których ścieżka nie obsługuje.
+    """
+    def decorator(fn):
+        PATHS[name] = (fn, rtol, atol, applies)
+        return fn
+    return decorator
+
+
+@register_path("simulate")
+def _simulate_path(data, config):
+    return simulate(data, config)
+
+
+@register_path("batch")
+def _batch_path(data, config):
+    batch = simulate_cost_batch(data, config, [{}], keep_history=True)
+    return batch["results"][0], batch["trend_data"]
+
+
+@register_path("book", applies=lambda config: not config["trend_active"])
+def _book_path(data, config):
+    return simulate_fixed_book(data, [config])[0], None
+
+
+# Tryb float32 (precision.py): wartości w granicach budżetu błędu, akcje bez zmian
+@register_path("batch-float32", rtol=FLOAT32_BUDGET, atol=1e-2)
+def _batch_float32_path(data, config):
+    batch = simulate_cost_batch(data, config, [{}], keep_history=True, dtype=np.float32)
+    return batch["results"][0], batch["trend_data"]
+
+
+@register_path("book-float32", rtol=FLOAT32_BUDGET, atol=1e-2, applies=lambda config: not config["trend_active"])
+def _book_float32_path(data, config):
+    return simulate_fixed_book(data, [config], dtype=np.float32)[0], None
+
+
+def golden_cases():
+    """
+    Macierz konfiguracji wzorcowych.
+
+    Returns:
+    --------
+    list
+        Pary (nazwa, surowe parametry dla normalize_config)
+    """
+    cases = []
+    modes = list(REBALANCE_MODES)
+
+    # Stała alokacja: każda częstotliwość × każdy tryb kosztów magazynowania,
+    # tryby ReBalancingu rotowane tak, by każda para częstotliwość/tryb wystąpiła
+    for i, freq in enumerate(FREQUENCIES):
+        for j, storage_metal in enumerate(STORAGE_METALS):
+            mode = modes[(i + j) % len(modes)]
+            cases.append((f"stała/{freq}/{storage_metal}/{mode}", {
+                "initial_date": "2005-03-07",
+                "end_purchase_date": "2020-06-30",
+                "purchase_freq": freq,
+                "purchase_day": 2 if freq == "Tydzień" else 15,
+                "storage_metal": storage_metal,
+                **REBALANCE_MODES[mode],
+            }))
+
+    # TREND: każda strategia × każdy okres, częstotliwości i tryby rotowane
+    for i, strategy in enumerate(STRATEGIES):
+        for j, period in enumerate(TREND_PERIODS):
+            freq = FREQUENCIES[(i + j) % 3]
+            mode = modes[(i + 2 * j) % len(modes)]
+            cases.append((f"trend/{strategy}/{period}/{freq}/{mode}", {
+                "initial_date": "2008-01-02",
+                "end_purchase_date": "2019-12-31",
+                "purchase_freq": freq,
+                "purchase_day": 4 if freq == "Tydzień" else 1,
+                "trend_active": True,
+                "trend_strategy_type": strategy,
+                "trend_period": period,
+                "max_allocation_change": (100, 50, 10)[(i + j) % 3],
+                "storage_metal": STORAGE_METALS[(i + j) % len(STORAGE_METALS)],
+                **REBALANCE_MODES[mode],
+            }))
+
+    # Przypadki brzegowe
+    cases += [
+        ("brzeg/start-w-weekend", {"initial_date": "2010-05-08", "end_purchase_date": "2012-05-08"}),
+        ("brzeg/bez-wpłaty-początkowej", {"initial_allocation": 0.0, "end_purchase_date": "2015-12-31",
+                                          "initial_date": "2012-01-01", "purchase_freq": "Miesiąc",
+                                          "purchase_day": 28}),
+        ("brzeg/początek-historii", {"initial_date": "1977-01-05", "end_purchase_date": "1985-01-01",
+                                     "trend_active": True, "trend_strategy_type": "macd"}),
+        ("brzeg/koniec-danych", {"initial_date": "2020-01-01", "end_purchase_date": "2030-01-01",
+                                 "storage_metal": "Best of year"}),
+        ("brzeg/wysoki-koszt", {"initial_date": "2000-01-03", "end_purchase_date": "2010-01-03",
+                                "storage_fee": 40.0, "storage_metal": "ALL", "rebalance_1": False}),
+        ("brzeg/jeden-metal", {"initial_date": "2000-01-03", "end_purchase_date": "2010-01-03",
+                               "allocation": {"Gold": 1.0, "Silver": 0.0, "Platinum": 0.0, "Palladium": 0.0},
+                               **REBALANCE_MODES["warunkowy"]}),
+    ]
+    return cases
+
+
+def data_hash(data):
+    """Skrót cen, na których zamrożono wzorzec."""
+    prices = np.ascontiguousarray(data[REQUIRED_COLUMNS].to_numpy(dtype=float))
+    dates = data.index.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    return hashlib.sha1(prices.tobytes() + dates.tobytes()).hexdigest()
+
+
+def _arrays(result, trend_data):
+    """Wynik symulacji jako słownik tablic (zapisywalny w .npz)."""
+    arrays = {
+        "dates": result.index.to_numpy(dtype="datetime64[ns]").astype(np.int64),
+        "values": result[RESULT_COLUMNS].to_numpy(dtype=float),
+        "actions": np.asarray(result["Akcja"], dtype=str),
+    }
+    if trend_data is not None:
+        arrays["trend_positions"] = trend_data["Position"].to_numpy(dtype=np.int64)
+        arrays["trend_ranks"] = trend_data[[f"{m} rank" for m in METALS]].to_numpy(dtype=np.int64)
+        arrays["trend_weights"] = trend_data[[f"{m} %" for m in METALS]].to_numpy(dtype=float)
+    return arrays
+
+
+def freeze(data, path=GOLDEN_PATH):
+    """
+    Zapisuje wyniki engine.simulate() dla wszystkich golden_cases().
+
+    Returns:
+    --------
+    int
+        Liczba zapisanych przypadków
+    """
+    cases = golden_cases()
+    payload = {"data_hash": np.array(data_hash(data)), "names": np.array([name for name, _ in cases])}
+    for k, (name, raw) in enumerate(cases):
+        config = normalize_config(raw, data)
+        for key, value in _arrays(*simulate(data, config)).items():
+            payload[f"{k}/{key}"] = value
+    np.savez_compressed(path, **payload)
+    return len(cases)
+
+
+def compare(expected, actual, rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL):
+    """
+    Różnice między wzorcem a wynikiem ścieżki.
+
+    Returns:
+    --------
+    list
+        Opisy rozbieżności (pusta lista = zgodność)
+    """
+    problems = []
+    if len(expected["dates"]) != len(actual["dates"]):
+        return [f"liczba wierszy {len(actual['dates'])} zamiast {len(expected['dates'])}"]
+    if not np.array_equal(expected["dates"], actual["dates"]):
+        first = int(np.flatnonzero(expected["dates"] != actual["dates"])[0])
+        problems.append(f"daty różnią się od wiersza {first}")
+    if not np.array_equal(expected["actions"], actual["actions"]):
+        first = int(np.flatnonzero(expected["actions"] != actual["actions"])[0])
+        problems.append(f"akcja w wierszu {first}: {actual['actions'][first]!r} zamiast {expected['actions'][first]!r}")
+    if not np.allclose(actual["values"], expected["values"], rtol=rtol, atol=atol, equal_nan=True):
+        error = np.abs(actual["values"] - expected["values"])
+        row, col = np.unravel_index(np.nanargmax(error), error.shape)
+        problems.append(f"{RESULT_COLUMNS[col]} w wierszu {row}: {actual['values'][row, col]!r} "
+                        f"zamiast {expected['values'][row, col]!r}")
+
+    if ("trend_positions" in expected) != ("trend_positions" in actual):
+        problems.append("brak lub nadmiarowa historia TREND")
+    elif "trend_positions" in expected:
+        if not (np.array_equal(expected["trend_positions"], actual["trend_positions"])
+                and np.array_equal(expected["trend_ranks"], actual["trend_ranks"])):
+            problems.append("ranking TREND różni się od wzorca")
+        elif not np.allclose(actual["trend_weights"], expected["trend_weights"], rtol=rtol, atol=atol):
+            problems.append("alokacje TREND różnią się od wzorca")
+    return problems
+
+
+def check(data, path=GOLDEN_PATH, paths=None, verbose=False):
+    """
+    Porównuje zarejestrowane ścieżki z wzorcem.
+
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Ceny metali (te same, na których zamrożono wzorzec)
+    paths : list or None
+        Nazwy ścieżek (None = wszystkie z PATHS)
+
+    Returns:
+    --------
+    pd.DataFrame
+        Wiersz na ścieżkę: liczba przypadków, pominiętych, niezgodnych, czas (s)
+    list
+        Niezgodności jako (ścieżka, przypadek, opis)
+
+    Raises:
+    -------
+    ValueError
+        Gdy wzorzec zamrożono na innych danych lub innej macierzy przypadków
+    """
+    with np.load(path) as golden:
+        stored = {key: golden[key] for key in golden.files}
+    if str(stored["data_hash"]) != data_hash(data):
+        raise ValueError("Wzorzec zamrożono na innych danych cenowych - uruchom ponownie 'freeze'.")
+
+    cases = golden_cases()
+    if [name for name, _ in cases] != list(stored["names"]):
+        raise ValueError("Macierz przypadków różni się od zapisanej - uruchom ponownie 'freeze'.")
+    configs = [normalize_config(raw, data) for _, raw in cases]
+
+    rows, failures = [], []
+    for name in paths or PATHS:
+        fn, rtol, atol, applies = PATHS[name]
+        checked = skipped = failed = 0
+        started = time.perf_counter()
+        for k, (case, _) in enumerate(cases):
+            if applies is not None and not applies(configs[k]):
+                skipped += 1
+                continue
+            expected = {key.split("/", 1)[1]: value for key, value in stored.items() if key.startswith(f"{k}/")}
+            problems = compare(expected, _arrays(*fn(data, configs[k])), rtol, atol)
+            checked += 1
+            if problems:
+                failed += 1
+                failures.extend((name, case, problem) for problem in problems)
+            if verbose:
+                print(f"{name:10s} {'BŁĄD' if problems else 'OK':4s} {case}")
+        rows.append({"ścieżka": name, "przypadki": checked, "pominięte": skipped, "niezgodne": failed,
+                     "rtol": rtol, "atol": atol, "czas (s)": round(time.perf_counter() - started, 2)})
+    return pd.DataFrame(rows), failures
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Wzorcowe wyniki silnika i sprawdzanie szybkich ścieżek.")
+    parser.add_argument("command", choices=["check", "freeze", "list"], help="check, freeze lub list")
+    parser.add_argument("--golden", default=GOLDEN_PATH, help=f"Plik wzorca (domyślnie: {GOLDEN_PATH})")
+    parser.add_argument("--data", default=DATA_PATH, help=f"Plik z cenami (domyślnie: {DATA_PATH})")
+    parser.add_argument("--path", action="append", default=None,
+                        help="Sprawdzana ścieżka (można powtarzać; domyślnie wszystkie)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Wypisz wynik każdego przypadku")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == "list":
+        for name, _ in golden_cases():
+            print(name)
+        print(f"\nŚcieżki: {', '.join(PATHS)}")
+        return 0
+
+    data = load_prices(args.data)
+    if args.command == "freeze":
+        count = freeze(data, args.golden)
+        print(f"Zapisano {count} przypadków wzorcowych do {args.golden}")
+        return 0
+
+    unknown = [name for name in args.path or [] if name not in PATHS]
+    if unknown:
+        print(f"Nieznane ścieżki: {', '.join(unknown)} (dostępne: {', '.join(PATHS)})", file=sys.stderr)
+        return 2
+    try:
+        table, failures = check(data, args.golden, args.path, args.verbose)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    print(table.to_string(index=False))
+    for name, case, problem in failures:
+        print(f"{name}: {case}: {problem}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Ograniczona historia uruchomień symulacji w sesji.
+
+Wyniki przechowywane są w postaci zwartej (tablice numpy, akcje jako kody
+kategorii) razem z konfiguracją. Kluczem wpisu jest odcisk konfiguracji
+i klucz danych cenowych (ingest.PriceStore.data_key), więc po dopisaniu
+nowych notowań ta sama konfiguracja trafia do nowego wpisu. Historia ma limit liczby wpisów oraz budżet
+pamięci - po przekroczeniu usuwane są najdawniej używane wpisy (LRU).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from engine import config_fingerprint, result_assets
+
+DEFAULT_MAX_RUNS = 20
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _pack(result):
+    """Zamienia wynik symulacji na słownik tablic numpy."""
+    actions = pd.Categorical(result["Akcja"])
+    assets = result_assets(result)
+    return {
+        "dates": result.index.to_numpy(dtype="datetime64[ns]"),
+        "invested": result["Invested"].to_numpy(dtype=float),
+        "assets": np.asarray(assets, dtype=object),
+        "grams": result[assets].to_numpy(dtype=float),
+        "value": result["Portfolio Value"].to_numpy(dtype=float),
+        "action_codes": actions.codes.astype(np.int16),
+        "action_names": np.asarray(actions.categories, dtype=object),
+    }
+
+
+def _unpack(packed):
+    """Odtwarza wynik w formacie engine.simulate()."""
+    return pd.DataFrame({
+        "Date": pd.DatetimeIndex(packed["dates"]),
+        "Invested": packed["invested"],
+        **{m: packed["grams"][:, i] for i, m in enumerate(packed["assets"])},
+        "Portfolio Value": packed["value"],
+        "Akcja": packed["action_names"][packed["action_codes"]],
+    }).set_index("Date")
+
+
+def run_key(config, data_key=None):
+    """Klucz wpisu historii: (odcisk konfiguracji, klucz danych cenowych)."""
+    return config_fingerprint(config), data_key
+
+
+def _nbytes(packed, trend_data):
+    size = sum(arr.nbytes for key, arr in packed.items() if key not in ("action_names", "assets"))
+    size += sum(len(name) for name in packed["action_names"])
+    if trend_data is not None:
+        size += int(trend_data.memory_usage(deep=True).sum())
+    return size
+
+
+class RunHistory:
+    """
+    Historia uruchomień z limitem LRU i budżetem pamięci.
+
+    Parameters:
+    -----------
+    max_runs : int
+        Maksymalna liczba przechowywanych uruchomień
+    max_bytes : int
+        Budżet pamięci na zapisane wyniki (najnowszy wpis jest zawsze zachowany)
+    """
+
+    def __init__(self, max_runs=DEFAULT_MAX_RUNS, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_runs = max_runs
+        self.max_bytes = max_bytes
+        self._runs = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter = 0
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self._runs)
+
+    def __contains__(self, key):
+        return key in self._runs
+
+    def add(self, config, result, trend_data=None, label=None, data_key=None):
+        """
+        Zapisuje wynik uruchomienia; ta sama konfiguracja na tych samych danych zastępuje poprzedni wpis.
+
+        Parameters:
+        -----------
+        data_key : hashable or None
+            Klucz danych cenowych wyniku (ingest.PriceStore.data_key)
+
+        Returns:
+        --------
+        tuple
+            Klucz wpisu (run_key)
+        """
+        key = run_key(config, data_key)
+        packed = _pack(result)
+        size = _nbytes(packed, trend_data)
+
+        with self._lock:
+            old = self._runs.pop(key, None)
+            if old is not None:
+                self.nbytes -= old["nbytes"]
+                number = old["number"]
+            else:
+                self._counter += 1
+                number = self._counter
+
+            self._runs[key] = {
+                "number": number,
+                "label": label,
+                "created": time.time(),
+                "config": dict(config),
+                "packed": packed,
+                "trend_data": trend_data,
+                "final_value": float(packed["value"][-1]),
+                "invested": float(packed["invested"][-1]),
+                "nbytes": size,
+            }
+            self.nbytes += size
+            self._evict()
+        return key
+
+    def _evict(self):
+        while len(self._runs) > 1 and (len(self._runs) > self.max_runs or self.nbytes > self.max_bytes):
+            _, entry = self._runs.popitem(last=False)
+            self.nbytes -= entry["nbytes"]
+
+    def get(self, key):
+        """
+        Zwraca zapisane uruchomienie i oznacza je jako ostatnio używane.
+
+        Returns:
+        --------
+        tuple
+            (wynik, historia TREND lub None, konfiguracja)
+        """
+        with self._lock:
+            entry = self._runs[key]
+            self._runs.move_to_end(key)
+        return _unpack(entry["packed"]), entry["trend_data"], entry["config"]
+
+    def values(self, key):
+        """Seria wartości portfela zapisanego uruchomienia (bez zmiany kolejności LRU)."""
+        packed = self._runs[key]["packed"]
+        return pd.Series(packed["value"], index=pd.DatetimeIndex(packed["dates"]), name=self.describe(key))
+
+    def describe(self, key):
+        """Krótki opis wpisu do list wyboru."""
+        entry = self._runs[key]
+        config = entry["config"]
+        label = entry["label"] or ("TREND " + str(config["trend_strategy_type"]) if config["trend_active"] else "stała alokacja")
+        return (f"#{entry['number']} {time.strftime('%H:%M:%S', time.localtime(entry['created']))} · "
+                f"{label} · {entry['final_value']:,.0f} EUR")
+
+    def keys(self):
+        """Klucze od najnowszego do najstarszego (wg ostatniego użycia)."""
+        return list(reversed(self._runs))
+
+    def summary(self):
+        """Tabela porównawcza wszystkich wpisów."""
+        rows = []
+        for key in self.keys():
+            entry = self._runs[key]
+            config = entry["config"]
+            rows.append({
+                "Uruchomienie": self.describe(key),
+                "Zainwestowane (EUR)": entry["invested"],
+                "Wartość końcowa (EUR)": entry["final_value"],
+                "Zysk (%)": (entry["final_value"] / entry["invested"] - 1) * 100 if entry["invested"] else np.nan,
+                "Zakupy": config["purchase_freq"],
+                "TREND": config["trend_active"],
+            })
+        return pd.DataFrame(rows)
@@ -0,0 +1,247 @@
+"""
+Przyrostowe dołączanie nowych notowań LBMA bez ponownego parsowania całego pliku.
+
+Nowe fixingi trafiają do katalogu aktualizacji jako małe pliki CSV (delta)
+w formacie lbma_data.csv. PriceStore sprawdza je, dopisuje do pliku głównego
+i do cen w pamięci, zamiast wczytywać cały plik od nowa. Struktury pochodne
+używane przez aplikację - ceny miesięczne podglądu (preview.coarse_prices)
+i sumy prefiksowe korelacji (analysis.ReturnSums) - są rozszerzane tylko
+o nowe wiersze. Numer wersji i klucze danych (version_key, data_key)
+pozwalają buforom wyników odróżnić wyniki, których dopisanie nie dotyczy.
+
+Przykład (z linii poleceń):
+    python ingest.py fixing_2025-01-02.csv
+"""
+
+import argparse
+import copy
+import os
+import sys
+import threading
+
+import pandas as pd
+
+from analysis import ReturnSums
+from engine import REQUIRED_COLUMNS, asset_columns, asset_names, load_prices, price_fixes
+from preview import coarse_prices, extend_coarse_prices
+
+UPDATES_DIR = "lbma_updates"
+
+
+def read_delta(path, columns=REQUIRED_COLUMNS):
+    """
+    Wczytuje i sprawdza plik z nowymi notowaniami.
+
+    Parameters:
+    -----------
+    path : str
+        Ścieżka do pliku CSV (kolumny jak w lbma_data.csv)
+    columns : list
+        Wymagane kolumny cen (jak w pliku głównym)
+
+    Returns:
+    --------
+    pd.DataFrame
+        Nowe notowania (wiersze z brakami są pomijane, jak w load_prices)
+
+    Raises:
+    -------
+    ValueError
+        Gdy brakuje kolumn albo daty nie są rosnące lub się powtarzają
+    """
+    delta = pd.read_csv(path, parse_dates=True, index_col=0)
+    missing_columns = [col for col in columns if col not in delta.columns]
+    if missing_columns:
+        raise ValueError(f"{path}: brakujące kolumny: {', '.join(missing_columns)}")
+    if delta.index.has_duplicates:
+        duplicated = delta.index[delta.index.duplicated()].strftime("%Y-%m-%d")
+        raise ValueError(f"{path}: zduplikowane daty: {', '.join(duplicated[:5])}")
+    if not delta.index.is_monotonic_increasing:
+        raise ValueError(f"{path}: daty nie są uporządkowane rosnąco")
+    return delta[columns].dropna()
+
+
+class PriceStore:
+    """
+    Ceny metali rozszerzalne o nowe notowania.
+
+    Attributes:
+    -----------
+    data : pd.DataFrame
+        Ceny metali (jak z load_prices)
+    columns : list
+        Kolumny cen aktywów (engine.asset_names)
+    version : int
+        Numer wersji danych (zwiększany przy każdym dopisaniu)
+    """
+
+    def __init__(self, path="lbma_data.csv", updates_dir=None):
+        self.path = path
+        self.updates_dir = updates_dir
+        self.data = load_prices(path)
+        self.version = 0
+        self._lock = threading.RLock()
+        stat = os.stat(path)
+        # Identyfikator pliku bazowego - kolejne dopisania nie zmieniają wcześniejszych wierszy
+        self.base_id = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        self.columns = asset_columns(asset_names(self.data))
+        self._coarse = None
+        self._return_sums = None
+
+    @property
+    def last_date(self):
+        return self.data.index[-1]
+
+    @property
+    def coarse(self):
+        """Ceny miesięczne podglądu (preview.coarse_prices), rozszerzane przy dopisaniu."""
+        with self._lock:
+            if self._coarse is None:
+                self._coarse = coarse_prices(self.data)
+            return self._coarse
+
+    @property
+    def return_sums(self):
+        """Sumy prefiksowe zwrotów do korelacji (analysis.ReturnSums), rozszerzane przy dopisaniu."""
+        with self._lock:
+            if self._return_sums is None:
+                self._return_sums = ReturnSums(self.data)
+            return self._return_sums
+
+    @property
+    def version_key(self):
+        """Klucz bieżącej wersji danych (do buforowania analiz całej historii)."""
+        return (self.base_id, self.version)
+
+    def data_key(self, end_date):
+        """
+        Klucz danych dla wyników kończących się w end_date.
+
+        Wynik symulacji zależy od notowań do end_date oraz od pierwszego
+        notowania po nim (wybór najbliższej daty). Dopóki ten wiersz istnieje,
+        dopisanie nowych danych nie zmienia klucza - zapisane wyniki pozostają ważne.
+
+        Parameters:
+        -----------
+        end_date : datetime
+            Data końcowa symulacji
+
+        Returns:
+        --------
+        tuple
+            (identyfikator pliku bazowego, liczba wierszy, od których zależy wynik)
+        """
+        pos = self.data.index.searchsorted(pd.Timestamp(end_date), side="right")
+        needed = int(pos) + 1
+        # Brak wiersza po end_date: wynik zależy od przyszłych notowań
+        return (self.base_id, needed if needed <= len(self.data) else ("latest", self.version))
+
+    # ---- dopisywanie ----
+
+    def append(self, delta, persist=True):
+        """
+        Dopisuje nowe notowania.
+
+        Parameters:
+        -----------
+        delta : pd.DataFrame
+            Nowe notowania (np. z read_delta)
+        persist : bool
+            Czy dopisać wiersze na końcu pliku z danymi
+
+        Returns:
+        --------
+        int
+            Liczba dopisanych wierszy
+
+        Raises:
+        -------
+        ValueError
+            Gdy nowe daty nie są późniejsze od ostatniej znanej daty
+        """
+        with self._lock:
+            return self._append(delta, persist)
+
+    def _append(self, delta, persist):
+        if delta.empty:
+            return 0
+        if delta.index[0] <= self.last_date:
+            raise ValueError(
+                f"Nowe notowania muszą zaczynać się po {self.last_date:%Y-%m-%d} "
+                f"(pierwsza data w pliku: {delta.index[0]:%Y-%m-%d})"
+            )
+        if price_fixes(self.data):
+            raise ValueError("Przyrostowe dopisywanie obsługuje tylko dane z jednym notowaniem dziennie.")
+        delta = delta[self.columns]
+
+        if persist:
+            with open(self.path, "rb+") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+            delta.to_csv(self.path, mode="a", header=False, date_format="%Y-%m-%d")
+
+        last_date = self.last_date
+        self.data = pd.concat([self.data, delta])
+        # Struktury pochodne - tylko nowe wiersze (jeśli były już policzone)
+        if self._coarse is not None:
+            self._coarse = extend_coarse_prices(self._coarse, self.data, last_date)
+        if self._return_sums is not None:
+            # Kopia - sesje czytające poprzednie sumy nie widzą częściowo rozszerzonych tablic
+            self._return_sums = copy.copy(self._return_sums).extend(self.data)
+        self.version += 1
+        return len(delta)
+
+    def refresh(self, persist=True):
+        """
+        Dopisuje wszystkie oczekujące pliki z katalogu aktualizacji.
+
+        Przetworzone pliki otrzymują rozszerzenie .done; plik z błędem
+        otrzymuje rozszerzenie .rejected, a opis błędu trafia do wyniku.
+
+        Returns:
+        --------
+        tuple
+            (liczba dopisanych wierszy, lista komunikatów o błędach)
+        """
+        if not self.updates_dir or not os.path.isdir(self.updates_dir):
+            return 0, []
+        with self._lock:
+            return self._refresh(persist)
+
+    def _refresh(self, persist):
+        added, errors = 0, []
+        for name in sorted(os.listdir(self.updates_dir)):
+            if not name.endswith(".csv"):
+                continue
+            path = os.path.join(self.updates_dir, name)
+            try:
+                added += self.append(read_delta(path, self.columns), persist=persist)
+                os.replace(path, path + ".done")
+            except ValueError as e:
+                errors.append(str(e))
+                os.replace(path, path + ".rejected")
+        return added, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dopisuje nowe notowania LBMA do pliku z danymi.")
+    parser.add_argument("deltas", nargs="+", help="Pliki CSV z nowymi notowaniami")
+    parser.add_argument("--data", default="lbma_data.csv", help="Plik z cenami metali")
+    args = parser.parse_args(argv)
+
+    store = PriceStore(args.data)
+    for path in args.deltas:
+        try:
+            count = store.append(read_delta(path, store.columns))
+        except ValueError as e:
+            print(f"Odrzucono {path}: {e}", file=sys.stderr)
+            return 1
+        print(f"{path}: dopisano {count} wierszy (ostatnia data: {store.last_date:%Y-%m-%d})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+"""
+Zadania w tle: długie analizy liczone poza przebiegiem skryptu Streamlit.
+
+JobRunner przyjmuje zadania (funkcje analiz), wykonuje je w puli wątków,
+udostępnia postęp i pozwala je anulować. Wyniki zakończonych zadań zapisywane
+są na dysku (katalog zadania: job.json + pliki wyników), więc można je odebrać
+później - także po przeładowaniu strony lub ponownym uruchomieniu aplikacji.
+Zadanie może mieć właściciela (np. token sesji przeglądarki): jobs(owner=...)
+zwraca wtedy tylko zadania zlecone z tym tokenem.
+
+Funkcja zadania przyjmuje argumenty analizy oraz nazwane progress i cancel:
+
+    def my_job(data, config, progress, cancel):
+        for k in range(n):
+            ...
+            progress(k + 1, n, "opis")   # zgłasza SimulationCancelled po anulowaniu
+        return {"wynik": frame}          # DataFrame lub słownik DataFrame
+
+Wyniki zapisywane są jako pliki pickle pandas - katalog zadań jest lokalny
+i tworzony wyłącznie przez aplikację.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from engine import SimulationCancelled, simulate, summarize
+from optimize import walk_forward, window_config
+from sensitivity import sensitivity_analysis
+
+RESULTS_DIR = "zadania"
+
+# Stany zadania
+QUEUED, RUNNING, DONE, FAILED, CANCELLED, INTERRUPTED = (
+    "queued", "running", "done", "failed", "cancelled", "interrupted"
+)
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+STATUS_LABELS = {
+    QUEUED: "⏳ w kolejce",
+    RUNNING: "⚙️ w toku",
+    DONE: "✅ gotowe",
+    FAILED: "❌ błąd",
+    CANCELLED: "⛔ anulowane",
+    INTERRUPTED: "⚠️ przerwane (restart aplikacji)",
+}
+
+
+class JobRunner:
+    """
+    Kolejka zadań w tle z postępem, anulowaniem i zapisem wyników na dysk.
+
+    Parameters:
+    -----------
+    results_dir : str
+        Katalog wyników (podkatalog na zadanie)
+    max_workers : int
+        Liczba zadań wykonywanych jednocześnie
+    """
+
+    def __init__(self, results_dir=RESULTS_DIR, max_workers=1):
+        self.results_dir = results_dir
+        os.makedirs(results_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._cancel = {}
+        self._futures = {}
+        self._load()
+
+    # ---- zapis stanu ----
+
+    def _dir(self, job_id):
+        return os.path.join(self.results_dir, job_id)
+
+    def _save(self, job):
+        """Zapisuje job.json (atomowo - plik tymczasowy i zamiana)."""
+        path = os.path.join(self._dir(job["id"]), "job.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(tmp, path)
+
+    def _load(self):
+        """Wczytuje zadania zapisane przez wcześniejsze uruchomienia aplikacji."""
+        for name in os.listdir(self.results_dir):
+            path = os.path.join(self.results_dir, name, "job.json")
+            if not os.path.isfile(path):
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if job["status"] in ACTIVE_STATES:
+                # Zadanie przerwane zamknięciem poprzedniego procesu
+                job["status"] = INTERRUPTED
+                job["finished"] = job.get("finished") or time.time()
+                self._save(job)
+            self._jobs[job["id"]] = job
+
+    def _update(self, job_id, **changes):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(changes)
+            snapshot = dict(job)
+        self._save(snapshot)
+
+    # ---- zlecanie i wykonanie ----
+
+    def submit(self, kind, fn, *args, label=None, params=None, owner=None, **kwargs):
+        """
+        Zleca zadanie fn(*args, progress=..., cancel=..., **kwargs).
+
+        Parameters:
+        -----------
+        kind : str
+            Rodzaj zadania (np. "walk_forward")
+        fn : callable
+            Funkcja zadania zwracająca DataFrame lub słownik DataFrame
+        label : str or None
+            Opis wyświetlany na liście zadań
+        params : dict or None
+            Parametry zapisywane w job.json (do opisu wyniku)
+        owner : str or None
+            Token właściciela zapisywany w job.json (filtr jobs(owner=...))
+
+        Returns:
+        --------
+        str
+            Identyfikator zadania
+        """
+        job_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "owner": owner,
+            "label": label or kind,
+            "params": params or {},
+            "status": QUEUED,
+            "progress": 0.0,
+            "message": "",
+            "created": time.time(),
+            "started": None,
+            "finished": None,
+            "error": None,
+            "files": [],
+        }
+        os.makedirs(self._dir(job_id), exist_ok=True)
+        self._save(job)
+        with self._lock:
+            self._jobs[job_id] = job
+            self._cancel[job_id] = threading.Event()
+            self._futures[job_id] = self._executor.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        cancel = self._cancel[job_id]
+        if cancel.is_set():
+            self._update(job_id, status=CANCELLED, finished=time.time())
+            return
+        self._update(job_id, status=RUNNING, started=time.time())
+
+        last_saved = [0.0]
+
+        def progress(done, total, message=""):
+            if cancel.is_set():
+                raise SimulationCancelled()
+            fraction = min(done / total, 1.0) if total else 0.0
+            with self._lock:
+                self._jobs[job_id].update(progress=fraction, message=message)
+            # Postęp na dysku najwyżej raz na sekundę
+            now = time.time()
+            if now - last_saved[0] >= 1.0:
+                last_saved[0] = now
+                self._update(job_id)
+
+        try:
+            result = fn(*args, progress=progress, cancel=cancel, **kwargs)
+            files = self._write_result(job_id, result)
+            self._update(job_id, status=DONE, progress=1.0, files=files, finished=time.time())
+        except SimulationCancelled:
+            self._update(job_id, status=CANCELLED, finished=time.time())
+        except Exception as e:
+            self._update(job_id, status=FAILED, error=f"{type(e).__name__}: {e}", finished=time.time())
+
+    def _write_result(self, job_id, result):
+        frames = result if isinstance(result, dict) else {"wynik": result}
+        names = []
+        for name, frame in frames.items():
+            frame.to_pickle(os.path.join(self._dir(job_id), f"{name}.pkl"))
+            names.append(name)
+        return names
+
+    # ---- odczyt stanu ----
+
+    def status(self, job_id):
+        """Kopia stanu zadania (słownik jak job.json)."""
+        with self._lock:
+            return dict(self._jobs[job_id])
+
+    def jobs(self, owner=None):
+        """Stany zadań (wszystkich lub zleconych przez właściciela owner), od najnowszego."""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if owner is None or job.get("owner") == owner]
+            return sorted((dict(job) for job in jobs), key=lambda job: job["created"], reverse=True)
+
+    def active(self, owner=None):
+        """Zadania w kolejce lub w toku (wszystkie lub zlecone przez właściciela owner)."""
+        return [job for job in self.jobs(owner) if job["status"] in ACTIVE_STATES]
+
+    def result(self, job_id):
+        """
+        Wczytuje wynik zakończonego zadania z dysku.
+
+        Returns:
+        --------
+        dict
+            Nazwa -> DataFrame
+
+        Raises:
+        -------
+        ValueError
+            Gdy zadanie nie zakończyło się powodzeniem
+        """
+        job = self.status(job_id)
+        if job["status"] != DONE:
+            raise ValueError(f"Zadanie {job_id} nie ma wyniku (stan: {job['status']}).")
+        return {name: pd.read_pickle(os.path.join(self._dir(job_id), f"{name}.pkl")) for name in job["files"]}
+
+    # ---- sterowanie ----
+
+    def cancel(self, job_id):
+        """
+        Anuluje zadanie (w kolejce - od razu, w toku - przy najbliższym zgłoszeniu postępu).
+
+        Returns:
+        --------
+        bool
+            Czy zadanie było aktywne
+        """
+        with self._lock:
+            active = self._jobs[job_id]["status"] in ACTIVE_STATES
+            event = self._cancel.get(job_id)
+            future = self._futures.get(job_id)
+        if not active or event is None:
+            return False
+        event.set()
+        if future is not None and future.cancel():
+            self._update(job_id, status=CANCELLED, finished=time.time())
+        return True
+
+    def delete(self, job_id):
+        """Usuwa zakończone zadanie wraz z plikami wyników."""
+        with self._lock:
+            if self._jobs[job_id]["status"] in ACTIVE_STATES:
+                raise ValueError("Nie można usunąć aktywnego zadania - najpierw je anuluj.")
+            del self._jobs[job_id]
+            self._cancel.pop(job_id, None)
+            self._futures.pop(job_id, None)
+        shutil.rmtree(self._dir(job_id), ignore_errors=True)
+
+    def shutdown(self):
+        with self._lock:
+            for event in self._cancel.values():
+                event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# =========================================
+# Funkcje zadań
+# =========================================
+
+def rolling_windows_job(data, config, years=10, step_months=12, progress=None, cancel=None):
+    """
+    Wyniki strategii dla kolejnych okien o stałej długości (start co step_months).
+
+    Okna zaczynają się od pierwszego notowania i kończą najpóźniej w dniu
+    ostatniego notowania; pozostałe parametry pochodzą z config.
+
+    Returns:
+    --------
+    pd.DataFrame
+        Wiersz na okno: początek, koniec, zainwestowane, wartość końcowa,
+        CAGR i maksymalne obsunięcie
+    """
+    first, last = data.index.min(), data.index.max()
+    starts = []
+    start = first
+    while start + pd.DateOffset(years=years) <= last:
+        starts.append(start)
+        start += pd.DateOffset(months=step_months)
+
+    # Parametry TREND przechodzą z config (window_config włącza TREND, gdy podano strategię)
+    params = {"trend_strategy_type": config["trend_strategy_type"]} if config["trend_active"] else {}
+    rows = []
+    for k, start in enumerate(starts):
+        end = start + pd.DateOffset(years=years)
+        window = window_config(config, params, start, end)
+        result, _ = simulate(data, window, cancel=cancel)
+        metrics = summarize(result, window["storage_fee"], window["vat"])
+        rows.append({
+            "start": start,
+            "end": end,
+            "invested": metrics["invested"],
+            "final_value": metrics["final_value"],
+            "cagr": metrics["cagr"],
+            "max_drawdown": metrics["max_drawdown"],
+        })
+        if progress is not None:
+            progress(k + 1, len(starts), f"okno {k + 1}/{len(starts)}: {start:%Y-%m}")
+    return {"okna": pd.DataFrame(rows)}
+
+
+def walk_forward_job(data, config, fit_years=5, test_years=1, start=None, progress=None, cancel=None):
+    """Walk-forward parametrów TREND (optimize.walk_forward) w jednym procesie."""
+    return {"walk_forward": walk_forward(
+        data, config, start=start, fit_years=fit_years, test_years=test_years, workers=1, progress=progress
+    )}
+
+
+def sensitivity_job(data, config, delta=1.0, use_trend=None, progress=None, cancel=None):
+    """Analiza wrażliwości na koszty (sensitivity.sensitivity_analysis)."""
+    return {"wrazliwosc": sensitivity_analysis(
+        data, config, delta=delta, use_trend=use_trend, progress=progress, cancel=cancel
+    )}
@@ -0,0 +1,346 @@
+"""
+Optymalizacja parametrów strategii TREND metodą walk-forward.
+
+Dla kolejnych okien czasowych parametry dobierane są na oknie k (fit)
+i sprawdzane na oknie k+1 (test). Przeszukiwanie siatki odbywa się metodą
+successive halving: wszystkie kombinacje dostają najpierw tani, zgrubny
+przebieg (preview.simulate_coarse na cenach miesięcznych, z wynikami
+strategii liczonymi na cenach dziennych w dniach zakupów) na końcowym
+fragmencie okna, a pełną symulację dzienną na całym oknie tylko najlepsze
+z nich.
+
+Przykład:
+    python optimize.py --start 1995-01-01 --fit-years 5 --test-years 2 --workers 8
+"""
+
+import argparse
+import itertools
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from engine import DATE_KEYS, asset_names, load_prices, normalize_config, simulate, summarize
+from preview import coarse_calendar, coarse_prices, simulate_coarse
+from strategies import STRATEGIES
+
+TREND_PERIODS = ["last_purchase", 7, 30, 90, 365]
+TREND_STRATEGIES = list(STRATEGIES)
+MAX_ALLOCATION_CHANGES = [25, 50, 100]
+# Wzorce przydziału TREND dla 4 miejsc rankingu (scale_priorities dopasowuje je do liczby aktywów)
+TREND_PRIORITY_SETS = [
+    (40, 30, 20, 10),
+    (50, 30, 15, 5),
+    (70, 20, 10, 0),
+    (100, 0, 0, 0),
+    (25, 25, 25, 25),
+]
+
+# Domyślny limit procesów walk_forward (workers=None), niezależnie od liczby rdzeni hosta
+MAX_DEFAULT_WORKERS = 8
+
+# Minimalna długość przebiegu zgrubnego (krótsze okresy dają zbyt zaszumione CAGR)
+MIN_COARSE_DAYS = 365
+
+# Dane cenowe procesu roboczego (dzienne i miesięczne dla przebiegów zgrubnych)
+_DATA = None
+_COARSE = None
+
+
+def scale_priorities(template, n_assets):
+    """
+    Przeskalowuje wzorzec przydziału TREND na n_assets miejsc rankingu.
+
+    Wzorzec traktowany jest jak rozkład udziałów na odcinku [0, 1] miejsc
+    rankingu (każde miejsce wzorca - równy odcinek); miejsce k z n_assets
+    dostaje udział z odcinka [k/n, (k+1)/n]. Wynik to liczby całkowite
+    o sumie 100 (metoda największych reszt), np. (40, 30, 20, 10) dla
+    2 aktywów to [70, 30], a dla 8 - [20, 20, 15, 15, 10, 10, 5, 5].
+    """
+    width = len(template)
+    shares = []
+    for k in range(n_assets):
+        lo, hi = k * width / n_assets, (k + 1) * width / n_assets
+        share = 0.0
+        for j, value in enumerate(template):
+            share += value * max(0.0, min(hi, j + 1) - max(lo, j))
+        shares.append(share * 100 / sum(template))
+    result = [math.floor(share) for share in shares]
+    by_remainder = sorted(range(n_assets), key=lambda k: (round(result[k] - shares[k], 9), k))
+    for k in by_remainder[:100 - sum(result)]:
+        result[k] += 1
+    return result
+
+
+def trend_grid(periods=TREND_PERIODS, strategies=TREND_STRATEGIES,
+               max_changes=MAX_ALLOCATION_CHANGES, priority_sets=TREND_PRIORITY_SETS, n_assets=None):
+    """
+    Buduje siatkę kombinacji parametrów TREND.
+
+    Przy podanym n_assets wzorce priority_sets są przeskalowane na tyle miejsc
+    rankingu (scale_priorities), a powtarzające się po przeskalowaniu - pominięte.
+
+    Returns:
+    --------
+    list
+        Lista słowników z kluczami trend_period, trend_strategy_type,
+        max_allocation_change i trend_priorities
+    """
+    if n_assets is not None:
+        priority_sets = list(dict.fromkeys(tuple(scale_priorities(p, n_assets)) for p in priority_sets))
+    return [
+        {
+            "trend_period": period,
+            "trend_strategy_type": strategy,
+            "max_allocation_change": max_change,
+            "trend_priorities": list(priorities),
+        }
+        for period, strategy, max_change, priorities
+        in itertools.product(periods, strategies, max_changes, priority_sets)
+    ]
+
+
+def walk_forward_windows(data, start, end, fit_years, test_years):
+    """
+    Wyznacza kolejne pary okien (fit, test).
+
+    Okna testowe następują bezpośrednio po oknach dopasowania i nie nakładają
+    się na siebie; kolejne okno fit przesuwa się o długość okna testowego.
+
+    Returns:
+    --------
+    list
+        Lista krotek (fit_start, fit_end, test_start, test_end)
+    """
+    start = max(pd.Timestamp(start), data.index.min())
+    end = min(pd.Timestamp(end), data.index.max()) if end is not None else data.index.max()
+
+    windows = []
+    fit_start = start
+    while True:
+        fit_end = fit_start + pd.DateOffset(years=fit_years)
+        test_end = fit_end + pd.DateOffset(years=test_years)
+        if test_end > end:
+            break
+        windows.append((fit_start, fit_end, fit_end, test_end))
+        fit_start = fit_start + pd.DateOffset(years=test_years)
+    return windows
+
+
+def window_config(base_config, params, start, end):
+    """
+    Tworzy konfigurację symulacji dla jednego okna i jednej kombinacji parametrów.
+
+    Daty ReBalancingu zachowują dzień i miesiąc z konfiguracji bazowej,
+    a rok jest przesuwany na początek okna.
+    """
+    raw = dict(base_config)
+    raw.update(params)
+    raw["trend_active"] = params is not None and "trend_strategy_type" in params
+    raw["initial_date"] = start
+    raw["end_purchase_date"] = end
+    for n in (1, 2):
+        template = base_config.get(f"rebalance_{n}_start")
+        if template is not None:
+            template = pd.Timestamp(template)
+            raw[f"rebalance_{n}_start"] = pd.Timestamp(start.year, template.month, template.day)
+        else:
+            raw[f"rebalance_{n}_start"] = None
+    return normalize_config(raw, _DATA)
+
+
+def _init_worker(data):
+    global _DATA, _COARSE
+    _DATA = data
+    _COARSE = coarse_prices(data)
+
+
+def _evaluate(base_config, params, start, end, metric, coarse=False):
+    """Wynik jednej symulacji (np. CAGR) dla okna [start, end]; coarse - przebieg na cenach miesięcznych."""
+    config = window_config(base_config, params, start, end)
+    if coarse:
+        result = simulate_coarse(_COARSE, coarse_calendar(_COARSE.index, config), config, data=_DATA)
+    else:
+        result, _ = simulate(_DATA, config)
+    return summarize(result, config["storage_fee"], config["vat"])[metric]
+
+
+def _map(pool, tasks, workers=1):
+    if pool is None:
+        return [_evaluate(*task) for task in tasks]
+    return list(pool.map(_evaluate, *zip(*tasks), chunksize=max(1, len(tasks) // (4 * workers))))
+
+
+def successive_halving(pool, base_config, grid, fit_start, fit_end, eta=3, rungs=3, metric="cagr",
+                       workers=1, progress=None):
+    """
+    Wybiera najlepszą kombinację parametrów w oknie metodą successive halving.
+
+    W szczeblach r < rungs-1 każdy kandydat jest symulowany zgrubnie
+    (preview.simulate_coarse, ceny miesięczne) na końcowym fragmencie okna
+    o długości 1/eta^(rungs-1-r); do kolejnego szczebla przechodzi 1/eta
+    najlepszych wraz z kandydatami o równym wyniku. Wyniki strategii
+    (prosta, momentum, MACD) przebieg zgrubny liczy na cenach dziennych
+    w dniach zakupów, więc szczeble zgrubne rozróżniają także oś strategii.
+    Ostatni szczebel to pełna symulacja dzienna na całym oknie.
+    progress(szczebel, liczba szczebli) wywoływana jest po każdym szczeblu.
+
+    Returns:
+    --------
+    tuple
+        (najlepsze parametry, wynik na pełnym oknie, liczba wykonanych symulacji)
+    """
+    candidates = list(grid)
+    total_days = (fit_end - fit_start).days
+    evaluations = 0
+    scores = []
+
+    for rung in range(rungs):
+        fraction = eta ** -(rungs - 1 - rung)
+        days = total_days if rung == rungs - 1 else max(int(total_days * fraction), MIN_COARSE_DAYS)
+        rung_start = max(fit_start, fit_end - pd.Timedelta(days=days))
+
+        coarse = rung < rungs - 1
+        scores = _map(pool, [(base_config, params, rung_start, fit_end, metric, coarse) for params in candidates],
+                      workers)
+        evaluations += len(candidates)
+        if progress is not None:
+            progress(rung + 1, rungs)
+
+        if coarse:
+            keep = max(1, math.ceil(len(candidates) / eta))
+            cutoff = sorted(scores, reverse=True)[keep - 1]
+            candidates = [params for score, params in zip(scores, candidates) if score >= cutoff]
+            scores = None
+
+    best_score, best_idx = max(zip(scores, range(len(candidates))), key=lambda x: x[0])
+    return candidates[best_idx], best_score, evaluations
+
+
+def walk_forward(data, base_config=None, start=None, end=None, fit_years=5, test_years=1,
+                 grid=None, eta=3, rungs=3, metric="cagr", workers=None, progress=None):
+    """
+    Walk-forward: dobór parametrów TREND na oknie k, test na oknie k+1.
+
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Ceny metali
+    base_config : dict or None
+        Parametry wspólne (koszty, zakupy, ReBalancing); domyślnie DEFAULT_CONFIG
+        dopasowana do aktywów w danych (normalize_config)
+    start, end : datetime or None
+        Zakres analizy (domyślnie cała historia)
+    fit_years, test_years : int
+        Długości okien dopasowania i testu
+    grid : list or None
+        Kombinacje parametrów (domyślnie trend_grid() dla liczby aktywów w danych)
+    eta : int
+        Współczynnik redukcji kandydatów między szczeblami
+    rungs : int
+        Liczba szczebli successive halving
+    metric : str
+        Klucz z summarize() maksymalizowany przy doborze ("cagr", "final_value", ...)
+    workers : int or None
+        Liczba procesów (1 = bez puli procesów); domyślnie liczba rdzeni,
+        najwyżej MAX_DEFAULT_WORKERS
+    progress : callable or None
+        Wywoływana po każdym oknie jako progress(gotowe, wszystkie, opis);
+        wyjątek zgłoszony przez progress przerywa analizę (np. jobs.JobRunner.cancel)
+
+    Returns:
+    --------
+    pd.DataFrame
+        Wiersz na okno: najlepsze parametry, wynik fit, wynik test
+        i wynik testu dla stałej alokacji (bez TREND)
+    """
+    # Parametry per aktywo i priorytety TREND dopasowane do danych; daty
+    # pozostają jak podane (okna ustawiają własne daty startu i ReBalancingu)
+    raw = dict(base_config or {})
+    base_config = {**normalize_config(raw, data), **{key: raw.get(key) for key in DATE_KEYS}}
+    grid = grid if grid is not None else trend_grid(n_assets=len(asset_names(data)))
+    windows = walk_forward_windows(data, start or data.index.min(), end, fit_years, test_years)
+    workers = workers or min(os.cpu_count() or 1, MAX_DEFAULT_WORKERS)
+
+    _init_worker(data)
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data,)) if workers > 1 else None
+
+    rows = []
+    try:
+        for fold, (fit_start, fit_end, test_start, test_end) in enumerate(windows):
+            started = time.perf_counter()
+            rung_progress = None
+            if progress is not None:
+                def rung_progress(done, total, fold=fold):
+                    progress(fold + done / (total + 1), len(windows),
+                             f"okno {fold + 1}/{len(windows)}: szczebel {done}/{total}")
+            best, fit_score, evaluations = successive_halving(
+                pool, base_config, grid, fit_start, fit_end, eta=eta, rungs=rungs, metric=metric,
+                workers=workers, progress=rung_progress
+            )
+            test_score, fixed_score = _map(pool, [
+                (base_config, best, test_start, test_end, metric),
+                (base_config, {}, test_start, test_end, metric),
+            ], workers)
+            rows.append({
+                "fold": fold,
+                "fit_start": fit_start,
+                "fit_end": fit_end,
+                "test_start": test_start,
+                "test_end": test_end,
+                **best,
+                "fit_" + metric: fit_score,
+                "test_" + metric: test_score,
+                "fixed_test_" + metric: fixed_score,
+                "evaluations": evaluations,
+                "seconds": time.perf_counter() - started,
+            })
+            if progress is not None:
+                progress(fold + 1, len(windows), f"okno {fold + 1}/{len(windows)}: {fit_start:%Y}-{test_end:%Y}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Walk-forward optymalizacja parametrów TREND.")
+    parser.add_argument("--data", default="lbma_data.csv", help="Plik z cenami metali")
+    parser.add_argument("--start", default=None, help="Początek analizy (RRRR-MM-DD)")
+    parser.add_argument("--end", default=None, help="Koniec analizy (RRRR-MM-DD)")
+    parser.add_argument("--fit-years", type=int, default=5, help="Długość okna dopasowania (lata)")
+    parser.add_argument("--test-years", type=int, default=1, help="Długość okna testowego (lata)")
+    parser.add_argument("--eta", type=int, default=3, help="Współczynnik redukcji successive halving")
+    parser.add_argument("--rungs", type=int, default=3, help="Liczba szczebli successive halving")
+    parser.add_argument("--metric", default="cagr", help="Optymalizowana metryka z summarize()")
+    parser.add_argument("--workers", type=int, default=None,
+                        help=f"Liczba procesów (domyślnie liczba rdzeni, najwyżej {MAX_DEFAULT_WORKERS})")
+    parser.add_argument("--out", default="walk_forward.csv", help="Plik wynikowy CSV")
+    args = parser.parse_args(argv)
+
+    data = load_prices(args.data)
+    started = time.perf_counter()
+    report = walk_forward(
+        data,
+        start=args.start,
+        end=args.end,
+        fit_years=args.fit_years,
+        test_years=args.test_years,
+        eta=args.eta,
+        rungs=args.rungs,
+        metric=args.metric,
+        workers=args.workers,
+    )
+    report.to_csv(args.out, index=False)
+    print(report[["fold", "test_start", "trend_strategy_type", "trend_period",
+                  "test_" + args.metric, "fixed_test_" + args.metric]].to_string(index=False))
+    print(f"Okna: {len(report)}, czas: {time.perf_counter() - started:.1f} s -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Tryb float32 silników wsadowych i kontrola jego błędu.
+
+batch.simulate_cost_batch() i book.simulate_fixed_book() mogą liczyć stan
+portfeli i historię zdarzeń w float32 (dtype=np.float32) - tablice wyników
+zajmują wtedy o połowę mniej pamięci. Funkcje check_* uruchamiają ten sam
+przebieg w float64 i float32 i raportują maksymalny błąd względny metryk
+podsumowania (engine.summarize) na tle budżetu błędu.
+
+Przykład:
+    python precision.py --clients 500 --variants 40
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from batch import simulate_cost_batch
+from book import simulate_fixed_book
+from engine import asset_names, load_prices, normalize_config, summarize
+
+# Dopuszczalny błąd względny metryk w trybie float32
+FLOAT32_BUDGET = 1e-4
+
+SUMMARY_METRICS = ["invested", "final_value", "cagr", "total_storage_cost", "max_drawdown"]
+
+# Stopy (ułamki) porównywane jako współczynniki 1 + x - błąd względny samej stopy
+# bliskiej zeru (np. CAGR 0,01%) nie mówi nic o dokładności wyniku
+RATE_METRICS = ["cagr", "max_drawdown"]
+
+
+def _summaries(results, configs):
+    return pd.DataFrame([
+        {metric: summarize(result, config["storage_fee"], config["vat"])[metric] for metric in SUMMARY_METRICS}
+        for result, config in zip(results, configs)
+    ], dtype=float)
+
+
+def _nbytes(results):
+    """Rozmiar kolumn liczbowych wyników (bez indeksu dat i opisów akcji)."""
+    return int(sum(result.select_dtypes("number").memory_usage(index=False).sum() for result in results))
+
+
+def relative_errors(reference, approx):
+    """
+    Maksymalny błąd względny każdej metryki (kolumny) między dwiema tabelami metryk.
+
+    Stopy (RATE_METRICS) porównywane są jako 1 + x; dla pozostałych wartości
+    bliskich zeru błąd liczony jest względem 1e-9.
+    """
+    shift = np.array([1.0 if column in RATE_METRICS else 0.0 for column in reference.columns])
+    ref = reference.to_numpy(dtype=float) + shift
+    err = np.abs(approx.to_numpy(dtype=float) + shift - ref) / np.maximum(np.abs(ref), 1e-9)
+    return pd.Series(np.nanmax(err, axis=0) if len(err) else np.zeros(ref.shape[1]), index=reference.columns)
+
+
+def _report(run, configs, budget):
+    timings, results = {}, {}
+    for name, dtype in (("float64", np.float64), ("float32", np.float32)):
+        started = time.perf_counter()
+        results[name] = run(dtype)
+        timings[name] = time.perf_counter() - started
+
+    errors = relative_errors(_summaries(results["float64"], configs), _summaries(results["float32"], configs))
+    return {
+        "errors": errors,
+        "max_error": float(errors.max()),
+        "budget": budget,
+        "within_budget": bool(errors.max() <= budget),
+        "seconds": timings,
+        "nbytes": {name: _nbytes(frames) for name, frames in results.items()},
+    }
+
+
+def check_cost_batch(data, config, cost_overrides, use_trend=None, budget=FLOAT32_BUDGET):
+    """
+    Błąd float32 w batch.simulate_cost_batch() względem float64.
+
+    Returns:
+    --------
+    dict
+        "errors" (maks. błąd względny każdej metryki), "max_error", "budget",
+        "within_budget", "seconds" i "nbytes" (historia wyników) dla float64/float32
+    """
+    def run(dtype):
+        return simulate_cost_batch(data, config, cost_overrides, use_trend=use_trend,
+                                   keep_history=True, dtype=dtype)["results"]
+
+    configs = [{**config, **{k: v for k, v in override.items() if not isinstance(v, dict)}}
+               for override in cost_overrides]
+    return _report(run, configs, budget)
+
+
+def check_fixed_book(data, configs, budget=FLOAT32_BUDGET):
+    """Błąd float32 w book.simulate_fixed_book() względem float64 (format wyniku jak check_cost_batch)."""
+    return _report(lambda dtype: simulate_fixed_book(data, configs, dtype=dtype), configs, budget)
+
+
+def sample_configs(data, n, seed=0):
+    """Konfiguracje klientów do kontroli: różne starty, alokacje, harmonogramy i koszty."""
+    rng = np.random.default_rng(seed)
+    first = data.index.min() + pd.DateOffset(years=1)
+    span = (data.index.max() - first).days
+    assets = asset_names(data)
+    configs = []
+    for _ in range(n):
+        weights = rng.dirichlet(np.ones(len(assets)))
+        start = first + pd.Timedelta(days=int(rng.integers(0, span - 365)))
+        freq = rng.choice(["Tydzień", "Miesiąc", "Kwartał"])
+        configs.append(normalize_config({
+            "initial_date": start,
+            "end_purchase_date": start + pd.Timedelta(days=int(rng.integers(365, 25 * 365))),
+            "initial_allocation": float(rng.choice([0.0, 10000.0, 100000.0])),
+            "purchase_freq": freq,
+            "purchase_day": int(rng.integers(0, 5)) if freq == "Tydzień" else int(rng.integers(1, 29)),
+            "purchase_amount": float(rng.choice([100.0, 250.0, 1000.0])),
+            "allocation": dict(zip(assets, weights.tolist())),
+            "rebalance_1": bool(rng.random() < 0.7),
+            "rebalance_1_condition": bool(rng.random() < 0.5),
+            "storage_metal": rng.choice([*assets[:2], "ALL", "Best of year"]),
+            "storage_fee": float(rng.choice([0.5, 1.5, 2.5])),
+        }, data))
+    return configs
+
+
+def _print_report(title, report):
+    print(f"{title}: maks. błąd względny {report['max_error']:.2e} "
+          f"(budżet {report['budget']:.0e}: {'OK' if report['within_budget'] else 'PRZEKROCZONY'})")
+    for metric, error in report["errors"].items():
+        print(f"    {metric:20s} {error:.2e}")
+    s, b = report["seconds"], report["nbytes"]
+    print(f"    czas float64 {s['float64']:.2f} s, float32 {s['float32']:.2f} s; "
+          f"tablice wyników {b['float64'] / 1e6:.1f} MB -> {b['float32'] / 1e6:.1f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Błąd trybu float32 silników wsadowych względem float64.")
+    parser.add_argument("--data", default="lbma_data.csv", help="Plik z cenami metali")
+    parser.add_argument("--clients", type=int, default=200, help="Liczba klientów księgi (book)")
+    parser.add_argument("--variants", type=int, default=40, help="Liczba wariantów kosztów (batch)")
+    parser.add_argument("--budget", type=float, default=FLOAT32_BUDGET, help="Budżet błędu względnego")
+    args = parser.parse_args(argv)
+
+    data = load_prices(args.data)
+    config = normalize_config({"trend_active": True}, data)
+    overrides = [{"storage_fee": fee, "margins": {asset_names(data)[0]: margin}}
+                 for fee, margin in zip(np.linspace(0.5, 3.0, args.variants), np.linspace(10, 25, args.variants))]
+
+    batch_report = check_cost_batch(data, config, overrides, budget=args.budget)
+    _print_report(f"batch ({args.variants} wariantów kosztów, TREND)", batch_report)
+    book_report = check_fixed_book(data, sample_configs(data, args.clients), budget=args.budget)
+    _print_report(f"book ({args.clients} klientów)", book_report)
+    return 0 if batch_report["within_budget"] and book_report["within_budget"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
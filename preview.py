@@ -0,0 +1,322 @@
+"""
+Szybki, przybliżony podgląd wyników (tryb na żywo).
+
+simulate_coarse() przybliża engine.simulate() na jednym notowaniu na miesiąc:
+- zakupy cykliczne z danego miesiąca łączone są w jeden zakup,
+- ReBalancing wykonywany jest w miesiącu daty startowej (co roku),
+- koszty magazynowania pobierane są po cenach z ostatniego miesiąca roku,
+- TREND używa rankingu zmian cen miesięcznych (strategie momentum i MACD
+  przybliżane są strategią prostą), a gdy podano ceny dzienne (data) -
+  ocen zarejestrowanej strategii liczonych na cenach dziennych tylko
+  w dniach zakupów siatki miesięcznej.
+
+Refiner liczy w tle dokładną symulację dzienną; nowe zlecenie anuluje
+poprzednie, nieaktualne już zadanie.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from engine import PRICE_SUFFIX, apply_allocation_limit, asset_columns, asset_names, asset_vector, lookback_windows
+from strategies import STRATEGIES
+
+# Średnia długość miesiąca w dniach (okres TREND w miesiącach)
+DAYS_PER_MONTH = 30.4375
+
+
+def coarse_prices(data):
+    """Ceny aktywów z pierwszego dnia notowań każdego miesiąca."""
+    first_of_month = ~data.index.to_period("M").duplicated()
+    return data.loc[first_of_month, asset_columns(asset_names(data))]
+
+
+def extend_coarse_prices(coarse, data, last_date):
+    """
+    Dopisuje do cen miesięcznych nowe miesiące z notowań data po last_date.
+
+    Wiersze z miesiąca last_date nie zmieniają cen miesięcznych (pierwszy dzień
+    notowań tego miesiąca już w nich jest).
+    """
+    new = data.loc[data.index > last_date]
+    months = new.index.to_period("M")
+    first_of_month = ~months.duplicated() & (months != pd.Timestamp(last_date).to_period("M"))
+    return pd.concat([coarse, new.loc[first_of_month, coarse.columns]])
+
+
+def _purchase_dates(start, end, freq, day):
+    """Daty zakupów cyklicznych (jak engine.generate_purchase_dates, bez dopasowania do notowań)."""
+    if freq == "Tydzień":
+        first = start + pd.Timedelta(days=(int(day) - start.weekday()) % 7)
+        dates = pd.date_range(first, end, freq="7D")
+    elif freq in ("Miesiąc", "Kwartał"):
+        step = 1 if freq == "Miesiąc" else 3
+        first = start.replace(day=min(int(day), 28))
+        dates = pd.date_range(first, end, freq=pd.DateOffset(months=step))
+    else:
+        return pd.DatetimeIndex([])
+    return dates[dates >= start]
+
+
+def coarse_calendar(coarse_index, config):
+    """
+    Kalendarz zdarzeń na siatce miesięcznej.
+
+    Zależy tylko od dat, częstotliwości zakupów i dat ReBalancingu,
+    więc może być buforowany niezależnie od alokacji i kosztów.
+
+    Parameters:
+    -----------
+    coarse_index : pd.DatetimeIndex
+        Indeks cen miesięcznych (coarse_prices)
+    config : dict
+        Parametry symulacji
+
+    Returns:
+    --------
+    dict
+        "start", "stop" - zakres pozycji w indeksie miesięcznym,
+        "purchases" - liczba zakupów w miesiącu,
+        "rebalances" - lista (etykieta, maska miesięcy, warunek, próg)
+    """
+    start = pd.to_datetime(config["initial_date"])
+    end = pd.to_datetime(config["end_purchase_date"])
+    months = coarse_index.to_period("M").asi8
+
+    lo = max(int(np.searchsorted(months, start.to_period("M").ordinal, side="left")), 0)
+    hi = int(np.searchsorted(months, end.to_period("M").ordinal, side="right"))
+    lo = min(lo, len(months) - 1)
+    hi = max(hi, lo + 1)
+
+    purchase_months = _purchase_dates(start, end, config["purchase_freq"], config["purchase_day"]).to_period("M").asi8
+    positions = np.searchsorted(months, purchase_months)
+    positions = positions[(positions < len(months)) & (months[np.minimum(positions, len(months) - 1)] == purchase_months)]
+    purchases = np.bincount(positions, minlength=len(months)).astype(float)
+
+    rebalances = []
+    for n in (1, 2):
+        if config[f"rebalance_{n}"]:
+            rebalance_start = pd.to_datetime(config[f"rebalance_{n}_start"])
+            mask = (coarse_index.month == rebalance_start.month) & (
+                coarse_index.to_period("M").asi8 >= rebalance_start.to_period("M").ordinal
+            )
+            rebalances.append((
+                f"rebalance_{n}",
+                np.asarray(mask),
+                config[f"rebalance_{n}_condition"],
+                config[f"rebalance_{n}_threshold"],
+            ))
+
+    return {"start": lo, "stop": hi, "purchases": purchases, "rebalances": rebalances}
+
+
+def _rebalance(p, portfolio, alloc, buyback, markup, condition_enabled, threshold_percent, label):
+    total_value = float(p @ portfolio)
+    if total_value == 0:
+        return f"rebalancing_skipped_{label}_no_value"
+
+    shares = (p * portfolio) / total_value
+    if condition_enabled and not (np.abs(shares - alloc) * 100 >= threshold_percent).any():
+        return f"rebalancing_skipped_{label}_no_deviation"
+
+    target = total_value * alloc
+    for i in range(len(p)):
+        diff = p[i] * portfolio[i] - target[i]
+        if diff <= 0:
+            continue
+        sell_price = p[i] * (1 + buyback[i] / 100)
+        grams = min(diff / sell_price, portfolio[i])
+        portfolio[i] -= grams
+        cash = grams * sell_price
+        for j in range(len(p)):
+            needed = target[j] - p[j] * portfolio[j]
+            if needed > 0:
+                buy_price = p[j] * (1 + markup[j] / 100)
+                buy_grams = min(cash / buy_price, needed / buy_price)
+                portfolio[j] += buy_grams
+                cash -= buy_grams * buy_price
+                if cash <= 0:
+                    break
+    return label
+
+
+def _daily_trend_scores(data, coarse_dates, rows, start, config):
+    """Oceny strategii TREND (cenami dziennymi) dla wierszy zakupów siatki miesięcznej."""
+    positions = data.index.searchsorted(coarse_dates[rows])
+    previous = np.r_[data.index.searchsorted(coarse_dates[start]), positions[:-1]]
+    starts, period_days = lookback_windows(data.index, positions, previous, config["trend_period"])
+    score_fn = STRATEGIES.get(config["trend_strategy_type"], STRATEGIES["simple"])
+    prices = data[asset_columns(asset_names(data))].to_numpy(dtype=float)
+    scores = np.asarray(score_fn(prices, positions, starts, period_days), dtype=float)
+    return dict(zip(rows, scores.reshape(len(rows), prices.shape[1])))
+
+
+def simulate_coarse(coarse, calendar, config, use_trend=None, data=None):
+    """
+    Przybliżona symulacja portfela na cenach miesięcznych.
+
+    Parameters:
+    -----------
+    coarse : pd.DataFrame
+        Ceny miesięczne (coarse_prices)
+    calendar : dict
+        Kalendarz zdarzeń (coarse_calendar)
+    config : dict
+        Parametry symulacji
+    use_trend : bool or None
+        Czy użyć strategii TREND (None = config["trend_active"])
+    data : pd.DataFrame or None
+        Ceny dzienne, z których powstały ceny miesięczne; gdy podane, ranking
+        TREND pochodzi z oceny wybranej strategii (także momentum i MACD)
+        w dniach zakupów, a nie ze zmian cen miesięcznych
+
+    Returns:
+    --------
+    pd.DataFrame
+        Wynik w formacie engine.simulate() (bez historii TREND)
+    """
+    if use_trend is None:
+        use_trend = config["trend_active"]
+
+    index = coarse.index
+    assets = [col[:-len(PRICE_SUFFIX)] for col in coarse.columns]
+    prices = coarse.to_numpy(dtype=float)
+    years = index.year.to_numpy()
+    alloc = asset_vector(config["allocation"], assets)
+    margins = asset_vector(config["margins"], assets)
+    buyback = asset_vector(config["buyback_discounts"], assets)
+    markup = asset_vector(config["rebalance_markup"], assets)
+    priorities = np.zeros(len(assets))
+    priorities[:len(config["trend_priorities"])] = np.array(config["trend_priorities"], dtype=float)[:len(assets)] / 100
+    storage_fee, vat = config["storage_fee"], config["vat"]
+    storage_metal = config["storage_metal"]
+    purchase_amount = config["purchase_amount"]
+
+    trend_period = config["trend_period"]
+    period_months = None if trend_period == "last_purchase" else max(1, round(int(trend_period) / DAYS_PER_MONTH))
+
+    start, stop = calendar["start"], calendar["stop"]
+    purchases = calendar["purchases"]
+
+    daily_scores = None
+    if use_trend and data is not None:
+        rows = np.flatnonzero(purchases[start:stop]) + start
+        if len(rows):
+            daily_scores = _daily_trend_scores(data, index, rows, start, config)
+
+    portfolio = (config["initial_allocation"] * alloc) / (prices[start] * (1 + margins / 100))
+    invested = config["initial_allocation"]
+    history = [(start, invested, portfolio.copy(), "initial")]
+
+    previous_trend_alloc = None
+    last_purchase_row = start
+    year_start_row = start
+
+    for r in range(start, stop):
+        p = prices[r]
+        actions = []
+
+        # Koszty magazynowania za poprzedni rok (po cenach z ostatniego miesiąca roku)
+        if r > start and years[r] != years[r - 1]:
+            p_end = prices[r - 1]
+            storage_cost = invested * (storage_fee / 100) * (1 + vat / 100)
+            sell_price = p_end * (1 + buyback / 100)
+            if storage_metal == "ALL":
+                shares = (p_end * portfolio) / (p_end @ portfolio)
+                portfolio -= np.minimum(storage_cost * shares / sell_price, portfolio)
+            else:
+                if storage_metal == "Best of year":
+                    i = int(np.argmax(p_end / prices[year_start_row]))
+                else:
+                    i = assets.index(storage_metal)
+                portfolio[i] -= min(storage_cost / sell_price[i], portfolio[i])
+            history.append((r - 1, invested, portfolio.copy(), "storage_fee"))
+            year_start_row = r
+
+        if purchases[r]:
+            if use_trend:
+                if daily_scores is not None:
+                    changes = daily_scores[r]
+                else:
+                    lookback = r - last_purchase_row if period_months is None else period_months
+                    changes = p / prices[max(r - max(lookback, 1), 0)] - 1
+                weights = np.empty(len(assets))
+                weights[np.argsort(-changes, kind="stable")] = priorities
+                if previous_trend_alloc is not None and config["max_allocation_change"] < 100:
+                    limited = apply_allocation_limit(
+                        dict(zip(assets, weights)), previous_trend_alloc, config["max_allocation_change"]
+                    )
+                    weights = np.array([limited[m] for m in assets])
+                previous_trend_alloc = dict(zip(assets, weights))
+            else:
+                weights = alloc
+
+            amount = purchases[r] * purchase_amount
+            portfolio += (amount * weights) / (p * (1 + margins / 100))
+            invested += amount
+            actions.append("recurring")
+            last_purchase_row = r
+
+        for label, mask, condition_enabled, threshold in calendar["rebalances"]:
+            if mask[r]:
+                actions.append(_rebalance(p, portfolio, alloc, buyback, markup, condition_enabled, threshold, label))
+
+        if actions:
+            history.append((r, invested, portfolio.copy(), ", ".join(actions)))
+
+    positions = np.array([h[0] for h in history])
+    grams = np.array([h[2] for h in history])
+    values = (prices[positions] * (1 + buyback / 100) * grams).sum(axis=1)
+
+    return pd.DataFrame({
+        "Date": index[positions],
+        "Invested": [h[1] for h in history],
+        **{m: grams[:, i] for i, m in enumerate(assets)},
+        "Portfolio Value": values,
+        "Akcja": [h[3] for h in history],
+    }).set_index("Date")
+
+
+class Refiner:
+    """
+    Wykonuje dokładne symulacje w wątku roboczym.
+
+    Każde nowe zlecenie z innym kluczem ustawia sygnał przerwania
+    poprzedniego zadania, więc przy ciągłej zmianie parametrów liczona
+    jest tylko najnowsza konfiguracja.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="refiner")
+        self._lock = threading.Lock()
+        self._key = None
+        self._future = None
+        self._cancel = None
+
+    def submit(self, key, fn):
+        """
+        Zleca fn(cancel) dla klucza key.
+
+        Returns:
+        --------
+        concurrent.futures.Future
+            Bieżące zadanie (to samo, jeśli klucz się nie zmienił)
+        """
+        with self._lock:
+            if key == self._key and self._future is not None:
+                return self._future
+            if self._future is not None:
+                self._cancel.set()
+                self._future.cancel()
+            self._key = key
+            self._cancel = threading.Event()
+            self._future = self._executor.submit(fn, self._cancel)
+            return self._future
+
+    def shutdown(self):
+        with self._lock:
+            if self._cancel is not None:
+                self._cancel.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,119 @@
+"""
+Analiza wrażliwości wyniku na parametry kosztowe.
+
+Każdy parametr kosztowy (marże, ceny odkupu, narzuty ReBalancingu,
+opłata magazynowa, VAT) jest zmieniany o ±delta punktów procentowych.
+Wszystkie warianty liczone są jednym przebiegiem batch.simulate_cost_batch
+na wspólnym kalendarzu i tablicach cen (postęp i przerwanie zgłaszane
+są z pętli dni przebiegu).
+"""
+
+import numpy as np
+import pandas as pd
+
+from batch import simulate_cost_batch
+from engine import asset_names
+
+# Etykiety parametrów kosztowych (klucz konfiguracji -> nazwa w raporcie)
+COST_LABELS = {
+    "margins": "Marża",
+    "buyback_discounts": "Odkup od SPOT",
+    "rebalance_markup": "Narzut ReBalancing",
+    "storage_fee": "Opłata magazynowa",
+    "vat": "VAT",
+}
+
+
+def cost_parameters(config, assets=None):
+    """
+    Lista parametrów kosztowych konfiguracji.
+
+    Parameters:
+    -----------
+    config : dict
+        Parametry symulacji
+    assets : list or None
+        Aktywa (None = aktywa z parametrów marż w config)
+
+    Returns:
+    --------
+    list
+        Krotki (etykieta, klucz, metal lub None, wartość bazowa)
+    """
+    if assets is None:
+        assets = list(config["margins"])
+    params = []
+    for key in ("margins", "buyback_discounts", "rebalance_markup"):
+        for metal in assets:
+            params.append((f"{COST_LABELS[key]} {metal}", key, metal, config[key].get(metal, 0.0)))
+    for key in ("storage_fee", "vat"):
+        params.append((COST_LABELS[key], key, None, config[key]))
+    return params
+
+
+def _override(key, metal, value):
+    return {key: {metal: value}} if metal is not None else {key: value}
+
+
+def sensitivity_analysis(data, config, delta=1.0, use_trend=None, progress=None, cancel=None):
+    """
+    Wylicza zmianę wartości końcowej portfela przy zmianie każdego kosztu o ±delta pp.
+
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Ceny metali
+    config : dict
+        Parametry symulacji
+    delta : float
+        Wielkość zaburzenia w punktach procentowych
+    use_trend : bool or None
+        Czy użyć strategii TREND (None = config["trend_active"])
+    progress : callable or None
+        progress(dni, wszystkie dni, opis) wywoływane na przełomie każdego roku
+    cancel : threading.Event or None
+        Sygnał przerwania sprawdzany na przełomie każdego roku
+
+    Returns:
+    --------
+    pd.DataFrame
+        Wiersz na parametr: wartość bazowa, wartości końcowe przy -delta/+delta,
+        zmiany procentowe, elastyczność; posortowane malejąco wg rozpiętości
+
+    Raises:
+    -------
+    SimulationCancelled
+        Gdy sygnał cancel zostanie ustawiony w trakcie analizy
+    """
+    params = cost_parameters(config, asset_names(data))
+    overrides = [{}]
+    for _, key, metal, base in params:
+        overrides.append(_override(key, metal, base - delta))
+        overrides.append(_override(key, metal, base + delta))
+
+    values = simulate_cost_batch(
+        data, config, overrides, use_trend=use_trend, progress=progress, cancel=cancel
+    )["final_value"]
+    base_value = values[0]
+    low, high = values[1::2], values[2::2]
+    base_params = np.array([p[3] for p in params], dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Elastyczność: (dV/dp) * p / V, pochodna z różnicy centralnej
+        elasticity = ((high - low) / (2 * delta)) * base_params / base_value
+    elasticity = np.where(base_params == 0, np.nan, elasticity)
+
+    report = pd.DataFrame({
+        "Parametr": [p[0] for p in params],
+        "Wartość bazowa (%)": base_params,
+        "Wartość końcowa (-Δ)": low,
+        "Wartość końcowa (+Δ)": high,
+        "Zmiana (-Δ) %": (low / base_value - 1) * 100,
+        "Zmiana (+Δ) %": (high / base_value - 1) * 100,
+        "Elastyczność": elasticity,
+    })
+    report["Rozpiętość %"] = (report["Zmiana (+Δ) %"] - report["Zmiana (-Δ) %"]).abs()
+    report = report.sort_values("Rozpiętość %", ascending=False).reset_index(drop=True)
+    report.attrs["base_value"] = base_value
+    report.attrs["delta"] = delta
+    return report
@@ -0,0 +1,351 @@
+"""
+Lokalna usługa HTTP wokół silnika symulacji (bez interfejsu Streamlit).
+
+Endpointy (JSON):
+    GET  /health    - stan usługi, zakres danych, liczniki bufora
+    POST /simulate  - jedna konfiguracja -> metryki (historia zdarzeń przy ?events=1)
+    POST /batch     - lista konfiguracji lub {"defaults": {...}, "runs": [...]}
+                      -> strumień NDJSON: wiersz na symulację, w kolejności zakończenia
+
+Wsad łączony jest w przebiegi wektorowe: konfiguracje bez TREND liczone są
+jednym przebiegiem book.simulate_fixed_book(), a konfiguracje TREND różniące
+się wyłącznie kosztami - jednym przebiegiem batch.simulate_cost_batch().
+Przebiegi wykonuje stała pula procesów (dane wczytywane raz na proces).
+Jednoczesne identyczne zapytania /simulate liczone są raz (shared_cache).
+
+Przykład:
+    python server.py --port 8765 --workers 4
+    curl -s localhost:8765/simulate -d '{"purchase_freq": "Miesiąc", "purchase_day": 10}'
+    curl -sN "localhost:8765/batch?events=1" -d '[{"name": "a"}, {"name": "b", "storage_fee": 2.5}]'
+
+Moduł korzysta wyłącznie z biblioteki standardowej (http.server) i modułów silnika.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from batch import COST_KEYS, simulate_cost_batch
+from book import simulate_fixed_book
+from engine import (
+    add_real_values,
+    config_fingerprint,
+    config_to_json,
+    load_inflation,
+    load_prices,
+    normalize_config,
+    simulate,
+    summarize,
+    result_assets,
+    zero_inflation,
+)
+from shared_cache import SharedResultCache
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Maksymalny rozmiar treści zapytania
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+# Dane współdzielone przez zadania w obrębie jednego procesu roboczego
+_DATA = None
+_INFLATION = None
+
+
+def _init_worker(data_path, inflation_path):
+    """Wczytuje dane cenowe i inflację raz na proces roboczy."""
+    global _DATA, _INFLATION
+    _DATA = load_prices(data_path)
+    try:
+        _INFLATION = load_inflation(inflation_path)
+    except Exception:
+        _INFLATION = zero_inflation(_DATA)
+
+
+def _events(result):
+    """Historia zdarzeń w układzie kolumnowym (listy wartości)."""
+    return {
+        "Date": result.index.strftime("%Y-%m-%d").tolist(),
+        **{column: result[column].tolist() for column in
+           ["Invested", *result_assets(result), "Portfolio Value", "Portfolio Value Real", "Akcja"]},
+    }
+
+
+def _row(index, name, config, result, with_events):
+    add_real_values(result, _INFLATION)
+    metrics = summarize(result, config["storage_fee"], config["vat"])
+    metrics["start_date"] = metrics["start_date"].strftime("%Y-%m-%d")
+    metrics["end_date"] = metrics["end_date"].strftime("%Y-%m-%d")
+    row = {
+        "index": index,
+        "name": name,
+        "fingerprint": config_fingerprint(config),
+        "metrics": {key: (float(value) if key not in ("start_date", "end_date") else value)
+                    for key, value in metrics.items()},
+        "error": None,
+    }
+    if with_events:
+        row["events"] = _events(result)
+    return row
+
+
+def _run_single(items, with_events):
+    """Osobne symulacje engine.simulate()."""
+    return [_row(index, name, config, simulate(_DATA, config)[0], with_events) for index, name, config in items]
+
+
+def _run_fixed(items, with_events):
+    """Konfiguracje bez TREND - jeden przebieg book.simulate_fixed_book()."""
+    results = simulate_fixed_book(_DATA, [config for _, _, config in items])
+    return [_row(index, name, config, result, with_events) for (index, name, config), result in zip(items, results)]
+
+
+def _run_costs(items, with_events):
+    """Konfiguracje różniące się tylko kosztami - jeden przebieg batch.simulate_cost_batch()."""
+    base = items[0][2]
+    overrides = [{key: config[key] for key in COST_KEYS} for _, _, config in items]
+    results = simulate_cost_batch(_DATA, base, overrides, keep_history=True)["results"]
+    return [_row(index, name, config, result, with_events) for (index, name, config), result in zip(items, results)]
+
+
+def _cost_group_key(config):
+    """Odcisk konfiguracji bez parametrów kosztowych (klucz grupy simulate_cost_batch)."""
+    params = {key: value for key, value in config_to_json(config).items() if key not in COST_KEYS}
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def plan_batch(items):
+    """
+    Dzieli wsad na przebiegi wektorowe.
+
+    Parameters:
+    -----------
+    items : list
+        Trójki (pozycja we wsadzie, nazwa, konfiguracja)
+
+    Returns:
+    --------
+    list
+        Pary (funkcja przebiegu, trójki konfiguracji)
+    """
+    fixed = [item for item in items if not item[2]["trend_active"]]
+    groups = {}
+    for item in items:
+        if item[2]["trend_active"]:
+            groups.setdefault(_cost_group_key(item[2]), []).append(item)
+
+    tasks = [(_run_fixed, fixed)] if fixed else []
+    singles = []
+    for group in groups.values():
+        if len(group) > 1:
+            tasks.append((_run_costs, group))
+        else:
+            singles.extend(group)
+    # Pojedyncze konfiguracje TREND - osobne zadania, rozkładane na procesy puli
+    tasks.extend((_run_single, [item]) for item in singles)
+    return tasks
+
+
+class SimulationService:
+    """
+    Stała pula procesów i bufor wyników dla serwera HTTP.
+
+    Parameters:
+    -----------
+    data_path, inflation_path : str
+        Pliki danych (wczytywane raz w każdym procesie)
+    workers : int or None
+        Liczba procesów puli (None = liczba rdzeni)
+    """
+
+    def __init__(self, data_path="lbma_data.csv", inflation_path="inflacja.csv", workers=None):
+        self.data = load_prices(data_path)
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                        initargs=(data_path, inflation_path))
+        self.cache = SharedResultCache()
+        self.started = time.time()
+
+    def parse_runs(self, payload):
+        """
+        Konfiguracje z treści zapytania /batch.
+
+        Returns:
+        --------
+        tuple
+            (lista trójek (pozycja, nazwa, konfiguracja), lista wierszy błędów)
+        """
+        defaults = {}
+        if isinstance(payload, dict) and "runs" in payload:
+            defaults = payload.get("defaults") or {}
+            runs = payload["runs"]
+        elif isinstance(payload, dict):
+            runs = [payload]
+        else:
+            runs = payload
+        if not isinstance(runs, list):
+            raise ValueError("Oczekiwano listy konfiguracji")
+
+        items, errors = [], []
+        for index, run in enumerate(runs):
+            raw = {**defaults, **run}
+            name = str(raw.pop("name", f"run_{index + 1:03d}"))
+            try:
+                items.append((index, name, normalize_config(raw, self.data)))
+            except (ValueError, TypeError, KeyError) as e:
+                errors.append({"index": index, "name": name, "error": f"{type(e).__name__}: {e}"})
+        return items, errors
+
+    def simulate(self, payload, with_events=False):
+        """Jedna symulacja (identyczne jednoczesne zapytania liczone raz)."""
+        payload = dict(payload)
+        name = str(payload.pop("name", "run_001"))
+        config = normalize_config(payload, self.data)
+        key = f"{config_fingerprint(config)}|{int(with_events)}"
+        row = self.cache.get_or_compute(
+            key, lambda: self.pool.submit(_run_single, [(0, name, config)], with_events).result()[0]
+        )
+        return {**row, "name": name}
+
+    def batch(self, items, with_events=False):
+        """Generator wierszy wyników w kolejności zakończenia przebiegów (błąd przebiegu - wiersze z "error")."""
+        futures = {self.pool.submit(fn, group, with_events): group for fn, group in plan_batch(items)}
+        for future in as_completed(futures):
+            try:
+                rows = future.result()
+            except Exception as e:
+                rows = [{"index": index, "name": name, "error": f"{type(e).__name__}: {e}"}
+                        for index, name, _ in futures[future]]
+            yield from rows
+
+    def health(self):
+        return {
+            "status": "ok",
+            "workers": self.workers,
+            "rows": len(self.data),
+            "first_date": self.data.index.min().strftime("%Y-%m-%d"),
+            "last_date": self.data.index.max().strftime("%Y-%m-%d"),
+            "uptime": time.time() - self.started,
+            "cache": self.cache.stats(),
+        }
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+class SimulationHandler(BaseHTTPRequestHandler):
+    """Obsługa zapytań HTTP (usługa w self.server.service)."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "MetalSimulator/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ValueError(f"Treść zapytania przekracza {MAX_BODY_BYTES} bajtów")
+        body = self.rfile.read(length) if length else b"{}"
+        return json.loads(body.decode("utf-8"))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self._send_json(200, self.server.service.health())
+        else:
+            self._send_json(404, {"error": f"Nieznana ścieżka: {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        with_events = parse_qs(url.query).get("events", ["0"])[0] in ("1", "true")
+        service = self.server.service
+        try:
+            payload = self._read_json()
+            if url.path == "/simulate":
+                if not isinstance(payload, dict):
+                    raise ValueError("Oczekiwano słownika parametrów")
+                self._send_json(200, service.simulate(payload, with_events))
+                return
+            if url.path != "/batch":
+                self._send_json(404, {"error": f"Nieznana ścieżka: {url.path}"})
+                return
+            items, errors = service.parse_runs(payload)
+        except (ValueError, TypeError, KeyError) as e:
+            self._send_json(400, {"error": f"{type(e).__name__}: {e}"})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        # Odpowiedź strumieniowa (chunked): wiersz NDJSON na symulację
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for row in errors:
+                self._write_chunk((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+            for row in service.batch(items, with_events):
+                self._write_chunk((json.dumps(row, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+        except Exception as e:
+            row = {"index": None, "name": None, "error": f"{type(e).__name__}: {e}"}
+            self._write_chunk((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+        self._write_chunk(b"")
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, verbose=False):
+    """Serwer HTTP (wielowątkowy) dla usługi; port 0 = dowolny wolny port."""
+    server = ThreadingHTTPServer((host, port), SimulationHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Lokalna usługa HTTP symulacji portfela metali szlachetnych.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Adres (domyślnie: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (domyślnie: {DEFAULT_PORT})")
+    parser.add_argument("--data", default="lbma_data.csv", help="Plik z cenami metali")
+    parser.add_argument("--inflation", default="inflacja.csv", help="Plik z danymi o inflacji")
+    parser.add_argument("--workers", type=int, default=None, help="Liczba procesów (domyślnie: liczba rdzeni)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Wypisuj zapytania")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    service = SimulationService(args.data, args.inflation, args.workers)
+    server = make_server(service, args.host, args.port, args.verbose)
+    print(f"Usługa symulacji: http://{args.host}:{server.server_port} (procesy: {service.workers})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Wspólny dla wszystkich sesji bufor wyników symulacji.
+
+Użytkownicy zaczynają zwykle od tej samej, domyślnej konfiguracji, więc
+wynik liczony jest raz na proces i udostępniany kolejnym sesjom. Bufor ma
+limit liczby wpisów, budżet pamięci (usuwane są najdawniej używane wpisy)
+i czas życia wpisu (TTL).
+
+Jednoczesne zlecenia tej samej konfiguracji są łączone (single-flight):
+pierwsze liczy wynik, kolejne czekają na jego zakończenie. Gdy liczące
+zlecenie zostanie przerwane (SimulationCancelled), jedno z czekających
+przejmuje obliczenie.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from engine import SimulationCancelled, config_fingerprint, simulate
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL = 3600
+
+# Co ile sekund czekające zlecenie sprawdza własny sygnał przerwania
+WAIT_POLL = 0.1
+
+
+def _nbytes(value):
+    """Przybliżony rozmiar wyniku (DataFrame lub krotka DataFrame) w bajtach."""
+    if isinstance(value, tuple):
+        return sum(_nbytes(v) for v in value)
+    if hasattr(value, "memory_usage"):
+        return int(value.memory_usage(deep=True).sum())
+    return 0
+
+
+class SharedResultCache:
+    """
+    Bufor LRU z TTL i łączeniem jednoczesnych obliczeń tego samego klucza.
+
+    Parameters:
+    -----------
+    max_entries : int
+        Maksymalna liczba wpisów
+    max_bytes : int
+        Budżet pamięci (najnowszy wpis jest zawsze zachowany)
+    ttl : float or None
+        Czas życia wpisu w sekundach (None = bez limitu)
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL,
+                 clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = self.misses = self.coalesced = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expired(self, entry):
+        return self.ttl is not None and self._clock() - entry["created"] > self.ttl
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self.nbytes -= entry["nbytes"]
+
+    def _evict(self):
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self.nbytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._drop(key)
+            self.evictions += 1
+
+    def get(self, key):
+        """Wartość z bufora lub None (brak wpisu lub wpis przeterminowany)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry):
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry["value"]
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        if key in self._entries:
+            self._drop(key)
+        size = _nbytes(value)
+        self._entries[key] = {"value": value, "created": self._clock(), "nbytes": size}
+        self.nbytes += size
+        self._evict()
+
+    def get_or_compute(self, key, compute, cancel=None):
+        """
+        Zwraca wartość z bufora albo liczy ją compute() - raz dla jednoczesnych zleceń.
+
+        Parameters:
+        -----------
+        key : str
+            Klucz wpisu
+        compute : callable
+            Funkcja bez argumentów licząca wartość
+        cancel : threading.Event or None
+            Sygnał przerwania oczekiwania na obliczenie innego zlecenia
+
+        Returns:
+        --------
+        object
+            Wartość (ten sam obiekt dla wszystkich zleceń - nie należy go modyfikować)
+
+        Raises:
+        -------
+        SimulationCancelled
+            Gdy ustawiono cancel lub przerwano własne obliczenie
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and not self._expired(entry):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry["value"]
+                flight = self._inflight.get(key)
+                owner = flight is None
+                if owner:
+                    flight = self._inflight[key] = Future()
+                    self.misses += 1
+                else:
+                    self.coalesced += 1
+
+            if owner:
+                try:
+                    value = compute()
+                except BaseException as e:
+                    with self._lock:
+                        del self._inflight[key]
+                    flight.set_exception(e)
+                    raise
+                with self._lock:
+                    self._store(key, value)
+                    del self._inflight[key]
+                flight.set_result(value)
+                return value
+
+            while True:
+                try:
+                    return flight.result(timeout=WAIT_POLL)
+                except FutureTimeout:
+                    if cancel is not None and cancel.is_set():
+                        raise SimulationCancelled()
+                except SimulationCancelled:
+                    # Liczące zlecenie przerwano - ponów (to zlecenie może przejąć obliczenie)
+                    break
+
+    def stats(self):
+        """Liczniki bufora: trafienia, obliczenia, połączone zlecenia, usunięcia, wpisy, bajty."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "inflight": len(self._inflight),
+                "nbytes": self.nbytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+def simulation_key(config, data_version, use_trend=None, fixed_allocation=False):
+    """Klucz wyniku: odcisk konfiguracji, wersja danych i tryb symulacji."""
+    payload = f"{config_fingerprint(config)}|{data_version}|{use_trend}|{fixed_allocation}"
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def simulate_shared(cache, data, config, data_version, use_trend=None, fixed_allocation=False, cancel=None):
+    """
+    engine.simulate() przez wspólny bufor.
+
+    Zwraca kopie wyników, więc wywołujący może je modyfikować
+    (np. add_real_values) bez wpływu na inne sesje.
+
+    Returns:
+    --------
+    tuple
+        (wynik, historia TREND lub None) jak engine.simulate()
+    """
+    key = simulation_key(config, data_version, use_trend, fixed_allocation)
+    result, trend_data = cache.get_or_compute(
+        key,
+        lambda: simulate(data, config, use_trend=use_trend, fixed_allocation=fixed_allocation, cancel=cancel),
+        cancel=cancel,
+    )
+    return result.copy(), (trend_data.copy() if trend_data is not None else None)
@@ -0,0 +1,133 @@
+"""
+Strategie TREND jako wektorowe macierze ocen metali.
+
+Strategia to funkcja zwracająca oceny metali (dni × metale) dla wielu dni
+naraz - im wyższa ocena, tym wyższe miejsce metalu w rankingu. Ranking,
+przydział priorytetów i limit zmian alokacji wylicza engine.trend_allocations(),
+więc nowa strategia nie wymaga zmian w engine.simulate():
+
+    @register_strategy("moja")
+    def my_scores(prices, positions, starts, period_days):
+        return ...
+
+Argumenty funkcji strategii:
+    prices      - ceny metali (wszystkie dni notowań × metale),
+    positions   - pozycje dni, dla których liczone są oceny,
+    starts      - pozycje początków okresu analizy dla każdego dnia,
+    period_days - długość okresu analizy w dniach dla każdego dnia.
+
+Moduł nie zależy od engine - operuje wyłącznie na tablicach numpy.
+"""
+
+import numpy as np
+
+# Parametry MACD
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+
+# Zarejestrowane strategie: nazwa -> funkcja ocen
+STRATEGIES = {}
+
+
+def register_strategy(name):
+    """Dekorator rejestrujący funkcję ocen pod nazwą używaną w config["trend_strategy_type"]."""
+    def decorator(fn):
+        STRATEGIES[name] = fn
+        return fn
+    return decorator
+
+
+@register_strategy("simple")
+def simple_scores(prices, positions, starts, period_days):
+    """Zmiana ceny od początku okresu analizy."""
+    return prices[positions] / prices[starts] - 1
+
+
+def _normalize(values):
+    """Normalizacja wierszy do przedziału [0, 1] (0.5 gdy wszystkie wartości są równe)."""
+    low = values.min(axis=1, keepdims=True)
+    high = values.max(axis=1, keepdims=True)
+    flat = high == low
+    return np.where(flat, 0.5, (values - low) / np.where(flat, 1.0, high - low))
+
+
+@register_strategy("momentum")
+def momentum_scores(prices, positions, starts, period_days):
+    """
+    Momentum: 70% znormalizowanej zmiany długookresowej i 30% "przyspieszenia"
+    (zmiana krótkookresowa minus proporcjonalna część zmiany długookresowej).
+
+    Okresy liczone są w sesjach notowań: długi = period_days, krótki = period_days / 3
+    (min. 7), oba ograniczone do dostępnej historii.
+    """
+    positions = np.asarray(positions)
+    period_days = np.asarray(period_days)
+    long_period = np.minimum(period_days, positions)
+    short_period = np.minimum(np.maximum(period_days // 3, 7), positions)
+
+    current = prices[positions]
+    long_changes = current / prices[positions - long_period] - 1
+    short_changes = current / prices[positions - short_period] - 1
+    acceleration = short_changes - (long_changes * short_period[:, None] / long_period[:, None])
+
+    return 0.7 * _normalize(long_changes) + 0.3 * _normalize(acceleration)
+
+
+def _ema(values, span):
+    """
+    EMA wzdłuż ostatniej osi, osobno dla każdego okna
+    (odpowiada pandas ewm(span=span, adjust=False).mean()).
+    """
+    alpha = 1.0 / (1.0 + (span - 1) / 2)
+    old_wt = 1.0 - alpha
+    out = np.empty_like(values)
+    weighted = values[..., 0]
+    out[..., 0] = weighted
+    for t in range(1, values.shape[-1]):
+        cur = values[..., t]
+        weighted = np.where(weighted != cur, (old_wt * weighted + alpha * cur) / (old_wt + alpha), weighted)
+        out[..., t] = weighted
+    return out
+
+
+def _macd_window_scores(windows):
+    """Oceny MACD dla okien cen (dni × metale × sesje okna)."""
+    macd_line = _ema(windows, MACD_FAST) - _ema(windows, MACD_SLOW)
+    histogram = macd_line - _ema(macd_line, MACD_SIGNAL)
+
+    current_macd = macd_line[..., -1]
+    current_histogram = histogram[..., -1]
+    if windows.shape[-1] > 1:
+        prev_macd = macd_line[..., -2]
+        prev_histogram = histogram[..., -2]
+    else:
+        prev_macd = prev_histogram = np.zeros_like(current_macd)
+
+    base_score = np.where(current_macd > 0, 1.0, 0.0)
+    direction_mod = np.where(current_macd > prev_macd, 0.5, -0.5)
+    hist_mod = np.where(np.abs(current_histogram) > np.abs(prev_histogram), 0.3, -0.3)
+    return base_score + direction_mod + hist_mod
+
+
+@register_strategy("macd")
+def macd_scores(prices, positions, starts, period_days):
+    """
+    MACD (12/26/9) liczony na oknie 2 × 26 sesji przed każdym dniem:
+    +1 gdy MACD > 0, ±0.5 za kierunek MACD, ±0.3 za wzrost/spadek histogramu.
+    """
+    positions = np.asarray(positions)
+    lookback = MACD_SLOW * 2
+    scores = np.empty((len(positions), prices.shape[1]))
+
+    full = positions >= lookback
+    if full.any():
+        rows = positions[full][:, None] - lookback + np.arange(lookback + 1)
+        scores[full] = _macd_window_scores(prices[rows].transpose(0, 2, 1))
+
+    # Początek historii - krótsze okna liczone osobno
+    for k in np.flatnonzero(~full):
+        window = prices[:positions[k] + 1].T[None]
+        scores[k] = _macd_window_scores(window)[0]
+
+    return scores
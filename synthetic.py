@@ -0,0 +1,209 @@
+"""
+Syntetyczne pliki cen do testów skalowania silników.
+
+Dołączony plik lbma_data.csv ma ok. 12 tys. notowań 4 metali - za mało, by
+zobaczyć, jak ścieżki obliczeń skalują się z długością danych i liczbą
+aktywów. synthetic_prices() tworzy dowolnie długie (np. 150 lat notowań
+dziennych) ceny dowolnej liczby aktywów o strukturze zwrotów danych źródłowych:
+
+- dzienne logarytmiczne zwroty metali losowane są blokami kolejnych dni
+  (stationary bootstrap) z danych źródłowych - zachowane są rozkład zwrotów,
+  korelacje między metalami i skupiska zmienności,
+- dodatkowe aktywa to losowe mieszanki zwrotów metali (wagi z rozkładu
+  Dirichleta) z własnym szumem dobranym tak, by zmienność mieściła się
+  w zakresie metali - są więc skorelowane z metalami jak typowe surowce,
+- ceny kończą się na poziomie ostatnich notowań danych źródłowych,
+- luki: losowe serie dni bez notowań (święta, przerwy w publikacji).
+
+Wynik ma format engine.load_prices() (kolumny "<nazwa>_EUR", indeks dat),
+a write_prices() zapisuje go jako CSV lub Parquet czytany przez load_prices.
+
+Przykład:
+    python synthetic.py synthetic.csv --years 150 --assets 12 --gap-rate 0.02
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from engine import asset_columns, asset_names, load_prices
+
+# Średnia długość losowanego bloku kolejnych dni (stationary bootstrap)
+DEFAULT_BLOCK_DAYS = 20
+
+# Parametr rozkładu Dirichleta wag mieszanek (< 1 - mieszanki zdominowane przez jeden metal)
+MIX_CONCENTRATION = 0.5
+
+SYNTHETIC_PREFIX = "Syn"
+
+
+def source_returns(data):
+    """Dzienne logarytmiczne zwroty aktywów danych źródłowych (wiersz na dzień)."""
+    prices = data[asset_columns(asset_names(data))].to_numpy(dtype=float)
+    return np.diff(np.log(prices), axis=0)
+
+
+def bootstrap_indices(n_days, n_source, block_days=DEFAULT_BLOCK_DAYS, rng=None):
+    """
+    Indeksy dni źródłowych dla stationary bootstrap (Politis, Romano).
+
+    Bloki kolejnych dni mają losową (geometryczną) długość o średniej
+    block_days; po końcu danych źródłowych blok przechodzi na ich początek.
+    """
+    rng = np.random.default_rng(rng)
+    new_block = rng.random(n_days) < 1.0 / block_days
+    new_block[0] = True
+    block = np.cumsum(new_block) - 1
+    block_start = np.flatnonzero(new_block)
+    offset = np.arange(n_days) - block_start[block]
+    return (rng.integers(0, n_source, len(block_start))[block] + offset) % n_source
+
+
+def mixture_returns(returns, n_assets, rng=None):
+    """
+    Zwroty dodatkowych aktywów: mieszanki zwrotów źródłowych z własnym szumem.
+
+    Wariancja aktywa równa jest średniej wariancji metali ważonej wagami
+    mieszanki - szum uzupełnia wariancję utraconą przez dywersyfikację.
+
+    Returns:
+    --------
+    np.ndarray
+        Zwroty (dni × n_assets)
+    """
+    rng = np.random.default_rng(rng)
+    n_source = returns.shape[1]
+    weights = rng.dirichlet(np.full(n_source, MIX_CONCENTRATION), size=n_assets)
+    cov = np.atleast_2d(np.cov(returns, rowvar=False))
+    mixed_var = np.einsum("ki,ij,kj->k", weights, cov, weights)
+    noise_sd = np.sqrt(np.maximum(weights @ np.diag(cov) - mixed_var, 0.0))
+    return returns @ weights.T + rng.standard_normal((len(returns), n_assets)) * noise_sd
+
+
+def gap_mask(n_days, gap_rate, gap_days=1.5, rng=None):
+    """
+    Maska dni z notowaniami (False - luka).
+
+    Luki zaczynają się losowo i trwają średnio gap_days dni (rozkład
+    geometryczny), tak by łącznie objęły ok. gap_rate wszystkich dni.
+    """
+    keep = np.ones(n_days, dtype=bool)
+    if gap_rate <= 0:
+        return keep
+    rng = np.random.default_rng(rng)
+    starts = np.flatnonzero(rng.random(n_days) < gap_rate / gap_days)
+    lengths = rng.geometric(1.0 / gap_days, len(starts))
+    for start, length in zip(starts, lengths):
+        keep[start:start + length] = False
+    keep[0] = True
+    return keep
+
+
+def synthetic_prices(source, years=100, assets=None, gap_rate=0.0, gap_days=1.5,
+                     block_days=DEFAULT_BLOCK_DAYS, end=None, seed=0):
+    """
+    Syntetyczne ceny o strukturze zwrotów danych źródłowych.
+
+    Parameters:
+    -----------
+    source : pd.DataFrame
+        Ceny źródłowe (engine.load_prices)
+    years : float
+        Długość danych w latach (notowania w dni robocze)
+    assets : int or None
+        Liczba aktywów (None - jak w danych źródłowych); pierwsze aktywa to
+        aktywa źródłowe, kolejne - mieszanki "Syn01", "Syn02", ...
+    gap_rate : float
+        Udział dni roboczych bez notowań (0 - bez luk)
+    gap_days : float
+        Średnia długość luki w dniach
+    block_days : float
+        Średnia długość losowanego bloku zwrotów
+    end : str or pd.Timestamp or None
+        Data ostatniego notowania (None - jak w danych źródłowych)
+    seed : int
+        Ziarno generatora (te same parametry - te same dane)
+
+    Returns:
+    --------
+    pd.DataFrame
+        Ceny w formacie engine.load_prices()
+
+    Raises:
+    -------
+    ValueError
+        Gdy parametry są niepoprawne (np. years <= 0)
+    """
+    if years <= 0:
+        raise ValueError(f"Długość danych musi być dodatnia (podano {years} lat).")
+    if not 0 <= gap_rate < 1:
+        raise ValueError(f"Udział luk musi być w przedziale [0, 1) (podano {gap_rate}).")
+
+    rng = np.random.default_rng(seed)
+    names = asset_names(source)
+    n_assets = len(names) if assets is None else int(assets)
+    if n_assets < 1:
+        raise ValueError(f"Liczba aktywów musi być dodatnia (podano {n_assets}).")
+
+    end = source.index.max() if end is None else pd.Timestamp(end)
+    dates = pd.bdate_range(end=end, periods=int(round(years * 261)), name=source.index.name or "Date")
+
+    base = source_returns(source)
+    returns = base[bootstrap_indices(len(dates) - 1, len(base), block_days, rng)]
+    last = source[asset_columns(names)].iloc[-1].to_numpy(dtype=float)
+
+    if n_assets > len(names):
+        extra = n_assets - len(names)
+        returns = np.hstack([returns, mixture_returns(returns, extra, rng)])
+        last = np.concatenate([last, np.full(extra, np.exp(np.log(last).mean()))])
+        names = names + [f"{SYNTHETIC_PREFIX}{k:02d}" for k in range(1, extra + 1)]
+    returns, last, names = returns[:, :n_assets], last[:n_assets], names[:n_assets]
+
+    # Ceny kończą się na poziomie ostatnich notowań źródłowych
+    log_prices = np.vstack([np.zeros(n_assets), np.cumsum(returns, axis=0)])
+    prices = last * np.exp(log_prices - log_prices[-1])
+
+    keep = gap_mask(len(dates), gap_rate, gap_days, rng)
+    return pd.DataFrame(prices[keep], index=dates[keep], columns=asset_columns(names))
+
+
+def write_prices(data, path):
+    """Zapisuje ceny jako CSV (6 cyfr znaczących) lub Parquet (rozszerzenie .parquet)."""
+    if str(path).endswith(".parquet"):
+        data.to_parquet(path)
+    else:
+        data.to_csv(path, float_format="%.6g")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Syntetyczne ceny o strukturze zwrotów danych źródłowych.")
+    parser.add_argument("out", help="Plik wynikowy (.csv lub .parquet)")
+    parser.add_argument("--data", default="lbma_data.csv", help="Plik z cenami źródłowymi")
+    parser.add_argument("--years", type=float, default=100, help="Długość danych w latach")
+    parser.add_argument("--assets", type=int, default=None, help="Liczba aktywów (domyślnie jak w danych)")
+    parser.add_argument("--gap-rate", type=float, default=0.0, help="Udział dni bez notowań")
+    parser.add_argument("--gap-days", type=float, default=1.5, help="Średnia długość luki w dniach")
+    parser.add_argument("--block-days", type=float, default=DEFAULT_BLOCK_DAYS, help="Średnia długość bloku zwrotów")
+    parser.add_argument("--seed", type=int, default=0, help="Ziarno generatora")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        data = synthetic_prices(load_prices(args.data), years=args.years, assets=args.assets,
+                                gap_rate=args.gap_rate, gap_days=args.gap_days,
+                                block_days=args.block_days, seed=args.seed)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    write_prices(data, args.out)
+    print(f"Zapisano {len(data)} notowań {len(asset_names(data))} aktywów "
+          f"({data.index.min():%Y-%m-%d} - {data.index.max():%Y-%m-%d}) do {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())